@@ -1,57 +1,30 @@
 from fastapi import Depends, HTTPException, status, APIRouter
 from typing import Optional
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.database import SessionLocal
-from glovo_app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM
-from jose import jwt
-from passlib.context import CryptContext
-from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from datetime import timedelta, datetime
+from glovo_app.db.database import get_db
+from fastapi.security import OAuth2PasswordRequestForm
 
-from glovo_app.db.models import UserProfile, RefreshToken, Cart
+from glovo_app.db.models import UserProfile, Cart
 from glovo_app.db.schema import UserProfileSchema
+from glovo_app.security.passwords import password_hasher
+from glovo_app.security.tokens import (optional_oauth2_schema, create_access_token, create_refresh_token,
+                                       token_claims, decode_token, REFRESH)
+from glovo_app.security.current_user import Principal, get_current_user, revoke_token, revoke_all_tokens
+from glovo_app.security.refresh_store import refresh_token_store
+from glovo_app.metrics.sql import query_budget
 
 auth_router = APIRouter(prefix='/auth', tags=['Auth'])
 
-oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login')
-password_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({'exp': expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-
-def create_refresh_token(data: dict):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-
-
-def verify_password(plain_password, hashed_password):
-    return password_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password):
-    return password_context.hash(password)
-
 
 @auth_router.post('/register')
-async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.username == user.username).first()
+async def register(user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == user.username))
     if user_db:
         raise HTTPException(status_code=404, detail='username бар экен')
-    new_hash_pass = get_password_hash(user.password)
+    new_hash_pass = await password_hasher.hash(user.password)
     new_user = UserProfile(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -61,48 +34,79 @@ async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
         hashed_password=new_hash_pass
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     new_cart = Cart(user_id=new_user.id)
     db.add(new_cart)
-    db.commit()
+    await db.commit()
 
     return {'message': 'Saved'}
 
 
-@auth_router.post('/login', dependencies=[Depends(RateLimiter(times=3, seconds=20))])
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+# Worst case with REFRESH_TOKEN_BACKEND=sql: the user lookup, the password rehash and the token insert.
+@auth_router.post('/login', dependencies=[Depends(RateLimiter(times=3, seconds=20)),
+                                         Depends(query_budget(3))])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.username == form_data.username))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
+    valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
-    access_token = create_access_token({'sub': user.username})
-    refresh_token = create_refresh_token({'sub': user.username})
-    token_db = RefreshToken(token=refresh_token, user_id=user.id)
-    db.add(token_db)
-    db.commit()
+    if new_hash:
+        user.hashed_password = new_hash
+    access_token = create_access_token(token_claims(user))
+    refresh_token = create_refresh_token(token_claims(user))
+    await refresh_token_store.save(db, refresh_token, user.id)
+    await db.commit()
 
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
 
 
 @auth_router.post('/logout')
-async def logout(refresh_token: str, db: Session = Depends(get_db)):
-    stored_token = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
+async def logout(refresh_token: str, access_token: Optional[str] = Depends(optional_oauth2_schema),
+                 db: AsyncSession = Depends(get_db)):
+    user_id = await refresh_token_store.consume(db, refresh_token)
 
-    if not stored_token:
+    if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
 
-    db.delete(stored_token)
-    db.commit()
+    await db.commit()
+    if access_token:
+        await revoke_token(decode_token(access_token))
     return {'message': 'Вышли'}
 
 
+@auth_router.post('/logout_all')
+async def logout_all(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    token_version = await db.scalar(update(UserProfile).where(UserProfile.id == current_user.id)
+                                    .values(token_version=UserProfile.token_version + 1)
+                                    .returning(UserProfile.token_version))
+    await refresh_token_store.revoke_user(db, current_user.id)
+    await db.commit()
+    await revoke_all_tokens(current_user.username, token_version)
+    return {'message': 'Вышли'}
+
+
+@auth_router.get('/me', response_model=Principal)
+async def me(current_user: Principal = Depends(get_current_user)):
+    return current_user
+
+
 @auth_router.post('/refresh')
-def refresh(refresh_token: str, db: Session = Depends(get_db)):
-    token_entry = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not token_entry:
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    decode_token(refresh_token, REFRESH)
+    user_id = await refresh_token_store.consume(db, refresh_token)
+    if user_id is None:
         raise HTTPException(status_code=401, detail='Маалымат туура эмес')
 
-    access_token = create_access_token({'sub': token_entry.user_id})
+    user = await db.get(UserProfile, user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail='Маалымат туура эмес')
+    access_token = create_access_token(token_claims(user))
+    new_refresh_token = create_refresh_token(token_claims(user))
+    await refresh_token_store.save(db, new_refresh_token, user.id)
+    await db.commit()
 
-    return {'access_token': access_token, 'token_type': 'bearer'}
+    return {'access_token': access_token, 'refresh_token': new_refresh_token, 'token_type': 'bearer'}
@@ -1,58 +1,62 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
+from glovo_app.db.database import get_db, get_read_db
 from glovo_app.db.schema import CartSchema, CartItemSchema, ProductSchema, CartItemCreateSchema
 from glovo_app.db.models import Cart, CartItem, Product
+from glovo_app.metrics.sql import query_budget
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 cart_router = APIRouter(prefix='/cart', tags=['Cart'])
 
+async def cart_total(db: AsyncSession, cart_id: int):
+    # Not cached: one SUM over the cart's rows through ix_cart_item_cart_id is cheap, and a cached
+    # total would need invalidating on every cart change and product price change on every worker.
+    return await db.scalar(
+        select(func.coalesce(func.sum(Product.price * CartItem.quantity), 0))
+        .select_from(CartItem)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.cart_id == cart_id)
+    )
+
 
 @cart_router.post('/create', response_model=CartItemSchema)
 async def create_cart(user_id: int, item_data: CartItemCreateSchema,
-                      db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+                      db: AsyncSession = Depends(get_db)):
+    cart = await db.scalar(select(Cart).where(Cart.user_id == user_id))
     if not cart:
         cart = Cart(user_id=user_id)
         db.add(cart)
-        db.commit()
-        db.refresh(cart)
+        await db.commit()
+        await db.refresh(cart)
 
-    product = db.query(Product).filter(Product.id == item_data.product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == item_data.product_id))
     if not product:
         raise HTTPException(status_code=404, detail='Product Not Found')
 
-    product_item = db.query(CartItem).filter(CartItem.cart_id == cart.id,
-                              CartItem.product_id == item_data.product_id).first()
+    product_item = await db.scalar(select(CartItem).where(CartItem.cart_id == cart.id,
+                                                          CartItem.product_id == item_data.product_id))
     if product_item:
         raise HTTPException(status_code=404, detail='Product already in cart')
 
     cart_item = CartItem(cart_id=cart.id, product_id=item_data.product_id)
     db.add(cart_item)
-    db.commit()
-    db.refresh(cart_item)
+    await db.commit()
+    await db.refresh(cart_item)
 
     return cart_item
 
 
-@cart_router.get('/', response_model=CartSchema)
-async def cart_list(user_id: int, db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+@cart_router.get('/', response_model=CartSchema, dependencies=[Depends(query_budget(3))])
+async def cart_list(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    cart = await db.scalar(select(Cart).options(selectinload(Cart.items)).where(Cart.user_id == user_id))
     if not cart:
         raise HTTPException(status_code=404, detail='Корзина не найдена')
 
-    cart_items = db.query(CartItem).filter(CartItem.cart_id == cart.id).all()
-
-    total_price = sum(db.query(Product.price).filter(Product.id == item.product_id).scalar() for item in cart_items)
+    total_price = await cart_total(db, cart.id)
     return {
         'id': cart.id,
         'user_id': cart.user_id,
@@ -62,16 +66,16 @@ async def cart_list(user_id: int, db: Session = Depends(get_db)):
 
 
 @cart_router.delete('/{product_id}')
-async def delete_cart(product_id: int, user_id: int, db: Session = Depends(get_db)):
-    cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+async def delete_cart(product_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
+    cart = await db.scalar(select(Cart).where(Cart.user_id == user_id))
     if cart is None:
         raise HTTPException(status_code=404, detail='Cart Not Found')
 
-    cart_item = db.query(CartItem).filter(CartItem.cart_id == cart.id,
-                                          CartItem.product_id == product_id).first()
+    cart_item = await db.scalar(select(CartItem).where(CartItem.cart_id == cart.id,
+                                                       CartItem.product_id == product_id))
     if not cart_item:
         raise HTTPException(status_code=404, detail='Product absent in cart')
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
     return {'message': 'Product deleted from cart'}
 
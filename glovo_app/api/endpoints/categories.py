@@ -1,39 +1,37 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
+from glovo_app.db.database import get_db, get_read_db
 from glovo_app.db.schema import CategorySchema
 from glovo_app.db.models import Category
+from glovo_app.cache.response import cache_response, invalidate_tags
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 category_router = APIRouter(prefix='/category', tags=['Category'])
 
 
 @category_router.post('/create/', response_model=CategorySchema)
-async def create_category(category: CategorySchema, db: Session = Depends(get_db)):
+async def create_category(category: CategorySchema, db: AsyncSession = Depends(get_db)):
     db_category = Category(category_name=category.category_name)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await invalidate_tags('category')
     return db_category
 
 
 @category_router.get('/', response_model=List[CategorySchema])
-async def list_category(db: Session = Depends(get_db)):
-    return db.query(Category).all()
+@cache_response(List[CategorySchema], 'category')
+async def list_category(db: AsyncSession = Depends(get_read_db)):
+    return (await db.scalars(select(Category))).all()
 
 
 @category_router.get('/{category_id}/', response_model=CategorySchema)
-async def detail_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+@cache_response(CategorySchema, 'category:{category_id}')
+async def detail_category(category_id: int, db: AsyncSession = Depends(get_read_db)):
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
     return category
@@ -41,21 +39,23 @@ async def detail_category(category_id: int, db: Session = Depends(get_db)):
 
 @category_router.put('/{category_id/', response_model=CategorySchema)
 async def update_category(category_id: int, category_data: CategorySchema,
-                          db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+                          db: AsyncSession = Depends(get_db)):
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
     category.category_name = category_data.category_name
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await invalidate_tags('category', f'category:{category_id}')
     return category
 
 
 @category_router.delete('/{category_id}', response_model=CategorySchema)
-async def delete_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
-    db.delete(category)
-    db.commit()
+    await db.delete(category)
+    await db.commit()
+    await invalidate_tags('category', f'category:{category_id}')
     return {'message': 'Category deleted successfully'}
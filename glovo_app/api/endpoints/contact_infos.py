@@ -1,39 +1,36 @@
-from typing import List
-
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import ContactInfoSchema
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import ContactInfoSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
 from glovo_app.db.models import ContactInfo
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 contact_info_router = APIRouter(prefix='/contact_info', tags=['ContactInfo'])
 
 
 @contact_info_router.post('/create/', response_model=ContactInfoSchema)
-async def create_contact(contact: ContactInfoSchema, db: Session = Depends(get_db)):
+async def create_contact(contact: ContactInfoSchema, db: AsyncSession = Depends(get_db)):
     db_contact = ContactInfo(**contact.dict())
     db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    await db.commit()
+    await db.refresh(db_contact)
     return db_contact
 
 
-@contact_info_router.get('/', response_model=List[ContactInfoSchema])
-async def list_contact(db: Session = Depends(get_db)):
-    return db.query(ContactInfo).all()
+@contact_info_router.get('/', response_model=CursorPage[ContactInfoSchema])
+async def list_contact(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                       stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(ContactInfo), [ContactInfo.id], cursor, size, stream, ContactInfoSchema)
 
 
 @contact_info_router.get('/{contact_id}', response_model=ContactInfoSchema)
-async def detail_contact(contact_id: int, db: Session = Depends(get_db)):
-    contact = db.query(ContactInfo).filter(ContactInfo.id == contact_id).first()
+async def detail_contact(contact_id: int, db: AsyncSession = Depends(get_read_db)):
+    contact = await db.scalar(select(ContactInfo).where(ContactInfo.id == contact_id))
     if contact is None:
         raise HTTPException(status_code=404, detail='ContactInfo Not Found')
     return contact
@@ -41,25 +38,25 @@ async def detail_contact(contact_id: int, db: Session = Depends(get_db)):
 
 @contact_info_router.put('/{contact_id}/', response_model=ContactInfoSchema)
 async def update_contact(contact_id: int, contact_data: ContactInfoSchema,
-                        db: Session = Depends(get_db)):
-    contact = db.query(ContactInfo).filter(ContactInfo.id == contact_id).first()
+                        db: AsyncSession = Depends(get_db)):
+    contact = await db.scalar(select(ContactInfo).where(ContactInfo.id == contact_id))
     if contact is None:
         raise HTTPException(status_code=404, detail='ContactInfo Not Found')
     return contact
 
     for contact_key, contact_value in contact_data.dict().items():
         setattr(contact, contact_key, contact_value)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     return contact
 
 
 @contact_info_router.delete('/{contact_info.id}/')
-async def delete_contact(contact_id: int, db: Session = Depends(get_db)):
-    contact = db.query(ContactInfo).filter(ContactInfo.id == contact_id).first()
+async def delete_contact(contact_id: int, db: AsyncSession = Depends(get_db)):
+    contact = await db.scalar(select(ContactInfo).where(ContactInfo.id == contact_id))
     if contact is None:
         raise HTTPException(status_code=404, detail='ContactInfo Not Found')
-    db.delete(contact)
-    db.commit()
+    await db.delete(contact)
+    await db.commit()
     return {'message': 'This ContactInfo is deleted'}
 
@@ -1,63 +1,66 @@
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import CourierReviewSchema
-from glovo_app.db.models import CourierReview
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import CourierReviewSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import CourierReview, CourierRating
+from glovo_app.ratings.aggregates import apply_rating, move_rating
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 courier_review_router = APIRouter(prefix='/courier_review', tags=['CourierReview'])
 
 
 @courier_review_router.post('/create', response_model=CourierReviewSchema)
-async def create_courier_review(courier_review: CourierReviewSchema, db: Session = Depends(get_db)):
-    db_courier_review = CourierReview(**courier_review.dict())
+async def create_courier_review(courier_review: CourierReviewSchema, db: AsyncSession = Depends(get_db)):
+    db_courier_review = CourierReview(**courier_review.dict(exclude_none=True))
     db.add(db_courier_review)
-    db.commit()
-    db.refresh(db_courier_review)
+    await db.flush()
+    await apply_rating(db, CourierRating, db_courier_review.courier, db_courier_review.rating)
+    await db.commit()
+    await db.refresh(db_courier_review)
     return db_courier_review
 
 
-@courier_review_router.get('/', response_model=List[CourierReviewSchema])
-async def list_courier_review(db: Session = Depends(get_db)):
-    return db.query(CourierReview).all()
+@courier_review_router.get('/', response_model=CursorPage[CourierReviewSchema])
+async def list_courier_review(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                              stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(CourierReview), [CourierReview.id], cursor, size, stream, CourierReviewSchema)
 
 
 @courier_review_router.get('/{courier_review_id}', response_model=CourierReviewSchema)
-async def detail_review(courier_review_id: int, db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+async def detail_review(courier_review_id: int, db: AsyncSession = Depends(get_read_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='CourierReview Not Found')
     return courier_review
 
 
 @courier_review_router.put('/update', response_model=CourierReviewSchema)
-async def update_review(courier_review_id: int, courier_review_data: CourierReviewSchema, db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+async def update_review(courier_review_id: int, courier_review_data: CourierReviewSchema, db: AsyncSession = Depends(get_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='CourierReview Not Found')
-    return courier_review
 
-    for courier_review_key, courier_review_value in courier_review_data.dict().items():
+    old_courier, old_rating = courier_review.courier, courier_review.rating
+    for courier_review_key, courier_review_value in courier_review_data.dict(exclude={'id', 'created_date'}).items():
         setattr(courier_review, courier_review_key, courier_review_value)
-    db.commit()
-    db.refresh(courier_review)
+    await db.flush()
+    await move_rating(db, CourierRating, old_courier, old_rating, courier_review.courier, courier_review.rating)
+    await db.commit()
+    await db.refresh(courier_review)
     return courier_review
 
 
 @courier_review_router.delete('/delete')
-async def delete_courier_review(courier_review_id: int, db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+async def delete_courier_review(courier_review_id: int, db: AsyncSession = Depends(get_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='CourierReview Not Found')
-    db.delete(courier_review)
-    db.commit()
+    await apply_rating(db, CourierRating, courier_review.courier, courier_review.rating, -1)
+    await db.delete(courier_review)
+    await db.commit()
     return {'message': 'This CourierReview is deleted'}
@@ -1,64 +1,66 @@
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import CourierSchema
-from glovo_app.db.models import Courier
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import CourierSchema, CourierWithRatingSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import Courier, TypeChoices
+from glovo_app.dispatch.index import set_availability
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 courier_router = APIRouter(prefix='/courier', tags=['Courier'])
 
 
 @courier_router.post('/create', response_model=CourierSchema)
-async def create_courier(courier: CourierSchema, db: Session = Depends(get_db)):
+async def create_courier(courier: CourierSchema, db: AsyncSession = Depends(get_db)):
     db_courier = Courier(**courier.dict())
     db.add(db_courier)
-    db.commit()
-    db.refresh(db_courier)
+    await db.commit()
+    await db.refresh(db_courier)
     return db_courier
 
 
-@courier_router.get('/', response_model=List[CourierSchema])
-async def list_courier(db: Session = Depends(get_db)):
-    return db.query(Courier).all()
+@courier_router.get('/', response_model=CursorPage[CourierWithRatingSchema])
+async def list_courier(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                       stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(Courier).options(selectinload(Courier.rating)), [Courier.id],
+                                    cursor, size, stream, CourierWithRatingSchema)
 
 
-@courier_router.get('/{courier_id}', response_model=CourierSchema)
-async def detail_courier(courier_id: int, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+@courier_router.get('/{courier_id}', response_model=CourierWithRatingSchema)
+async def detail_courier(courier_id: int, db: AsyncSession = Depends(get_read_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id).options(selectinload(Courier.rating)))
     if courier is None:
         raise HTTPException(status_code=404, detail='Courier Not Found')
     return courier
 
 
 @courier_router.put('/update', response_model=CourierSchema)
-async def update_courier(courier_id: int, courier_data: CourierSchema, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+async def update_courier(courier_id: int, courier_data: CourierSchema, db: AsyncSession = Depends(get_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id))
     if courier is None:
         raise HTTPException(status_code=404, detail='Courier Not Found')
-    return courier
 
-    for courier_key, courier_value in courier_data.dict().items():
+    for courier_key, courier_value in courier_data.dict(exclude={'id'}).items():
         setattr(courier, courier_key, courier_value)
-    db.commit()
-    db.refresh(courier)
+    if courier.type == TypeChoices.available:
+        courier.current_orders_id = None
+    await db.commit()
+    await db.refresh(courier)
+    await set_availability(courier.id, courier.type == TypeChoices.available)
     return courier
 
 
 @courier_router.delete('/delete')
-async def delete_courier(courier_id: int, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+async def delete_courier(courier_id: int, db: AsyncSession = Depends(get_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id))
     if courier is None:
         raise HTTPException(status_code=404, detail='Courier Not Found')
-    db.delete(courier)
-    db.commit()
+    await db.delete(courier)
+    await db.commit()
     return {'message': 'This Courier is deleted'}
 
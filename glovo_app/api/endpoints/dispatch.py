@@ -0,0 +1,103 @@
+from typing import List
+
+from fastapi import (APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, WebSocketException,
+                     status)
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.config import LOCATION_MAX_MESSAGE_BYTES, LOCATION_RATE_BURST
+from glovo_app.db.database import SessionLocal, get_read_db
+from glovo_app.db.models import Courier, Store
+from glovo_app.db.schema import PositionSchema, NearbyCourierSchema, AssignmentSchema, LocationBatchSchema
+from glovo_app.dispatch.index import courier_index, update_position
+from glovo_app.dispatch.ingest import TokenBucket, location_buffer, location_stats
+from glovo_app.dispatch.matching import dispatch_window
+from glovo_app.security.current_user import Principal, get_current_user, get_websocket_user
+
+
+dispatch_router = APIRouter(prefix='/dispatch', tags=['Dispatch'])
+
+
+@dispatch_router.put('/courier/{courier_id}/position/')
+async def set_courier_position(courier_id: int, position: PositionSchema, db: AsyncSession = Depends(get_read_db)):
+    if courier_id not in courier_index.positions \
+            and await db.scalar(select(Courier.id).where(Courier.id == courier_id)) is None:
+        raise HTTPException(status_code=404, detail='Courier Not Found')
+    await update_position(courier_id, position.latitude, position.longitude)
+    return {'courier_id': courier_id, 'available': courier_id in courier_index.available_ids}
+
+
+@dispatch_router.get('/nearest/', response_model=List[NearbyCourierSchema])
+async def nearest_couriers(store_id: int, k: int = Query(5, ge=1, le=100), db: AsyncSession = Depends(get_read_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id))
+    if store is None:
+        raise HTTPException(status_code=404, detail='Store Not Found')
+    if store.latitude is None or store.longitude is None:
+        raise HTTPException(status_code=409, detail='Store has no location')
+    return [{'courier_id': courier_id, 'distance_m': round(distance, 1)}
+            for distance, courier_id in courier_index.nearest(store.latitude, store.longitude, k)]
+
+
+@dispatch_router.post('/run/', response_model=List[AssignmentSchema])
+async def run_dispatch():
+    return await dispatch_window()
+
+
+async def courier_of(db: AsyncSession, user_id: int):
+    return await db.scalar(select(Courier.id).where(Courier.user_id == user_id))
+
+
+@dispatch_router.post('/locations/', status_code=status.HTTP_202_ACCEPTED)
+async def ingest_locations(batch: LocationBatchSchema, current_user: Principal = Depends(get_current_user),
+                           db: AsyncSession = Depends(get_read_db)):
+    courier_id = await courier_of(db, current_user.id)
+    if courier_id is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not a courier')
+    accepted = sum(location_buffer.record(courier_id, point.latitude, point.longitude, point.timestamp)
+                   for point in batch.points)
+    return {'accepted': accepted}
+
+
+@dispatch_router.websocket('/locations/ws/')
+async def stream_locations(websocket: WebSocket, current_user: Principal = Depends(get_websocket_user)):
+    """Accept ``{"points": [...]}`` messages from a courier app.
+
+    Nothing is sent back unless a message is rejected. Messages over the per-connection rate
+    are dropped with a ``throttled`` reply, and a client that ignores those is disconnected.
+    """
+    async with SessionLocal(info={'read_only': True}) as db:
+        courier_id = await courier_of(db, current_user.id)
+    if courier_id is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason='Not a courier')
+
+    await websocket.accept()
+    location_stats.connections += 1
+    bucket, throttled = TokenBucket(), 0
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if len(message) > LOCATION_MAX_MESSAGE_BYTES:
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                return
+            if not bucket.take():
+                location_stats.throttled += 1
+                throttled += 1
+                if throttled > LOCATION_RATE_BURST:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    return
+                await websocket.send_json({'throttled': True, 'retry_after': round(bucket.retry_after(), 3)})
+                continue
+            throttled = 0
+            try:
+                batch = LocationBatchSchema.model_validate_json(message)
+            except ValidationError as exc:
+                await websocket.send_json({'errors': exc.errors(include_url=False, include_context=False,
+                                                                include_input=False)})
+                continue
+            for point in batch.points:
+                location_buffer.record(courier_id, point.latitude, point.longitude, point.timestamp)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        location_stats.connections -= 1
@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from glovo_app.exports.stream import EXPORT_MODELS, MEDIA_TYPES, export_stream, file_extension
+
+
+export_router = APIRouter(prefix='/export', tags=['Export'])
+
+
+@export_router.get('/{kind}/')
+async def export_rows(kind: str,
+                      format: str = Query('csv', regex='^(csv|ndjson|parquet)$'),
+                      since: Optional[datetime] = None,
+                      until: Optional[datetime] = None,
+                      after_date: Optional[datetime] = None,
+                      after_id: Optional[int] = None,
+                      gzip: bool = False):
+    if kind not in EXPORT_MODELS:
+        raise HTTPException(status_code=404, detail='Export Kind Not Found')
+    if (after_date is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail='after_date and after_id go together')
+    after = (after_date, after_id) if after_date is not None else None
+
+    filename = f'{kind}.{file_extension(format, gzip)}'
+    return StreamingResponse(export_stream(kind, format, since, until, after, gzip),
+                             media_type='application/gzip' if gzip else MEDIA_TYPES[format],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -0,0 +1,33 @@
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, File, HTTPException, Query, UploadFile, status
+
+from glovo_app.imports.pipeline import (IMPORT_SPECS, FORMATS, ImportProgress, new_job_id, infer_format,
+                                        spool_upload, import_spooled, get_progress)
+
+
+import_router = APIRouter(prefix='/import', tags=['Import'])
+
+
+@import_router.post('/{kind}/', status_code=status.HTTP_202_ACCEPTED)
+async def start_import(kind: str, background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                       format: Optional[str] = Query(None, regex='^(csv|ndjson)$')):
+    if kind not in IMPORT_SPECS:
+        raise HTTPException(status_code=404, detail='Import Kind Not Found')
+    fmt = format or infer_format(file.filename)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail='Unsupported file format')
+
+    path = await spool_upload(file)
+    progress = ImportProgress(new_job_id(), kind)
+    await progress.publish()
+    background_tasks.add_task(import_spooled, kind, path, fmt, progress)
+    return progress.snapshot()
+
+
+@import_router.get('/jobs/{job_id}/')
+async def import_status(job_id: str):
+    progress = await get_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail='Import Job Not Found')
+    return progress
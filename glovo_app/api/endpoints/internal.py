@@ -0,0 +1,66 @@
+from fastapi import APIRouter
+
+from glovo_app.db.database import engine, replica_engines
+from glovo_app.db.routing import replica_set
+from glovo_app.cache.response import cache_stats
+from glovo_app.cache.idempotency import idempotency_stats
+from glovo_app.dispatch.index import courier_index
+from glovo_app.dispatch.ingest import location_stats
+from glovo_app.dispatch.matching import dispatch_stats
+from glovo_app.metrics.sql import query_stats
+from glovo_app.outbox.worker import backlog, worker_stats
+from glovo_app.security.passwords import password_hasher
+from glovo_app.tracking.events import tracking_stats
+from glovo_app.db.pool_metrics import pool_status
+
+
+internal_router = APIRouter(prefix='/internal', tags=['Internal'])
+
+
+@internal_router.get('/db-pool')
+async def db_pool_stats():
+    pools = {'primary': pool_status(engine)}
+    for replica in replica_engines:
+        name = replica.sync_engine.pool.logging_name
+        pools[name] = {**pool_status(replica), 'lag_seconds': replica_set.lag[name]}
+    return pools
+
+
+@internal_router.get('/cache')
+async def response_cache_stats():
+    return cache_stats.snapshot()
+
+
+@internal_router.get('/idempotency')
+async def idempotency_key_stats():
+    return idempotency_stats.snapshot()
+
+
+@internal_router.get('/dispatch')
+async def courier_dispatch_stats():
+    return {**dispatch_stats.snapshot(), 'index': courier_index.snapshot()}
+
+
+@internal_router.get('/locations')
+async def courier_location_stats():
+    return location_stats.snapshot()
+
+
+@internal_router.get('/tracking')
+async def order_tracking_stats():
+    return tracking_stats.snapshot()
+
+
+@internal_router.get('/outbox')
+async def outbox_stats():
+    return {**await backlog(), 'workers': await worker_stats()}
+
+
+@internal_router.get('/queries')
+async def sql_query_stats():
+    return query_stats.snapshot()
+
+
+@internal_router.get('/passwords')
+async def password_hasher_stats():
+    return password_hasher.snapshot()
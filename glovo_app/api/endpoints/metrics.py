@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from glovo_app.metrics.http import render_metrics
+
+
+metrics_router = APIRouter(tags=['Internal'])
+
+
+@metrics_router.get('/metrics', include_in_schema=False)
+async def prometheus_metrics():
+    # Rendered on the event loop, the only thread that updates the request stats, so a scrape
+    # never sees a histogram half way through an observation.
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
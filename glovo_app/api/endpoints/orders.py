@@ -1,63 +1,134 @@
-from typing import List
+import time
+from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import OrderSchema
-from glovo_app.db.models import Order
+from sqlalchemy import select, insert, update, delete, func, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from fastapi import Depends, HTTPException, status, APIRouter, Query, Header
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import OrderSchema, OrderDetailSchema, CheckoutSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import Order, OrderItem, Cart, CartItem, Product
+from glovo_app.security.current_user import Principal, get_current_user
+from glovo_app.outbox.worker import enqueue
+from glovo_app.tracking.events import publish_order_event
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 order_router = APIRouter(prefix='/order', tags=['Order'])
 
 
 @order_router.post('/create', response_model=OrderSchema)
-async def create_product(order: OrderSchema, db: Session = Depends(get_db)):
+async def create_product(order: OrderSchema, db: AsyncSession = Depends(get_db)):
     db_order = Order(**order.dict())
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.flush()
+    enqueue(db, 'order.created', {'order_id': db_order.id, 'at': time.time()})
+    await db.commit()
+    await db.refresh(db_order)
     return db_order
 
 
-@order_router.get('/', response_model=List[OrderSchema])
-async def list_order(db: Session = Depends(get_db)):
-    return db.query(Order).all()
+async def load_order(db: AsyncSession, *criteria):
+    return await db.scalar(select(Order).options(selectinload(Order.items)).where(*criteria)
+                           .execution_options(populate_existing=True))
+
+
+@order_router.post('/checkout', response_model=OrderDetailSchema)
+async def checkout(checkout_data: CheckoutSchema,
+                   idempotency_key: Optional[str] = Header(None, max_length=64),
+                   current_user: Principal = Depends(get_current_user),
+                   db: AsyncSession = Depends(get_db)):
+    """Turn the caller's cart into an order in one transaction.
+
+    Items are snapshotted at the current product price with a single INSERT ... SELECT and
+    the total is summed in SQL. A retry with the same Idempotency-Key returns the first order.
+    """
+    if idempotency_key:
+        order = await load_order(db, Order.client_id == current_user.id, Order.idempotency_key == idempotency_key)
+        if order is not None:
+            return order
+
+    cart = await db.scalar(select(Cart).where(Cart.user_id == current_user.id).with_for_update())
+    if cart is None:
+        raise HTTPException(status_code=404, detail='Cart Not Found')
+
+    order = Order(client_id=current_user.id, delivery_address=checkout_data.delivery_address,
+                  idempotency_key=idempotency_key)
+    db.add(order)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # A concurrent retry with the same key committed first.
+        await db.rollback()
+        return await load_order(db, Order.client_id == current_user.id, Order.idempotency_key == idempotency_key)
+
+    snapshot = (
+        select(literal(order.id), CartItem.product_id, CartItem.quantity, Product.price)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.cart_id == cart.id)
+    )
+    copied = await db.execute(insert(OrderItem).from_select(['order_id', 'product_id', 'quantity', 'price'], snapshot))
+    if not copied.rowcount:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail='Cart is empty')
+
+    await db.execute(
+        update(Order).where(Order.id == order.id)
+        .values(total_price=select(func.sum(OrderItem.price * OrderItem.quantity))
+                .where(OrderItem.order_id == order.id).scalar_subquery())
+    )
+    await db.execute(delete(CartItem).where(CartItem.cart_id == cart.id))
+    enqueue(db, 'order.created', {'order_id': order.id, 'at': time.time()})
+    await db.commit()
+
+    order = await load_order(db, Order.id == order.id)
+    await publish_order_event(order.id, order.status, order.courier_id)
+    return order
+
+
+@order_router.get('/', response_model=CursorPage[OrderSchema])
+async def list_order(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                     stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(Order), [Order.id], cursor, size, stream, OrderSchema)
 
 
 @order_router.get('/{order_id}/', response_model=OrderSchema)
-async def detail_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def detail_order(order_id: int, db: AsyncSession = Depends(get_read_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='Order Not Found')
     return order
 
 
 @order_router.put('/update', response_model=OrderSchema)
-async def update_order(order_id: int, order_data: OrderSchema, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def update_order(order_id: int, order_data: OrderSchema, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='Order Not Found')
-    return order
 
-    for order_key, order_value in order_data.dict().items():
+    previous = (order.status, order.courier_id)
+    for order_key, order_value in order_data.dict(exclude={'id', 'created_date'}).items():
         setattr(order, order_key, order_value)
-    db.commit()
-    db.refresh(order)
+    if order.status != previous[0]:
+        enqueue(db, 'order.status_changed', {'order_id': order.id, 'status': order.status.value,
+                                             'previous_status': previous[0].value, 'courier_id': order.courier_id})
+    if order.courier_id != previous[1]:
+        enqueue(db, 'order.courier_changed', {'order_id': order.id, 'courier_id': order.courier_id,
+                                              'previous_courier_id': previous[1]})
+    await db.commit()
+    await db.refresh(order)
+    if (order.status, order.courier_id) != previous:
+        await publish_order_event(order.id, order.status, order.courier_id, previous_courier_id=previous[1])
     return order
 
 
 @order_router.delete('/delete')
-async def delete_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def delete_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='Order Not Found')
-    db.delete(order)
-    db.commit()
+    await db.delete(order)
+    await db.commit()
     return {'message': 'This Order is deleted'}
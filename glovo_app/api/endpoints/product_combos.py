@@ -1,64 +1,127 @@
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import ProductComboSchema
-from glovo_app.db.models import ProductCombo
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query, Body
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import ProductComboSchema, CursorPage, BulkItemResult
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.db.bulk import (check_batch_size, validate_items, require_ids, check_references, existing_ids, upsert,
+                               update_rows, delete_ids)
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import ProductCombo, Store
+from glovo_app.cache.response import cache_response, invalidate_tags
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 product_combo_router = APIRouter(prefix='/product_combo', tags=['ProductCombo'])
 
+COMBO_KEY = ('combo_name',)
+
 
 @product_combo_router.post('/create', response_model=ProductComboSchema)
-async def create_product_combo(combo: ProductComboSchema, db: Session = Depends(get_db)):
+async def create_product_combo(combo: ProductComboSchema, db: AsyncSession = Depends(get_db)):
     db_combo = ProductCombo(**combo.dict())
     db.add(db_combo)
-    db.commit()
-    db.refresh(db_combo)
+    await db.commit()
+    await db.refresh(db_combo)
+    await invalidate_tags('product_combo')
     return db_combo
 
 
-@product_combo_router.get('/', response_model=List[ProductComboSchema])
-async def list_combo(db: Session = Depends(get_db)):
-    return db.query(ProductCombo).all()
+@product_combo_router.post('/bulk', response_model=List[BulkItemResult])
+async def bulk_upsert_combos(items: List[dict] = Body(...), db: AsyncSession = Depends(get_db)):
+    """Create or update combos keyed on combo_name; client ids are ignored."""
+    check_batch_size(items)
+    valid, results = validate_items(items, ProductComboSchema)
+    valid = await check_references(db, valid, results, Store, 'store_id', 'Store Not Found')
+
+    if valid:
+        rows = {index: combo.dict(exclude={'id'}) for index, combo in valid}
+        written = await upsert(db, ProductCombo, list(rows.values()), COMBO_KEY)
+        await db.commit()
+        for index, row in rows.items():
+            combo, created = written[tuple(row[column] for column in COMBO_KEY)]
+            results[index] = {'index': index, 'status': 'created' if created else 'updated', 'id': combo.id}
+        await invalidate_tags('product_combo', *(f'product_combo:{combo.id}' for combo, _ in written.values()))
+
+    return [results[index] for index in range(len(items))]
+
+
+@product_combo_router.put('/bulk', response_model=List[BulkItemResult])
+async def bulk_update_combos(items: List[dict] = Body(...), db: AsyncSession = Depends(get_db)):
+    check_batch_size(items)
+    valid, results = validate_items(items, ProductComboSchema)
+    valid = require_ids(valid, results)
+    valid = await check_references(db, valid, results, Store, 'store_id', 'Store Not Found')
+    found = await existing_ids(db, ProductCombo, {combo.id for _, combo in valid})
+
+    rows = {}
+    for index, combo in valid:
+        if combo.id in found:
+            rows[index] = combo.dict()
+            results[index] = {'index': index, 'status': 'updated', 'id': combo.id}
+        else:
+            results[index] = {'index': index, 'status': 'not_found', 'id': combo.id}
+
+    if rows:
+        updated = await update_rows(db, ProductCombo, rows, results)
+        await db.commit()
+        if updated:
+            await invalidate_tags('product_combo', *(f'product_combo:{combo_id}' for combo_id in updated))
+
+    return [results[index] for index in range(len(items))]
+
+
+@product_combo_router.delete('/bulk', response_model=List[BulkItemResult])
+async def bulk_delete_combos(ids: List[int] = Body(...), db: AsyncSession = Depends(get_db)):
+    check_batch_size(ids)
+    deleted, conflicts = await delete_ids(db, ProductCombo, ids)
+    await db.commit()
+    if deleted:
+        await invalidate_tags('product_combo', *(f'product_combo:{combo_id}' for combo_id in deleted))
+    return [{'index': index, 'id': combo_id,
+             'status': 'deleted' if combo_id in deleted else 'conflict' if combo_id in conflicts else 'not_found'}
+            for index, combo_id in enumerate(ids)]
+
+
+@product_combo_router.get('/', response_model=CursorPage[ProductComboSchema])
+@cache_response(CursorPage[ProductComboSchema], 'product_combo')
+async def list_combo(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                     stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(ProductCombo), [ProductCombo.id], cursor, size, stream,
+                                    ProductComboSchema)
 
 
 @product_combo_router.get('/{product_combo_id}/', response_model=ProductComboSchema)
-async def detail_combo(combo_id: int, db: Session = Depends(get_db)):
-    combo = db.query(ProductCombo).filter(ProductCombo.id == combo_id).first()
+@cache_response(ProductComboSchema, 'product_combo:{combo_id}')
+async def detail_combo(combo_id: int, db: AsyncSession = Depends(get_read_db)):
+    combo = await db.scalar(select(ProductCombo).where(ProductCombo.id == combo_id))
     if combo is None:
         raise HTTPException(status_code=404, detail='ProductCombo Not Found')
     return combo
 
 
 @product_combo_router.put('/update', response_model=ProductComboSchema)
-async def update_combo(combo_id: int, combo_data: ProductComboSchema, db: Session = Depends(get_db)):
-    combo = db.query(ProductCombo).filter(ProductCombo.id == combo_id).first()
+async def update_combo(combo_id: int, combo_data: ProductComboSchema, db: AsyncSession = Depends(get_db)):
+    combo = await db.scalar(select(ProductCombo).where(ProductCombo.id == combo_id))
     if combo is None:
         raise HTTPException(status_code=404, detail='ProductCombo Not Found')
-    return combo
 
-    for combo_key, combo_value in combo_data.dict().items():
+    for combo_key, combo_value in combo_data.dict(exclude={'id'}).items():
         setattr(combo, combo_key, combo_value)
-    db.commit()
-    db.refresh(combo)
+    await db.commit()
+    await db.refresh(combo)
+    await invalidate_tags('product_combo', f'product_combo:{combo_id}')
     return combo
 
 
 @product_combo_router.delete('/delete')
-async def delete_combo(combo_id: int, db: Session = Depends(get_db)):
-    combo = db.query(ProductCombo).filter(ProductCombo.id == combo_id).first()
+async def delete_combo(combo_id: int, db: AsyncSession = Depends(get_db)):
+    combo = await db.scalar(select(ProductCombo).where(ProductCombo.id == combo_id))
     if combo is None:
         raise HTTPException(status_code=404, detail='ProductCombo Not Found')
-    db.delete(combo)
-    db.commit()
+    await db.delete(combo)
+    await db.commit()
+    await invalidate_tags('product_combo', f'product_combo:{combo_id}')
     return {'message': 'This ProductCombo is deleted'}
 
@@ -1,98 +1,205 @@
 from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter, Query
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import ProductSchema
-from glovo_app.db.models import Product
+from sqlalchemy import select
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query, Body
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import ProductSchema, OffsetPage, CursorPage, BulkItemResult
+from glovo_app.db.pagination import keyset_page, cached_count
+from glovo_app.db.bulk import (check_batch_size, validate_items, require_ids, check_references, existing_ids, upsert,
+                               update_rows, delete_ids)
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import Product, Store
+from glovo_app.search.engine import search_backend
+from glovo_app.search.backends import fetch_ordered
+from glovo_app.rankings.leaderboard import top_products
+from glovo_app.cache.response import cache_response, invalidate_tags
+from glovo_app.metrics.sql import query_budget
 
 from sqlalchemy import asc, desc
-from fastapi_pagination import Page, add_pagination, paginate
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 product_router = APIRouter(prefix='/product', tags=['Product'])
 
+PRODUCT_KEY = ('store_id', 'product_name')
+
 
 @product_router.get('/search/', response_model=List[ProductSchema])
-async def search_product(product_name: str, db: Session = Depends(get_db)):
-    product_db = db.query(Product).filter(Product.product_name.ilike(f'%{product_name}%')).all()
-    if product_db is None:
-        raise HTTPException(status_code=404, detail='Product Not Found')
-    return product_db
+async def search_product(product_name: str = Query(..., min_length=1),
+                         page: int = Query(1, ge=1),
+                         size: int = Query(20, ge=1, le=PAGE_SIZE_MAX),
+                         db: AsyncSession = Depends(get_read_db)):
+    return await search_backend.search(db, Product, product_name, limit=size, offset=(page - 1) * size)
 
 
 @product_router.post('/create/', response_model=ProductSchema)
-async def create_product(product: ProductSchema, db: Session = Depends(get_db)):
+async def create_product(product: ProductSchema, db: AsyncSession = Depends(get_db)):
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await db.refresh(db_product)
+    await search_backend.index(db_product)
     return db_product
 
 
-@product_router.get('/', response_model=Page[ProductSchema],)
+@product_router.post('/bulk/', response_model=List[BulkItemResult])
+async def bulk_upsert_products(items: List[dict] = Body(...), db: AsyncSession = Depends(get_db)):
+    """Create or update products keyed on (store_id, product_name); client ids are ignored."""
+    check_batch_size(items)
+    valid, results = validate_items(items, ProductSchema)
+    valid = await check_references(db, valid, results, Store, 'store_id', 'Store Not Found')
+
+    if valid:
+        rows = {index: product.dict(exclude={'id'}) for index, product in valid}
+        written = await upsert(db, Product, list(rows.values()), PRODUCT_KEY)
+        await db.commit()
+        for index, row in rows.items():
+            product, created = written[tuple(row[column] for column in PRODUCT_KEY)]
+            results[index] = {'index': index, 'status': 'created' if created else 'updated', 'id': product.id}
+        for product, _ in written.values():
+            await search_backend.index(product)
+        await invalidate_tags(*(f'product:{product.id}' for product, _ in written.values()))
+
+    return [results[index] for index in range(len(items))]
+
+
+@product_router.put('/bulk/', response_model=List[BulkItemResult])
+async def bulk_update_products(items: List[dict] = Body(...), db: AsyncSession = Depends(get_db)):
+    check_batch_size(items)
+    valid, results = validate_items(items, ProductSchema)
+    valid = require_ids(valid, results)
+    valid = await check_references(db, valid, results, Store, 'store_id', 'Store Not Found')
+    found = await existing_ids(db, Product, {product.id for _, product in valid})
+
+    rows = {}
+    for index, product in valid:
+        if product.id in found:
+            rows[index] = product.dict()
+            results[index] = {'index': index, 'status': 'updated', 'id': product.id}
+        else:
+            results[index] = {'index': index, 'status': 'not_found', 'id': product.id}
+
+    if rows:
+        updated = await update_rows(db, Product, rows, results)
+        await db.commit()
+        if updated:
+            for product in (await db.scalars(select(Product).where(Product.id.in_(updated)))).all():
+                await search_backend.index(product)
+            await invalidate_tags(*(f'product:{product_id}' for product_id in updated))
+
+    return [results[index] for index in range(len(items))]
+
+
+@product_router.delete('/bulk/', response_model=List[BulkItemResult])
+async def bulk_delete_products(ids: List[int] = Body(...), db: AsyncSession = Depends(get_db)):
+    check_batch_size(ids)
+    deleted, conflicts = await delete_ids(db, Product, ids)
+    await db.commit()
+    for product_id in deleted:
+        await search_backend.remove(Product, product_id)
+    if deleted:
+        await invalidate_tags(*(f'product:{product_id}' for product_id in deleted))
+    return [{'index': index, 'id': product_id,
+             'status': 'deleted' if product_id in deleted else 'conflict' if product_id in conflicts else 'not_found'}
+            for index, product_id in enumerate(ids)]
+
+
+def filter_products(query, min_price: Optional[float], max_price: Optional[float]):
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
+    return query
+
+
+@product_router.get('/', response_model=OffsetPage[ProductSchema],
+                    dependencies=[Depends(query_budget(2))])
 async def list_product(min_price: Optional[float] = Query(None, alias='price[from]'),
                        max_price: Optional[float] = Query(None, alias='price[to]'),
                        order_by: Optional[str] = Query(None, regex='^(asc|desc)$'),
+                       page: int = Query(1, ge=1),
+                       size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                       with_total: bool = False,
+                       db: AsyncSession = Depends(get_read_db)):
+
+    query = filter_products(select(Product), min_price, max_price)
 
-                       db: Session = Depends(get_db)):
+    if order_by == 'asc':
+        query = query.order_by(asc(Product.price), asc(Product.id))
+    elif order_by == 'desc':
+        query = query.order_by(desc(Product.price), desc(Product.id))
+    else:
+        query = query.order_by(Product.id)
 
-    query = db.query(Product)
+    products = (await db.scalars(query.limit(size).offset((page - 1) * size))).all()
 
-    if min_price is not None:
-        query = query.filter(Product.price >= min_price)
+    total = pages = None
+    if with_total:
+        total = await cached_count(db, query)
+        pages = -(-total // size)
 
-    if max_price is not None:
-        query = query.filter(Product.price <= max_price)
+    return {'items': products, 'page': page, 'size': size, 'total': total, 'pages': pages}
 
-    if order_by == 'asc':
-        query = query.order_by(asc(Product.price))
-    elif order_by == 'desc':
-        query = query.order_by(desc(Product.price))
 
-    products = query.all()
+@product_router.get('/cursor/', response_model=CursorPage[ProductSchema],
+                    dependencies=[Depends(query_budget(1))])
+async def list_product_cursor(min_price: Optional[float] = Query(None, alias='price[from]'),
+                              max_price: Optional[float] = Query(None, alias='price[to]'),
+                              order_by: str = Query('asc', regex='^(asc|desc)$'),
+                              cursor: Optional[str] = None,
+                              size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                              db: AsyncSession = Depends(get_read_db)):
 
-    if products is None:
-        raise HTTPException(status_code=404, detail='Product Not Found')
+    query = filter_products(select(Product), min_price, max_price)
+    products, next_cursor = await keyset_page(db, query, [Product.price, Product.id], cursor, size,
+                                              descending=order_by == 'desc')
+    return {'items': products, 'next_cursor': next_cursor}
 
-    return paginate(products)
+
+@product_router.get('/top/', response_model=List[ProductSchema])
+async def list_top_products(store_id: int, limit: int = Query(20, ge=1, le=PAGE_SIZE_MAX),
+                            offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_read_db)):
+    try:
+        product_ids = await top_products(store_id, limit, offset)
+    except RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Rankings unavailable')
+    return await fetch_ordered(db, Product, product_ids)
 
 
 @product_router.get('/{product_id}/', response_model=ProductSchema)
-async def detail_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+@cache_response(ProductSchema, 'product:{product_id}')
+async def detail_product(product_id: int, db: AsyncSession = Depends(get_read_db)):
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if product is None:
         raise HTTPException(status_code=404, detail='Product Not Found')
     return product
 
 
 @product_router.put('/update/', response_model=ProductSchema)
-async def update_product(product_id: int, product_data: ProductSchema, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def update_product(product_id: int, product_data: ProductSchema, db: AsyncSession = Depends(get_db)):
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if product is None:
         raise HTTPException(status_code=404, detail='Product Not Found')
-    return product
 
-    for product_key, product_value in product_data.dict().items():
+    for product_key, product_value in product_data.dict(exclude={'id'}).items():
         setattr(product, product_key, product_value)
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
+    await search_backend.index(product)
+    await invalidate_tags(f'product:{product_id}')
     return product
 
 
 @product_router.delete('/{product.id}/')
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if product is None:
         raise HTTPException(status_code=404, detail='Product Not Found')
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    await search_backend.remove(Product, product_id)
+    await invalidate_tags(f'product:{product_id}')
     return {'message': 'This Product is deleted'}
 
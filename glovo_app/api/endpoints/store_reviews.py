@@ -1,64 +1,71 @@
-from typing import List
+from typing import List, Optional
 
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, status, APIRouter
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import StoreReviewSchema
-from glovo_app.db.models import StoreReview
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, status, APIRouter, Query
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import StoreReviewSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
+from glovo_app.db.models import StoreReview, StoreRating
+from glovo_app.ratings.aggregates import apply_rating, move_rating
+from glovo_app.cache.response import invalidate_tags
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 store_review_router = APIRouter(prefix='/store_review', tags=['StoreReview'])
 
 
 @store_review_router.post('/create', response_model=StoreReviewSchema)
-async def create_review(review: StoreReviewSchema, db: Session = Depends(get_db)):
-    db_review = StoreReview(**review.dict())
+async def create_review(review: StoreReviewSchema, db: AsyncSession = Depends(get_db)):
+    db_review = StoreReview(**review.dict(exclude_none=True))
     db.add(db_review)
-    db.commit()
-    db.refresh(db_review)
+    await db.flush()
+    await apply_rating(db, StoreRating, db_review.store, db_review.rating)
+    await db.commit()
+    await db.refresh(db_review)
+    await invalidate_tags(f'store:{db_review.store}')
     return db_review
 
 
-@store_review_router.get('/', response_model=List[StoreReviewSchema])
-async def list_review(db: Session = Depends(get_db)):
-    return db.query(StoreReview).all()
+@store_review_router.get('/', response_model=CursorPage[StoreReviewSchema])
+async def list_review(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                      stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(StoreReview), [StoreReview.id], cursor, size, stream, StoreReviewSchema)
 
 
 @store_review_router.get('/{store_review_id}', response_model=StoreReviewSchema)
-async def detail_review(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(StoreReview).filter(StoreReview.id == review_id).first()
+async def detail_review(review_id: int, db: AsyncSession = Depends(get_read_db)):
+    review = await db.scalar(select(StoreReview).where(StoreReview.id == review_id))
     if review is None:
         raise HTTPException(status_code=404, detail='StoreReview Not Found')
     return review
 
 
 @store_review_router.put('/update', response_model=StoreReviewSchema)
-async def update_review(review_id: int, review_data: StoreReviewSchema, db: Session = Depends(get_db)):
-    review = db.query(StoreReview).filter(StoreReview.id == review_id).first()
+async def update_review(review_id: int, review_data: StoreReviewSchema, db: AsyncSession = Depends(get_db)):
+    review = await db.scalar(select(StoreReview).where(StoreReview.id == review_id))
     if review is None:
         raise HTTPException(status_code=404, detail='StoreReview Not Found')
-    return review
 
-    for review_key, review_value in review_data.dict().items():
+    old_store, old_rating = review.store, review.rating
+    for review_key, review_value in review_data.dict(exclude={'id', 'created_date'}).items():
         setattr(review, review_key, review_value)
-    db.commit()
-    db.refresh(review)
+    await db.flush()
+    await move_rating(db, StoreRating, old_store, old_rating, review.store, review.rating)
+    await db.commit()
+    await db.refresh(review)
+    await invalidate_tags(f'store:{old_store}', f'store:{review.store}')
     return review
 
 
 @store_review_router.delete('/delete')
-async def delete_review(review_id: int, db: Session = Depends(get_db)):
-    review = db.query(StoreReview).filter(StoreReview.id == review_id).first()
+async def delete_review(review_id: int, db: AsyncSession = Depends(get_db)):
+    review = await db.scalar(select(StoreReview).where(StoreReview.id == review_id))
     if review is None:
         raise HTTPException(status_code=404, detail='StoreReview Not Found')
-    db.delete(review)
-    db.commit()
+    await apply_rating(db, StoreRating, review.store, review.rating, -1)
+    await db.delete(review)
+    await db.commit()
+    await invalidate_tags(f'store:{review.store}')
     return {'message': 'This StoreReview is deleted'}
 
@@ -1,72 +1,92 @@
 from typing import List, Optional
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status, APIRouter, Query
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import StoreSchema
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.schema import StoreSchema, StoreWithRatingSchema
 from glovo_app.db.models import Store, Category
+from glovo_app.search.engine import search_backend
+from glovo_app.rankings.leaderboard import top_stores
+from glovo_app.cache.response import cache_response, invalidate_tags
+from glovo_app.config import PAGE_SIZE_MAX
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 store_router = APIRouter(prefix='/store', tags=['Store'])
 
 
 @store_router.get('/search/', response_model=List[StoreSchema])
-async def search_product(store_name: str, db: Session = Depends(get_db)):
-    store_db = db.query(Store).filter(Store.store_name.ilike(f'%{store_name}%')).all()
-    if store_db is None:
-        raise HTTPException(status_code=404, detail='Store Not Found')
-    return store_db
+async def search_product(store_name: str = Query(..., min_length=1),
+                         page: int = Query(1, ge=1),
+                         size: int = Query(20, ge=1, le=PAGE_SIZE_MAX),
+                         db: AsyncSession = Depends(get_read_db)):
+    return await search_backend.search(db, Store, store_name, limit=size, offset=(page - 1) * size)
 
 
 @store_router.post('/create/', response_model=StoreSchema)
-async def create_store(store: StoreSchema, db: Session = Depends(get_db)):
+async def create_store(store: StoreSchema, db: AsyncSession = Depends(get_db)):
     db_store = Store(**store.dict())
     db.add(db_store)
-    db.commit()
-    db.refresh(db_store)
+    await db.commit()
+    await db.refresh(db_store)
+    await search_backend.index(db_store)
     return db_store
 
 
-@store_router.get('/', response_model=List[StoreSchema])
-async def list_product(category_name: Optional[str] = None, db: Session = Depends(get_db)):
+@store_router.get('/', response_model=List[StoreWithRatingSchema])
+async def list_product(category_name: Optional[str] = None, db: AsyncSession = Depends(get_read_db)):
 
-    store = db.query(Store).join(Category).filter(Category.category_name == category_name)
+    store = (await db.scalars(select(Store).join(Category).where(Category.category_name == category_name)
+                              .options(selectinload(Store.rating)))).all()
     if not store:
         raise HTTPException(status_code=404, detail='Store Not Found')
     return store
 
 
-@store_router.get('/{store_id}/', response_model=StoreSchema)
-async def detail_store(store_id: int, db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+@store_router.get('/top/', response_model=List[StoreWithRatingSchema])
+async def list_top_stores(category_id: int, limit: int = Query(20, ge=1, le=PAGE_SIZE_MAX),
+                          offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_read_db)):
+    try:
+        store_ids = await top_stores(category_id, limit, offset)
+    except RedisError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Rankings unavailable')
+    stores = (await db.scalars(select(Store).where(Store.id.in_(store_ids)).options(selectinload(Store.rating)))).all()
+    by_id = {store.id: store for store in stores}
+    return [by_id[store_id] for store_id in store_ids if store_id in by_id]
+
+
+@store_router.get('/{store_id}/', response_model=StoreWithRatingSchema)
+@cache_response(StoreWithRatingSchema, 'store:{store_id}')
+async def detail_store(store_id: int, db: AsyncSession = Depends(get_read_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id).options(selectinload(Store.rating)))
     if store is None:
         raise HTTPException(status_code=404, detail='Store Not Found')
     return store
 
 
 @store_router.put('/{store_id}/', response_model=StoreSchema)
-async def update_store(store_id: int, store_data: StoreSchema,  db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+async def update_store(store_id: int, store_data: StoreSchema,  db: AsyncSession = Depends(get_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id))
     if store is None:
         raise HTTPException(status_code=404, detail='Store Not Found')
 
     for store_key, store_value in store_data.dict().items():
         setattr(store, store_key, store_value)
-    db.commit()
-    db.refresh(store)
+    await db.commit()
+    await db.refresh(store)
+    await search_backend.index(store)
+    await invalidate_tags(f'store:{store_id}')
     return store
 
 
 @store_router.delete('/{store_id}/')
-async def delete_store(store_id: int, db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+async def delete_store(store_id: int, db: AsyncSession = Depends(get_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id))
     if store is None:
         raise HTTPException(status_code=404, detail='Store Not Found')
-    db.delete(store)
+    await db.delete(store)
+    await db.commit()
+    await search_backend.remove(Store, store_id)
+    await invalidate_tags(f'store:{store_id}')
     return {'message': 'This store is deleted'}
\ No newline at end of file
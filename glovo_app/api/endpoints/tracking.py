@@ -0,0 +1,146 @@
+import json
+
+import anyio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from starlette.background import BackgroundTask
+
+from glovo_app.config import TRACKING_HEARTBEAT_SECONDS
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Order, StatusChoices
+from glovo_app.tracking.events import (tracking_broker, TooManySubscribers, order_event, order_topic, courier_topic,
+                                       RESYNC)
+
+
+tracking_router = APIRouter(prefix='/track', tags=['Tracking'])
+
+ACTIVE_STATUSES = (StatusChoices.str1, StatusChoices.str2)
+HEARTBEAT = {'type': 'heartbeat'}
+
+
+# Snapshots read the primary: a lagging replica could return a state older than events the
+# client has already been sent.
+async def order_snapshot(order_id: int):
+    async with SessionLocal() as db:
+        row = (await db.execute(select(Order.id, Order.status, Order.courier_id).where(Order.id == order_id))).first()
+    return None if row is None else [order_event(*row)]
+
+
+async def courier_snapshot(courier_id: int):
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(Order.id, Order.status, Order.courier_id)
+            .where(Order.courier_id == courier_id, Order.status.in_(ACTIVE_STATUSES))
+            .order_by(Order.id)
+        )).all()
+    return [order_event(*row) for row in rows]
+
+
+async def follow(subscription, snapshot, initial: list[dict]):
+    """The current state first, then live events, with heartbeats while nothing happens."""
+    for event in initial:
+        yield event
+    while True:
+        event = await subscription.next(TRACKING_HEARTBEAT_SECONDS)
+        if event is None:
+            yield HEARTBEAT
+        elif event is RESYNC:
+            for current in await snapshot() or []:
+                yield current
+        else:
+            yield event
+
+
+def sse_message(event: dict) -> str:
+    if event is HEARTBEAT:
+        return ': heartbeat\n\n'
+    return f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+
+
+async def open_stream(topic: str, snapshot):
+    """Subscribe, then read the current state.
+
+    In that order, an event published while the snapshot is read waits in the queue instead of
+    being lost; one that overlaps the snapshot is delivered again, which is harmless since every
+    event carries the full state of its order. Raises 404 when the snapshot is None.
+    """
+    try:
+        subscription = tracking_broker.subscribe(topic)
+    except TooManySubscribers:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Too many subscribers')
+    try:
+        initial = await snapshot()
+    except BaseException:
+        tracking_broker.unsubscribe(subscription)
+        raise
+    if initial is None:
+        tracking_broker.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail='Order Not Found')
+    return subscription, initial
+
+
+async def sse_response(topic: str, snapshot):
+    subscription, initial = await open_stream(topic, snapshot)
+
+    async def body():
+        try:
+            async for event in follow(subscription, snapshot, initial):
+                yield sse_message(event)
+        finally:
+            tracking_broker.unsubscribe(subscription)
+
+    # The background task covers clients that disconnect before the body generator is closed.
+    return StreamingResponse(body(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                             background=BackgroundTask(tracking_broker.unsubscribe, subscription))
+
+
+async def websocket_stream(websocket: WebSocket, topic: str, snapshot):
+    try:
+        subscription, initial = await open_stream(topic, snapshot)
+    except HTTPException as exc:
+        code = status.WS_1013_TRY_AGAIN_LATER if exc.status_code == 503 else status.WS_1008_POLICY_VIOLATION
+        raise WebSocketException(code=code, reason=exc.detail)
+
+    async def forward(scope):
+        async for event in follow(subscription, snapshot, initial):
+            await websocket.send_json(event)
+        scope.cancel()
+
+    async def closed(scope):
+        # Nothing is expected from the client; reading only notices it going away between events.
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+        scope.cancel()
+
+    await websocket.accept()
+    try:
+        async with anyio.create_task_group() as group:
+            group.start_soon(forward, group.cancel_scope)
+            group.start_soon(closed, group.cancel_scope)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tracking_broker.unsubscribe(subscription)
+
+
+@tracking_router.get('/order/{order_id}/events')
+async def order_events(order_id: int):
+    return await sse_response(order_topic(order_id), lambda: order_snapshot(order_id))
+
+
+@tracking_router.websocket('/order/{order_id}/ws')
+async def order_socket(websocket: WebSocket, order_id: int):
+    await websocket_stream(websocket, order_topic(order_id), lambda: order_snapshot(order_id))
+
+
+@tracking_router.get('/courier/{courier_id}/events')
+async def courier_events(courier_id: int):
+    """``courier_id`` is the courier's user id, as stored in ``Order.courier_id``."""
+    return await sse_response(courier_topic(courier_id), lambda: courier_snapshot(courier_id))
+
+
+@tracking_router.websocket('/courier/{courier_id}/ws')
+async def courier_socket(websocket: WebSocket, courier_id: int):
+    await websocket_stream(websocket, courier_topic(courier_id), lambda: courier_snapshot(courier_id))
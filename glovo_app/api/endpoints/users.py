@@ -1,65 +1,63 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.database import SessionLocal
+from glovo_app.db.database import get_db, get_read_db
 from glovo_app.db.models import UserProfile
-from glovo_app.db.schema import UserProfileSchema
+from glovo_app.db.schema import UserProfileSchema, CursorPage
+from glovo_app.db.pagination import paginate_or_stream
+from glovo_app.config import PAGE_SIZE_MAX
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close
-
 user_router = APIRouter(prefix='/users', tags=['UserProfile'])
 
 
 @user_router.post('/create', response_model=UserProfileSchema)
-async def create_user(user: UserProfileSchema, db: Session = Depends(get_db)):
-    db.user = UserProfile(**user.dict())
-    db.add(db.user)
-    db.commit()
-    db.refresh(db.user)
-    return db.user
+async def create_user(user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    db_user = UserProfile(**user.dict())
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
 
 
-@user_router.get('/', response_model=List[UserProfileSchema])
-async def list_user(db: Session = Depends(get_db)):
-    return db.query(UserProfile).all()
+@user_router.get('/', response_model=CursorPage[UserProfileSchema])
+async def list_user(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+                    stream: bool = False, db: AsyncSession = Depends(get_read_db)):
+    return await paginate_or_stream(db, select(UserProfile), [UserProfile.id], cursor, size, stream,
+                                    UserProfileSchema)
 
 
 @user_router.get('/{user.id}/', response_model=UserProfileSchema)
-async def detail_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def detail_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.id == user_id))
     if user is None:
         raise HTTPException(status_code=404, detail='User Not Found')
     return user
 
 
 @user_router.put('/{user_id}/', response_model=UserProfileSchema)
-async def update_user(user_id: int, user_data: UserProfileSchema, db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def update_user(user_id: int, user_data: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.id == user_id))
     if user is None:
         raise HTTPException(status_code=404, detail='User Not Found')
     return user
 
     for user_key, user_value in user_data.dict().items():
         setattr(user, user_key, user_value)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @user_router.delete('/{user_id}/')
-async def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.id == user_id))
     if user is None:
         raise HTTPException(status_code=404, detail='User Not Found')
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
     return {'message': 'This user is deleted'}
 
 
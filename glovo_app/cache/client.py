@@ -0,0 +1,6 @@
+import redis.asyncio as redis
+
+from glovo_app.config import REDIS_URL
+
+
+redis_client = redis.Redis.from_url(REDIS_URL, encoding='utf-8', decode_responses=True)
@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import uuid
+
+from redis.exceptions import RedisError
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.response import RELEASE_LOCK
+from glovo_app.config import (IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_WAIT_SECONDS,
+                              IDEMPOTENCY_MAX_BODY_BYTES)
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {'POST', 'PUT'}
+HEADER = b'idempotency-key'
+# Responses of /auth/ carry credentials, which must not sit in Redis or be handed to whoever
+# repeats the key. Checkout handles the header itself, keying the order on it.
+EXCLUDED_PREFIXES = ('/auth/', '/order/checkout')
+
+# Either the stored response, or the lock for running the request, in one atomic step: with
+# a GET then SET NX, the first request could store its response and release the lock in
+# between, and the retry would run the handler a second time.
+CLAIM = """
+local stored = redis.call('get', KEYS[1])
+if stored then
+    return {'stored', stored}
+end
+if redis.call('set', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return {'locked'}
+end
+return {'busy'}
+"""
+
+
+class IdempotencyStats:
+    def __init__(self):
+        self.stored = 0
+        self.replays = 0
+        self.coalesced = 0
+        self.conflicts = 0
+        self.mismatches = 0
+        self.errors = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+idempotency_stats = IdempotencyStats()
+
+
+def request_key(scope, key: bytes) -> str:
+    """Keys are scoped to the caller and the target, so one client's key never replays for another."""
+    headers = dict(scope['headers'])
+    digest = hashlib.sha256()
+    for part in (scope['method'].encode(), scope['path'].encode(), scope['query_string'],
+                 headers.get(b'authorization', b''), key):
+        digest.update(part + b'\0')
+    return f'idempotency:{digest.hexdigest()}'
+
+
+async def wait_for(key: str):
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.01
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(delay)
+        stored = await redis_client.get(key)
+        if stored is not None:
+            return stored
+        delay = min(delay * 2, 0.2)
+    return None
+
+
+class BodyHasher:
+    """A ``receive`` that hashes the request body as the app reads it.
+
+    Nothing is buffered, so a keyed upload streams through in constant memory. ``drain``
+    reads and discards the rest of a body the app will not see, e.g. before a replay.
+    """
+
+    def __init__(self, receive):
+        self.receive = receive
+        self.digest = hashlib.sha256()
+        self.complete = False
+
+    async def __call__(self):
+        message = await self.receive()
+        if message['type'] == 'http.request':
+            self.digest.update(message.get('body', b''))
+            self.complete = not message.get('more_body', False)
+        return message
+
+    async def drain(self) -> str:
+        while not self.complete and (await self())['type'] == 'http.request':
+            pass
+        return self.digest.hexdigest()
+
+    def hexdigest(self) -> str | None:
+        """The body hash, or None if the app answered without reading the whole body."""
+        return self.digest.hexdigest() if self.complete else None
+
+
+async def replay(stored: str, body_sha256: str, send):
+    response = json.loads(stored)
+    if response.get('body_sha256') != body_sha256:
+        idempotency_stats.mismatches += 1
+        return await error(send, 422, 'Idempotency-Key was already used with a different request body')
+    idempotency_stats.replays += 1
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response['headers']]
+    await send({'type': 'http.response.start', 'status': response['status'],
+                'headers': headers + [(b'idempotent-replayed', b'true')]})
+    await send({'type': 'http.response.body', 'body': base64.b64decode(response['body'])})
+
+
+async def error(send, status: int, detail: str):
+    body = json.dumps({'detail': detail}).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class IdempotencyMiddleware:
+    """Store the response of POST/PUT requests carrying an Idempotency-Key and replay it on retries.
+
+    Concurrent requests with the same key are coalesced behind a Redis lock: one runs, the
+    rest wait for its stored response. 5xx responses are not stored so they can be retried.
+    A stored response is only replayed for the same request body; reusing a key with another
+    body is rejected with 422. The body is hashed as it streams to the app, and a response is
+    stored only if the app read all of it. If Redis is unavailable requests pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in IDEMPOTENT_METHODS \
+                or scope['path'].startswith(EXCLUDED_PREFIXES):
+            return await self.app(scope, receive, send)
+        key = dict(scope['headers']).get(HEADER)
+        if not key:
+            return await self.app(scope, receive, send)
+
+        body = BodyHasher(receive)
+        response_key = request_key(scope, key)
+        lock_key, token = f'{response_key}:lock', uuid.uuid4().hex
+        try:
+            claim = await redis_client.eval(CLAIM, 2, response_key, lock_key,
+                                            token, int(IDEMPOTENCY_LOCK_SECONDS * 1000))
+            stored = claim[1] if claim[0] == 'stored' else None
+            if claim[0] == 'busy':
+                idempotency_stats.coalesced += 1
+                stored = await wait_for(response_key)
+                if stored is None:
+                    idempotency_stats.conflicts += 1
+                    return await error(send, 409, 'A request with this Idempotency-Key is still in progress')
+        except RedisError:
+            idempotency_stats.errors += 1
+            logger.warning('Idempotency store unavailable', exc_info=True)
+            return await self.app(scope, body, send)
+
+        if stored is not None:
+            return await replay(stored, await body.drain(), send)
+
+        try:
+            await self.app(scope, body, self.recorder(response_key, body, send))
+        finally:
+            try:
+                await redis_client.eval(RELEASE_LOCK, 1, lock_key, token)
+            except RedisError:
+                idempotency_stats.errors += 1
+
+    def recorder(self, response_key: str, request_body: BodyHasher, send):
+        response = {'status': 500, 'headers': [], 'body': [], 'body_sha256': None}
+        size = 0
+
+        async def record(message):
+            nonlocal size
+            await send(message)
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [(name.decode('latin-1'), value.decode('latin-1'))
+                                       for name, value in message.get('headers', [])]
+            elif message['type'] == 'http.response.body':
+                body = message.get('body', b'')
+                size += len(body)
+                if size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                    response['body'].append(body)
+                response['body_sha256'] = request_body.hexdigest()
+                if not message.get('more_body', False) and response['status'] < 500 \
+                        and size <= IDEMPOTENCY_MAX_BODY_BYTES and response['body_sha256'] is not None \
+                        and not any(name.lower() == 'set-cookie' for name, _ in response['headers']):
+                    response['body'] = base64.b64encode(b''.join(response['body'])).decode()
+                    try:
+                        await redis_client.set(response_key, json.dumps(response), ex=IDEMPOTENCY_TTL_SECONDS)
+                        idempotency_stats.stored += 1
+                    except RedisError:
+                        idempotency_stats.errors += 1
+
+        return record
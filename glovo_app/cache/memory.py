@@ -0,0 +1,87 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class TaggedLRUCache:
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._data: OrderedDict = OrderedDict()
+        self._tags: dict[str, set] = {}
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value, size, tags = entry
+        if expires < time.monotonic():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value: str, tags=()):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        self.delete(key)
+        self._data[key] = (time.monotonic() + self.ttl, value, size, tuple(tags))
+        self.bytes += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self.delete(next(iter(self._data)))
+
+    def delete(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry[2]
+        for tag in entry[3]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tags(self, tags):
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self.delete(key)
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+        self.bytes = 0
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.memory import TaggedLRUCache
+from glovo_app.config import (CACHE_TTL_SECONDS, CACHE_LOCK_SECONDS, CACHE_LOCK_WAIT_SECONDS,
+                              L1_CACHE_MAX_BYTES, L1_CACHE_TTL_SECONDS)
+from glovo_app.db.routing import use_primary
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+# Long enough that a generation never expires while a response it guards is being rendered.
+GENERATION_TTL = 24 * 3600
+
+# KEYS: the response, then a (generation, tag set) pair per tag.
+# ARGV: the body, the TTL, then the generation of each tag read before the response was loaded.
+# Skips the SET if any tag was invalidated since, so a row read before a write is not cached
+# after that write's invalidation has already run.
+STORE_IF_CURRENT = """
+for i = 2, #KEYS, 2 do
+    if (redis.call('get', KEYS[i]) or '0') ~= ARGV[i / 2 + 2] then
+        return 0
+    end
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for i = 3, #KEYS, 2 do
+    redis.call('sadd', KEYS[i], KEYS[1])
+    redis.call('expire', KEYS[i], ARGV[2] * 2)
+end
+return 1
+"""
+
+
+class CacheStats:
+    def __init__(self):
+        self.local_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock_waits = 0
+        self.invalidations = 0
+        self.stale_skips = 0
+        self.errors = 0
+
+    def snapshot(self):
+        return {**vars(self), 'local_entries': len(local_cache._data), 'local_bytes': local_cache.bytes}
+
+
+cache_stats = CacheStats()
+local_cache = TaggedLRUCache(max_bytes=L1_CACHE_MAX_BYTES, ttl=L1_CACHE_TTL_SECONDS)
+
+
+def tag_key(tag: str) -> str:
+    return f'cache:tag:{tag}'
+
+
+def generation_key(tag: str) -> str:
+    return f'cache:gen:{tag}'
+
+
+def json_response(body: str) -> Response:
+    return Response(content=body, media_type='application/json')
+
+
+async def generations(tags: list[str]) -> list[str]:
+    return [value or '0' for value in await redis_client.mget([generation_key(tag) for tag in tags])] if tags else []
+
+
+async def store(key: str, body: str, tags: list[str], tag_generations: list[str], ttl: int) -> bool:
+    keys = [key]
+    for tag in tags:
+        keys += [generation_key(tag), tag_key(tag)]
+    return bool(await redis_client.eval(STORE_IF_CURRENT, len(keys), *keys, body, ttl, *tag_generations))
+
+
+async def wait_for(key: str):
+    deadline = asyncio.get_running_loop().time() + CACHE_LOCK_WAIT_SECONDS
+    delay = 0.01
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(delay)
+        body = await redis_client.get(key)
+        if body is not None:
+            return body
+        delay = min(delay * 2, 0.2)
+    return None
+
+
+async def cached_response(key: str, tags: list[str], loader, adapter: TypeAdapter, ttl: int = CACHE_TTL_SECONDS,
+                          sessions=()):
+    """Serve ``key`` from the local cache or Redis, or render it with ``loader`` and cache it.
+
+    A response that will be cached is loaded through ``sessions`` switched to the primary, as
+    a lagging replica could return a row older than the last invalidation of its tags.
+    """
+    async def render(cache: bool):
+        if cache:
+            for session in sessions:
+                use_primary(session)
+            try:
+                tag_generations = await generations(tags)
+            except RedisError:
+                cache_stats.errors += 1
+                cache = False
+        value = await loader()
+        if isinstance(value, Response):
+            return value
+        body = adapter.dump_json(adapter.validate_python(value, from_attributes=True)).decode()
+        if cache:
+            try:
+                if await store(key, body, tags, tag_generations, ttl):
+                    local_cache.set(key, body, tags)
+                else:
+                    cache_stats.stale_skips += 1
+            except RedisError:
+                cache_stats.errors += 1
+        return json_response(body)
+
+    body = local_cache.get(key)
+    if body is not None:
+        cache_stats.local_hits += 1
+        return json_response(body)
+
+    lock_key, token = f'{key}:lock', uuid.uuid4().hex
+    try:
+        body = await redis_client.get(key)
+        if body is not None:
+            cache_stats.hits += 1
+            local_cache.set(key, body, tags)
+            return json_response(body)
+        cache_stats.misses += 1
+        locked = await redis_client.set(lock_key, token, nx=True, px=int(CACHE_LOCK_SECONDS * 1000))
+        if not locked:
+            cache_stats.lock_waits += 1
+            body = await wait_for(key)
+            if body is not None:
+                return json_response(body)
+    except RedisError:
+        cache_stats.errors += 1
+        logger.warning('Response cache unavailable for %s', key, exc_info=True)
+        return await render(cache=False)
+
+    if not locked:
+        return await render(cache=False)
+    try:
+        return await render(cache=True)
+    finally:
+        try:
+            await redis_client.eval(RELEASE_LOCK, 1, lock_key, token)
+        except RedisError:
+            cache_stats.errors += 1
+
+
+async def invalidate_tags(*tags: str):
+    local_cache.invalidate_tags(tags)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(generation_key(tag))
+                pipe.expire(generation_key(tag), GENERATION_TTL)
+            await pipe.execute()
+        for tag in tags:
+            keys = await redis_client.smembers(tag_key(tag))
+            await redis_client.delete(tag_key(tag), *keys)
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps(tags))
+        cache_stats.invalidations += len(tags)
+    except RedisError:
+        cache_stats.errors += 1
+        logger.warning('Could not invalidate cache tags %s', tags, exc_info=True)
+
+
+async def listen_invalidations():
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything published while we were not subscribed is lost, so start clean.
+            local_cache.clear()
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    local_cache.invalidate_tags(json.loads(message['data']))
+        except RedisError:
+            logger.warning('Cache invalidation channel lost, reconnecting', exc_info=True)
+            local_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
+
+
+def cache_response(model, *tags: str, ttl: int = CACHE_TTL_SECONDS):
+    adapter = TypeAdapter(model)
+
+    def decorator(endpoint):
+        prefix = f'cache:{endpoint.__module__}.{endpoint.__name__}'
+
+        @wraps(endpoint)
+        async def wrapper(**kwargs):
+            params = {k: v for k, v in kwargs.items() if isinstance(v, (str, int, float, bool, type(None)))}
+            key = f'{prefix}?{urlencode(sorted(params.items()))}'
+            return await cached_response(key, [tag.format(**params) for tag in tags],
+                                         lambda: endpoint(**kwargs), adapter, ttl,
+                                         [v for v in kwargs.values() if isinstance(v, AsyncSession)])
+
+        return wrapper
+
+    return decorator
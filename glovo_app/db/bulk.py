@@ -0,0 +1,138 @@
+from typing import Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select, delete, update, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.config import BULK_MAX_ITEMS
+
+
+DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def check_batch_size(items: list):
+    if not items:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Empty batch')
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f'At most {BULK_MAX_ITEMS} items per batch')
+
+
+def validate_items(items: list, schema: Type[BaseModel]):
+    """Validate every item on its own so one bad row does not reject the whole batch."""
+    valid, results = [], {}
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as exc:
+            results[index] = {'index': index, 'status': 'invalid',
+                              'errors': exc.errors(include_url=False, include_context=False)}
+    return valid, results
+
+
+def require_ids(valid: list, results: dict):
+    """Updates address rows by ``id``, which the schemas leave optional for creates."""
+    kept = []
+    for index, item in valid:
+        if item.id is None:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': [{'loc': ['id'], 'msg': 'Field required'}]}
+        else:
+            kept.append((index, item))
+    return kept
+
+
+async def existing_ids(db: AsyncSession, model, ids) -> set[int]:
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set((await db.scalars(select(model.id).where(model.id.in_(ids)))).all())
+
+
+async def check_references(db: AsyncSession, valid: list, results: dict, model, field: str, detail: str):
+    found = await existing_ids(db, model, {getattr(item, field) for _, item in valid})
+    kept = []
+    for index, item in valid:
+        if getattr(item, field) in found:
+            kept.append((index, item))
+        else:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': [{'loc': [field], 'msg': detail}]}
+    return kept
+
+
+async def upsert(db: AsyncSession, model, rows: list[dict], key: tuple[str, ...]):
+    """Insert or update ``rows`` in one multi-row statement keyed on the natural ``key``.
+
+    Returns ``{key values: (instance, created)}``. Rows repeating a key within the batch
+    collapse onto the last one, as ON CONFLICT cannot touch the same row twice.
+    """
+    by_key = {tuple(row[column] for column in key): row for row in rows}
+    key_columns = [getattr(model, column) for column in key]
+    existing = set((await db.execute(select(*key_columns).where(tuple_(*key_columns).in_(list(by_key))))).all())
+
+    insert = DIALECT_INSERTS[db.get_bind().dialect.name]
+    stmt = insert(model).values(list(by_key.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: stmt.excluded[column] for column in rows[0] if column not in key},
+    )
+    instances = await db.scalars(stmt.returning(model), execution_options={'populate_existing': True})
+
+    written = {}
+    for instance in instances.all():
+        row_key = tuple(getattr(instance, column) for column in key)
+        written[row_key] = (instance, row_key not in existing)
+    return written
+
+
+async def update_rows(db: AsyncSession, model, rows: dict[int, dict], results: dict) -> set[int]:
+    """Update ``{index: row}`` by primary key in one executemany, and return the ids written.
+
+    A unique violation rolls back only the savepoint around the batch; the rows are then
+    retried one savepoint each, so just the items that conflict are reported as ``conflict``.
+    """
+    try:
+        async with db.begin_nested():
+            await db.execute(update(model), list(rows.values()))
+        return {row['id'] for row in rows.values()}
+    except IntegrityError:
+        pass
+
+    written = set()
+    for index, row in rows.items():
+        try:
+            async with db.begin_nested():
+                await db.execute(update(model), [row])
+            written.add(row['id'])
+        except IntegrityError:
+            results[index] = {'index': index, 'status': 'conflict', 'id': row['id']}
+    return written
+
+
+async def delete_ids(db: AsyncSession, model, ids: list[int]) -> tuple[set[int], set[int]]:
+    """Delete ``ids`` in one statement; returns the ids deleted and the ids still referenced elsewhere.
+
+    As in ``update_rows``, a foreign key violation rolls back only the savepoint around the
+    batch, and the ids are then deleted one savepoint each.
+    """
+    try:
+        async with db.begin_nested():
+            result = await db.execute(delete(model).where(model.id.in_(set(ids))).returning(model.id))
+            return set(result.scalars().all()), set()
+    except IntegrityError:
+        pass
+
+    deleted, conflicts = set(), set()
+    for obj_id in set(ids):
+        try:
+            async with db.begin_nested():
+                result = await db.execute(delete(model).where(model.id == obj_id).returning(model.id))
+                deleted.update(result.scalars().all())
+        except IntegrityError:
+            conflicts.add(obj_id)
+    return deleted, conflicts
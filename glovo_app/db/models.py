@@ -1,10 +1,11 @@
-from sqlalchemy import String, Enum, DECIMAL, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import (String, Enum, DECIMAL, Integer, Float, DateTime, Text, JSON, ForeignKey, UniqueConstraint, Index,
+                        text)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from typing import Optional, List
 from glovo_app.db.database import Base
 from enum import Enum as PyEnum
-from passlib.hash import bcrypt
+from glovo_app.security.passwords import password_context
 
 
 class TypeChoices(str, PyEnum):
@@ -35,24 +36,26 @@ class UserProfile(Base):
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     phone_number: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     role: Mapped[RoleChoices] = mapped_column(Enum(RoleChoices), nullable=False, default=RoleChoices.client)
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
     tokens: Mapped[List['RefreshToken']] = relationship('RefreshToken', back_populates='user')
 
     cart_user: Mapped['UserProfile'] = relationship('Cart', back_populates='users', cascade='all, delete-orphan',
                                                     uselist=False)
 
     def set_passwords(self, password: str):
-        self.hashed_password = bcrypt.hash(password)
+        self.hashed_password = password_context.hash(password)
 
     def check_password(self, password: str):
-        return bcrypt.verify(password, self.hashed_password)
+        return password_context.verify(password, self.hashed_password)
 
 
 class RefreshToken(Base):
     __tablename__ = 'refresh_token'
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
-    token: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
     created_data: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
     user: Mapped['UserProfile'] = relationship('UserProfile', back_populates='tokens')
 
@@ -67,6 +70,7 @@ class Category(Base):
 
 class Store(Base):
     __tablename__ = 'store'
+    __table_args__ = (UniqueConstraint('owner_id', 'store_name', name='uq_store_owner_name'),)
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True, index=True)
     store_name: Mapped[str] = mapped_column(String(32))
@@ -77,7 +81,10 @@ class Store(Base):
 
     description: Mapped[str] = mapped_column(Text)
     address: Mapped[str] = mapped_column(String(64))
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
+    rating: Mapped[Optional['StoreRating']] = relationship('StoreRating', uselist=False, viewonly=True)
 
 
 class ContactInfo(Base):
@@ -90,6 +97,7 @@ class ContactInfo(Base):
 
 class Product(Base):
     __tablename__ = 'product'
+    __table_args__ = (UniqueConstraint('store_id', 'product_name', name='uq_product_store_name'),)
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True, index=True)
     product_name: Mapped[str] = mapped_column(String(32))
@@ -125,7 +133,7 @@ class CartItem(Base):
     __tablename__ = 'cart_item'
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
-    cart_id: Mapped[int] = mapped_column(ForeignKey('cart.id'))
+    cart_id: Mapped[int] = mapped_column(ForeignKey('cart.id'), index=True)
     cart: Mapped['Cart'] = relationship('Cart', back_populates='items')
     product_id: Mapped[int] = mapped_column(ForeignKey('product.id'))
     product: Mapped['Product'] = relationship('Product')
@@ -134,6 +142,7 @@ class CartItem(Base):
 
 class StoreReview(Base):
     __tablename__ = 'store_review'
+    __table_args__ = (Index('ix_store_review_created_date_id', 'created_date', 'id'),)
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
     client: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
@@ -145,6 +154,7 @@ class StoreReview(Base):
 
 class CourierReview(Base):
     __tablename__ = 'courier_review'
+    __table_args__ = (Index('ix_courier_review_created_date_id', 'created_date', 'id'),)
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
     client: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
@@ -155,13 +165,31 @@ class CourierReview(Base):
 
 class Order(Base):
     __tablename__ ='order'
+    __table_args__ = (UniqueConstraint('client_id', 'idempotency_key', name='uq_order_client_idempotency_key'),
+                      Index('ix_order_created_date_id', 'created_date', 'id'))
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True, index=True)
     client_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
     status: Mapped[StatusChoices] = mapped_column(Enum(StatusChoices), nullable=False, default=StatusChoices.str1)
     delivery_address: Mapped[str] = mapped_column(String(64))
-    courier_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
+    courier_id: Mapped[Optional[int]] = mapped_column(ForeignKey('userprofile.id'), nullable=True)
     created_date: Mapped[int] = mapped_column(DateTime, default=datetime.utcnow)
+    total_price: Mapped[Optional[DECIMAL]] = mapped_column(DECIMAL(10, 2), nullable=True)
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    items: Mapped[List['OrderItem']] = relationship('OrderItem', back_populates='order',
+                                                    cascade='all, delete-orphan')
+
+
+class OrderItem(Base):
+    __tablename__ = 'order_item'
+
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey('order.id', ondelete='CASCADE'), index=True)
+    order: Mapped['Order'] = relationship('Order', back_populates='items')
+    product_id: Mapped[int] = mapped_column(ForeignKey('product.id'))
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    price: Mapped[DECIMAL] = mapped_column(DECIMAL(8, 2), nullable=False)
 
 
 class Courier(Base):
@@ -169,8 +197,67 @@ class Courier(Base):
 
     id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id'))
-    current_orders_id: Mapped[int] = mapped_column(ForeignKey('order.id'))
+    current_orders_id: Mapped[Optional[int]] = mapped_column(ForeignKey('order.id'), nullable=True)
     type: Mapped[TypeChoices] = mapped_column(Enum(TypeChoices), nullable=False, default=TypeChoices.available)
+    rating: Mapped[Optional['CourierRating']] = relationship(
+        'CourierRating', primaryjoin='Courier.user_id == foreign(CourierRating.courier_id)', uselist=False,
+        viewonly=True)
+
+
+
+class CourierLocation(Base):
+    __tablename__ = 'courier_location'
+    __table_args__ = (Index('ix_courier_location_courier_recorded', 'courier_id', 'recorded_at'),)
+
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
+    courier_id: Mapped[int] = mapped_column(ForeignKey('courier.id', ondelete='CASCADE'))
+    latitude: Mapped[float] = mapped_column(Float, nullable=False)
+    longitude: Mapped[float] = mapped_column(Float, nullable=False)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+class RatingAggregate:
+    review_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum: Mapped[DECIMAL] = mapped_column(DECIMAL(14, 4), nullable=False, default=0, server_default='0')
+    rating_1: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    rating_2: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    rating_3: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    rating_4: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    rating_5: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+    @property
+    def average(self) -> Optional[float]:
+        return round(float(self.rating_sum) / self.review_count, 2) if self.review_count else None
+
+    @property
+    def histogram(self) -> dict[int, int]:
+        return {star: getattr(self, f'rating_{star}') for star in range(1, 6)}
+
+
+class StoreRating(RatingAggregate, Base):
+    __tablename__ = 'store_rating'
+
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'), primary_key=True)
+
+
+class CourierRating(RatingAggregate, Base):
+    __tablename__ = 'courier_rating'
+
+    courier_id: Mapped[int] = mapped_column(ForeignKey('userprofile.id', ondelete='CASCADE'), primary_key=True)
+
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_event'
+    __table_args__ = (Index('ix_outbox_event_pending', 'available_at', 'id',
+                            postgresql_where=text('failed_at IS NULL')),)
+
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True, primary_key=True)
+    topic: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    failed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
 
 
@@ -0,0 +1,97 @@
+import base64
+import json
+import time
+from decimal import Decimal
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.config import COUNT_CACHE_SECONDS, STREAM_CHUNK_SIZE
+from glovo_app.db.database import SessionLocal
+
+
+_count_cache: dict[tuple, tuple[float, int]] = {}
+
+
+def _dump(value):
+    if isinstance(value, Decimal):
+        return {'d': str(value)}
+    if isinstance(value, datetime):
+        return {'t': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        if 'd' in value:
+            return Decimal(value['d'])
+        return datetime.fromisoformat(value['t'])
+    return value
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_dump(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, width: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = [_load(v) for v in json.loads(raw)]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if len(values) != width:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return values
+
+
+def keyset(stmt, columns, cursor: str | None, descending: bool = False):
+    if cursor is not None:
+        values = decode_cursor(cursor, len(columns))
+        key, bound = tuple_(*columns), tuple_(*values)
+        stmt = stmt.where(key < bound if descending else key > bound)
+    return stmt.order_by(*(c.desc() if descending else c.asc() for c in columns))
+
+
+async def keyset_page(db: AsyncSession, stmt, columns, cursor: str | None, size: int,
+                      descending: bool = False):
+    rows = (await db.scalars(keyset(stmt, columns, cursor, descending).limit(size + 1))).all()
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
+
+
+async def cached_count(db: AsyncSession, stmt) -> int:
+    compiled = stmt.compile()
+    key = (str(compiled), tuple(sorted((k, str(v)) for k, v in compiled.params.items())))
+    now = time.monotonic()
+    hit = _count_cache.get(key)
+    if hit is not None and now - hit[0] < COUNT_CACHE_SECONDS:
+        return hit[1]
+    total = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    if len(_count_cache) > 1000:
+        _count_cache.clear()
+    _count_cache[key] = (now, total)
+    return total
+
+
+async def stream_ndjson(stmt, schema):
+    async with SessionLocal(info={'read_only': True}) as db:
+        result = await db.stream_scalars(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for rows in result.partitions(STREAM_CHUNK_SIZE):
+            yield ''.join(schema.model_validate(row, from_attributes=True).model_dump_json() + '\n'
+                          for row in rows)
+
+
+async def paginate_or_stream(db: AsyncSession, stmt, columns, cursor: str | None, size: int, stream: bool,
+                             schema):
+    if stream:
+        return StreamingResponse(stream_ndjson(keyset(stmt, columns, cursor), schema),
+                                 media_type='application/x-ndjson')
+    items, next_cursor = await keyset_page(db, stmt, columns, cursor, size)
+    return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,109 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        cumulative, total = {}, 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            total += bucket_count
+            cumulative[str(bound)] = total
+        cumulative['+Inf'] = self.count
+        return {'buckets': cumulative, 'count': self.count, 'sum': round(self.sum, 6)}
+
+
+class PoolStats:
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.checkout_wait = Histogram()
+
+
+pool_stats: dict[str, PoolStats] = {}
+
+
+def get_pool_stats(name: str) -> PoolStats:
+    if name not in pool_stats:
+        pool_stats[name] = PoolStats()
+    return pool_stats[name]
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def connect(self):
+        stats = get_pool_stats(self.logging_name)
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.checkout_wait.observe(time.perf_counter() - start)
+
+
+def instrument_pool(engine):
+    sync_engine = engine.sync_engine
+    stats = get_pool_stats(sync_engine.pool.logging_name)
+
+    @event.listens_for(sync_engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    @event.listens_for(sync_engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+
+    @event.listens_for(sync_engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checkins += 1
+
+    @event.listens_for(sync_engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.invalidations += 1
+
+    return engine
+
+
+def pool_status(engine):
+    pool = engine.sync_engine.pool
+    stats = get_pool_stats(pool.logging_name)
+    status = {
+        'pool_class': type(pool).__name__,
+        'connects': stats.connects,
+        'checkouts': stats.checkouts,
+        'checkins': stats.checkins,
+        'invalidations': stats.invalidations,
+        'timeouts': stats.timeouts,
+        'checkout_wait_seconds': stats.checkout_wait.snapshot(),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    return status
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from glovo_app.config import REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_SECONDS, READ_YOUR_WRITES_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+PG_REPLICA_LAG = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class ReplicaSet:
+    def __init__(self):
+        self.engines = []
+        self.lag: dict[str, float] = {}
+        self._cycle = None
+        self._last_write: dict[str, float] = {}
+
+    def configure(self, engines):
+        self.engines = list(engines)
+        self.lag = {e.sync_engine.pool.logging_name: 0.0 for e in self.engines}
+        self._cycle = itertools.cycle(self.engines) if self.engines else None
+
+    def pick(self):
+        for _ in range(len(self.engines)):
+            replica = next(self._cycle)
+            if self.lag[replica.sync_engine.pool.logging_name] <= REPLICA_MAX_LAG_SECONDS:
+                return replica
+        return None
+
+    def mark_write(self, key: str):
+        now = time.monotonic()
+        self._last_write[key] = now
+        if len(self._last_write) > 10000:
+            self._last_write = {k: t for k, t in self._last_write.items()
+                                if now - t < READ_YOUR_WRITES_SECONDS}
+
+    def is_sticky(self, key: str | None) -> bool:
+        written = self._last_write.get(key)
+        return written is not None and time.monotonic() - written < READ_YOUR_WRITES_SECONDS
+
+    async def measure_lag(self, replica) -> float:
+        if replica.dialect.name != 'postgresql':
+            return 0.0
+        async with replica.connect() as conn:
+            return float(await conn.scalar(PG_REPLICA_LAG))
+
+    async def refresh_lag(self):
+        for replica in self.engines:
+            name = replica.sync_engine.pool.logging_name
+            try:
+                self.lag[name] = await self.measure_lag(replica)
+            except Exception:
+                logger.warning('Replica %s is unreachable, routing reads to primary', name)
+                self.lag[name] = float('inf')
+
+    async def monitor(self):
+        while True:
+            await self.refresh_lag()
+            await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS)
+
+
+replica_set = ReplicaSet()
+
+
+class RoutingSession(Session):
+    """Sends the reads of a ``read_only`` session to a replica, everything else to the primary.
+
+    The replica is picked on the first read and kept for the rest of the session, so one
+    request never mixes snapshots of replicas that lag by different amounts.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get('read_only') and not self._flushing and not getattr(clause, 'is_dml', False):
+            if 'replica' not in self.info:
+                self.info['replica'] = replica_set.pick()
+            replica = self.info['replica']
+            if replica is not None:
+                return replica.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+def use_primary(session):
+    """Send the rest of ``session``'s reads to the primary, e.g. for a result that will be cached."""
+    session.info['read_only'] = False
+    session.info.pop('replica', None)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_write(session):
+    if not session.info.get('read_only') and session.info.get('sticky_key'):
+        replica_set.mark_write(session.info['sticky_key'])
+
+
+def sticky_key(request) -> str | None:
+    key = request.headers.get('authorization') or request.query_params.get('user_id')
+    if key is None and request.client is not None:
+        key = request.client.host
+    return key
@@ -1,8 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Generic, TypeVar
 from datetime import datetime
+from glovo_app.config import LOCATION_MAX_BATCH
 from glovo_app.db.models import TypeChoices, StatusChoices, RoleChoices
 
+T = TypeVar('T')
+
 
 class UserProfileSchema(BaseModel):
     id: int
@@ -32,12 +35,27 @@ class StoreSchema(BaseModel):
     category_id: int
     description: str
     address: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     owner_id: int
 
     class Config:
         from_attributes = True
 
 
+class RatingSchema(BaseModel):
+    review_count: int
+    average: Optional[float] = None
+    histogram: dict[int, int]
+
+    class Config:
+        from_attributes = True
+
+
+class StoreWithRatingSchema(StoreSchema):
+    rating: Optional[RatingSchema] = None
+
+
 class ContactInfoSchema(BaseModel):
     id: int
     contact_info: str
@@ -48,7 +66,7 @@ class ContactInfoSchema(BaseModel):
 
 
 class ProductSchema(BaseModel):
-    id: int
+    id: Optional[int] = None
     product_name: str
     product_image: str
     price: int
@@ -60,7 +78,7 @@ class ProductSchema(BaseModel):
 
 
 class ProductComboSchema(BaseModel):
-    id: int
+    id: Optional[int] = None
     combo_name: str
     combo_image: str
     price: float
@@ -73,11 +91,11 @@ class ProductComboSchema(BaseModel):
 
 class StoreReviewSchema(BaseModel):
     id: int
-    client: str
+    client: int
     store: int
     rating: int
     comment: str
-    created_date: int
+    created_date: Optional[datetime] = None
 
     class Config:
         from_attribute = True
@@ -88,7 +106,7 @@ class CourierReviewSchema(BaseModel):
     client: int
     courier: int
     rating: int
-    created_date: int
+    created_date: Optional[datetime] = None
 
     class Config:
         from_attribute = True
@@ -97,8 +115,34 @@ class CourierReviewSchema(BaseModel):
 class OrderSchema(BaseModel):
     id: int
     status: StatusChoices
-    delivery_address: int
+    delivery_address: str
+    courier_id: Optional[int] = None
+    created_date: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class OrderItemSchema(BaseModel):
+    product_id: int
+    quantity: int
+    price: float
+
+    class Config:
+        from_attributes = True
+
+
+class CheckoutSchema(BaseModel):
+    delivery_address: str
+
+
+class OrderDetailSchema(BaseModel):
+    id: int
+    status: StatusChoices
+    delivery_address: str
+    total_price: Optional[float] = None
     created_date: datetime
+    items: List[OrderItemSchema] = []
 
     class Config:
         from_attributes = True
@@ -112,6 +156,34 @@ class CourierSchema(BaseModel):
         from_attributes = True
 
 
+class CourierWithRatingSchema(CourierSchema):
+    rating: Optional[RatingSchema] = None
+
+
+class PositionSchema(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+
+class LocationPointSchema(PositionSchema):
+    timestamp: Optional[float] = None
+
+
+class LocationBatchSchema(BaseModel):
+    points: List[LocationPointSchema] = Field(min_length=1, max_length=LOCATION_MAX_BATCH)
+
+
+class NearbyCourierSchema(BaseModel):
+    courier_id: int
+    distance_m: float
+
+
+class AssignmentSchema(BaseModel):
+    order_id: int
+    courier_id: int
+    distance_m: float
+
+
 class CartItemSchema(BaseModel):
     id: int
     product_id: int
@@ -132,4 +204,24 @@ class CartSchema(BaseModel):
 
 
 class CartItemCreateSchema(BaseModel):
-    product_id: int
\ No newline at end of file
+    product_id: int
+
+
+class OffsetPage(BaseModel, Generic[T]):
+    items: List[T]
+    page: int
+    size: int
+    total: Optional[int] = None
+    pages: Optional[int] = None
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    errors: Optional[list] = None
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import sys
+import time
+
+import websockets
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import DISPATCH_CELL_DEGREES
+from glovo_app.db.database import engine
+from glovo_app.dispatch.geo import haversine, METERS_PER_DEGREE
+from glovo_app.dispatch.index import CourierIndex, warm_index
+from glovo_app.dispatch.matching import match, dispatch_window
+
+
+def random_point(rng: random.Random, lat: float, lon: float, radius_m: float) -> tuple[float, float]:
+    distance, bearing = radius_m * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+    return (lat + distance * math.cos(bearing) / METERS_PER_DEGREE,
+            lon + distance * math.sin(bearing) / (METERS_PER_DEGREE * math.cos(math.radians(lat))))
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def first_come(pickups: dict, index: CourierIndex, k: int) -> list[float]:
+    """Assign each order on arrival to its nearest courier, the baseline batching is compared with."""
+    distances = []
+    for lat, lon in pickups.values():
+        nearest = index.nearest(lat, lon, k)
+        if nearest:
+            distance, courier_id = nearest[0]
+            index.set_available(courier_id, False)
+            distances.append(distance)
+    return distances
+
+
+def windowed(pickups: dict, index: CourierIndex, k: int) -> list[float]:
+    distances, assigned_orders, used_couriers = [], set(), set()
+    for distance, order_id, courier_id in match(pickups, index, k):
+        if order_id in assigned_orders or courier_id in used_couriers:
+            continue
+        assigned_orders.add(order_id)
+        used_couriers.add(courier_id)
+        distances.append(distance)
+    for courier_id in used_couriers:
+        index.set_available(courier_id, False)
+    return distances
+
+
+def build_index(couriers: dict, cell_degrees: float) -> CourierIndex:
+    index = CourierIndex(cell_degrees)
+    for courier_id, (lat, lon) in couriers.items():
+        index.move(courier_id, lat, lon)
+        index.set_available(courier_id, True)
+    return index
+
+
+def simulate(args):
+    rng = random.Random(args.seed)
+    radius = args.radius_km * 1000
+    couriers = {courier_id: random_point(rng, args.lat, args.lon, radius) for courier_id in range(args.couriers)}
+    stores = [random_point(rng, args.lat, args.lon, radius) for _ in range(args.stores)]
+
+    started = time.perf_counter()
+    index = build_index(couriers, args.cell_degrees)
+    print(f'index: {len(couriers)} couriers in {len(index.available.cells)} cells, '
+          f'built in {(time.perf_counter() - started) * 1000:.1f} ms', file=sys.stderr)
+
+    timings, mismatches = [], 0
+    for query in range(args.queries):
+        lat, lon = rng.choice(stores)
+        started = time.perf_counter()
+        nearest = index.nearest(lat, lon, args.k, max_distance=None)
+        timings.append((time.perf_counter() - started) * 1e6)
+        if query < args.verify:
+            expected = sorted(haversine(lat, lon, *point) for point in couriers.values())[:args.k]
+            mismatches += any(abs(a - b) > 1e-6 for a, (b, _) in zip(expected, nearest))
+    print(f'nearest k={args.k}: p50 {percentile(timings, 0.5):.1f} us, p99 {percentile(timings, 0.99):.1f} us, '
+          f'max {max(timings):.1f} us, {mismatches}/{min(args.verify, args.queries)} mismatches vs brute force',
+          file=sys.stderr)
+
+    orders = {order_id: rng.choice(stores) for order_id in range(args.orders)}
+    for name, strategy in (('first-come', first_come), ('windowed', windowed)):
+        index = build_index(couriers, args.cell_degrees)
+        distances, started = [], time.perf_counter()
+        order_ids = list(orders)
+        for start in range(0, len(order_ids), args.window):
+            window = {order_id: orders[order_id] for order_id in order_ids[start:start + args.window]}
+            distances += strategy(window, index, args.k)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f'{name}: {len(distances)}/{len(orders)} assigned, mean pickup {statistics.fmean(distances or [0]):.0f} m, '
+              f'p90 {percentile(distances or [0], 0.9):.0f} m, {elapsed:.1f} ms', file=sys.stderr)
+
+
+async def report_locations(args, connection: int, token: str, counters: dict):
+    rng = random.Random(args.seed + connection)
+    lat, lon = random_point(rng, args.lat, args.lon, args.radius_km * 1000)
+    interval = 1 / args.rate
+    headers = {'Authorization': f'Bearer {token}'}
+    async with websockets.connect(args.url, additional_headers=headers) as socket:
+        async def replies():
+            async for reply in socket:
+                counters['throttled' if 'throttled' in json.loads(reply) else 'rejected'] += 1
+
+        reader = asyncio.create_task(replies())
+        deadline = time.monotonic() + args.seconds
+        next_send = time.monotonic()
+        try:
+            while time.monotonic() < deadline:
+                points = []
+                for _ in range(args.batch):
+                    lat, lon = random_point(rng, lat, lon, 15)
+                    points.append({'latitude': lat, 'longitude': lon, 'timestamp': time.time()})
+                await socket.send(json.dumps({'points': points}))
+                counters['messages'] += 1
+                counters['points'] += len(points)
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+        finally:
+            reader.cancel()
+
+
+async def load_test(args):
+    """Drive ``--connections`` courier sockets at ``--rate`` messages a second each and report throughput."""
+    tokens = [line.strip() for line in open(args.tokens_file) if line.strip()]
+    counters = {'messages': 0, 'points': 0, 'throttled': 0, 'rejected': 0}
+    started = time.perf_counter()
+    results = await asyncio.gather(*(report_locations(args, connection, tokens[connection % len(tokens)], counters)
+                                     for connection in range(args.connections)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failed = [result for result in results if isinstance(result, Exception)]
+    print(f'{args.connections - len(failed)}/{args.connections} connections, {counters["messages"]} messages, '
+          f'{counters["points"] / elapsed:.0f} points/s, {counters["messages"] / elapsed:.0f} messages/s, '
+          f'{counters["throttled"]} throttled, {counters["rejected"]} rejected', file=sys.stderr)
+    for error in failed[:5]:
+        print(f'connection failed: {error!r}', file=sys.stderr)
+
+
+async def run_once():
+    try:
+        print(f'index: {await warm_index()}', file=sys.stderr)
+        for assignment in await dispatch_window():
+            print(assignment, file=sys.stderr)
+    finally:
+        await redis_client.close()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.dispatch', description='Courier dispatch tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('run', help='run one dispatch window against the database')
+
+    sim = commands.add_parser('simulate', help='benchmark the index and matching on synthetic couriers')
+    sim.add_argument('--couriers', type=int, default=5000)
+    sim.add_argument('--stores', type=int, default=300)
+    sim.add_argument('--orders', type=int, default=4000)
+    sim.add_argument('--window', type=int, default=50, help='orders collected per dispatch window')
+    sim.add_argument('--queries', type=int, default=10000)
+    sim.add_argument('--verify', type=int, default=200, help='queries checked against a brute-force scan')
+    sim.add_argument('--k', type=int, default=5)
+    sim.add_argument('--lat', type=float, default=41.3874)
+    sim.add_argument('--lon', type=float, default=2.1686)
+    sim.add_argument('--radius-km', type=float, default=10)
+    sim.add_argument('--cell-degrees', type=float, default=DISPATCH_CELL_DEGREES)
+    sim.add_argument('--seed', type=int, default=0)
+
+    load = commands.add_parser('loadtest', help='stream synthetic locations to a running server over WebSockets')
+    load.add_argument('--url', default='ws://127.0.0.1:8000/dispatch/locations/ws/')
+    load.add_argument('--tokens-file', required=True, help='access tokens of courier users, one per line')
+    load.add_argument('--connections', type=int, default=500)
+    load.add_argument('--rate', type=float, default=1, help='messages per second per connection')
+    load.add_argument('--batch', type=int, default=1, help='points per message')
+    load.add_argument('--seconds', type=float, default=30)
+    load.add_argument('--lat', type=float, default=41.3874)
+    load.add_argument('--lon', type=float, default=2.1686)
+    load.add_argument('--radius-km', type=float, default=10)
+    load.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == 'simulate':
+        simulate(args)
+    elif args.command == 'loadtest':
+        asyncio.run(load_test(args))
+    else:
+        asyncio.run(run_once())
@@ -0,0 +1,115 @@
+import heapq
+import math
+from collections import defaultdict
+
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """Points bucketed into a uniform latitude/longitude grid for k-nearest lookups.
+
+    A query scans rings of cells outwards from the cell of the target and stops as soon as
+    nothing outside the scanned square can beat the k-th best distance found so far, so its
+    cost depends on local density rather than on the total number of points. The cell size
+    should be picked so a cell holds a handful of couriers at typical density.
+    """
+
+    def __init__(self, cell_degrees: float):
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(dict)
+        self.points = {}
+        # Bounds of every cell ever occupied; they only grow, which keeps them cheap and safe.
+        self.bounds = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, point_id):
+        return point_id in self.points
+
+    def cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def upsert(self, point_id, lat: float, lon: float):
+        cell = self.cell(lat, lon)
+        previous = self.points.get(point_id)
+        if previous is not None and previous[2] != cell:
+            self._discard(point_id, previous[2])
+        self.points[point_id] = (lat, lon, cell)
+        self.cells[cell][point_id] = (lat, lon)
+        i, j = cell
+        if self.bounds is None:
+            self.bounds = [i, i, j, j]
+        else:
+            bounds = self.bounds
+            bounds[0], bounds[1] = min(bounds[0], i), max(bounds[1], i)
+            bounds[2], bounds[3] = min(bounds[2], j), max(bounds[3], j)
+
+    def remove(self, point_id):
+        previous = self.points.pop(point_id, None)
+        if previous is not None:
+            self._discard(point_id, previous[2])
+
+    def _discard(self, point_id, cell):
+        members = self.cells[cell]
+        members.pop(point_id, None)
+        if not members:
+            del self.cells[cell]
+
+    def _ring(self, ci: int, cj: int, ring: int):
+        if ring == 0:
+            yield ci, cj
+            return
+        for j in range(cj - ring, cj + ring + 1):
+            yield ci - ring, j
+            yield ci + ring, j
+        for i in range(ci - ring + 1, ci + ring):
+            yield i, cj - ring
+            yield i, cj + ring
+
+    def nearest(self, lat: float, lon: float, k: int, max_distance: float | None = None) -> list[tuple[float, object]]:
+        """Return up to ``k`` ``(distance in meters, id)`` pairs, closest first."""
+        if not self.points or k <= 0:
+            return []
+        ci, cj = self.cell(lat, lon)
+        low_i, high_i, low_j, high_j = self.bounds
+        last_ring = max(ci - low_i, high_i - ci, cj - low_j, high_j - cj)
+        size = self.cell_degrees
+
+        best = []
+        ring = 0
+        while ring <= last_ring:
+            for cell in self._ring(ci, cj, ring):
+                members = self.cells.get(cell)
+                if not members:
+                    continue
+                for point_id, (plat, plon) in members.items():
+                    distance = haversine(lat, lon, plat, plon)
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, point_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, point_id))
+            # Nothing outside the scanned square is closer than its nearest edge. Longitude degrees
+            # shrink towards the poles, so measure them on the square's most poleward parallel.
+            lon_meters = METERS_PER_DEGREE * math.cos(math.radians(min(abs(lat) + (ring + 1) * size, 90)))
+            reach = min((lat - (ci - ring) * size) * METERS_PER_DEGREE,
+                        ((ci + ring + 1) * size - lat) * METERS_PER_DEGREE,
+                        (lon - (cj - ring) * size) * lon_meters,
+                        ((cj + ring + 1) * size - lon) * lon_meters)
+            if len(best) == k and -best[0][0] <= reach:
+                break
+            if max_distance is not None and reach > max_distance:
+                break
+            ring += 1
+        return sorted((-distance, point_id) for distance, point_id in best)
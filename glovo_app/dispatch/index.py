@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import DISPATCH_CELL_DEGREES, DISPATCH_MAX_RADIUS_M
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Courier, TypeChoices
+from glovo_app.dispatch.geo import GridIndex
+
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_KEY = 'dispatch:positions'
+AVAILABLE_KEY = 'dispatch:available'
+EVENTS_CHANNEL = 'dispatch:events'
+
+
+class CourierIndex:
+    """Last known courier positions, with the available ones in a grid for nearest lookups."""
+
+    def __init__(self, cell_degrees: float = DISPATCH_CELL_DEGREES):
+        self.positions = {}
+        self.available_ids = set()
+        self.available = GridIndex(cell_degrees)
+
+    def move(self, courier_id: int, lat: float, lon: float):
+        self.positions[courier_id] = (lat, lon)
+        if courier_id in self.available_ids:
+            self.available.upsert(courier_id, lat, lon)
+
+    def set_available(self, courier_id: int, available: bool):
+        if available:
+            self.available_ids.add(courier_id)
+            if courier_id in self.positions:
+                self.available.upsert(courier_id, *self.positions[courier_id])
+        else:
+            self.available_ids.discard(courier_id)
+            self.available.remove(courier_id)
+
+    def apply(self, event: dict):
+        courier_id = event['courier_id']
+        if 'lat' in event:
+            self.move(courier_id, event['lat'], event['lon'])
+        if 'available' in event:
+            self.set_available(courier_id, event['available'])
+
+    def nearest(self, lat: float, lon: float, k: int, max_distance: float | None = DISPATCH_MAX_RADIUS_M):
+        return self.available.nearest(lat, lon, k, max_distance)
+
+    def clear(self):
+        self.positions.clear()
+        self.available_ids.clear()
+        self.available = GridIndex(self.available.cell_degrees)
+
+    def snapshot(self):
+        return {
+            'positions': len(self.positions),
+            'available': len(self.available_ids),
+            'indexed': len(self.available),
+            'cells': len(self.available.cells),
+        }
+
+
+courier_index = CourierIndex()
+
+
+async def publish(events: list[dict]):
+    """Apply ``events`` locally, mirror them into the Redis GEO sets and broadcast them to the other workers."""
+    for event in events:
+        courier_index.apply(event)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            moved = [(event['lon'], event['lat'], event['courier_id']) for event in events if 'lat' in event]
+            if moved:
+                pipe.geoadd(POSITIONS_KEY, [value for position in moved for value in position])
+            available, gone = [], []
+            for courier_id in {event['courier_id'] for event in events}:
+                if courier_id in courier_index.available_ids and courier_id in courier_index.positions:
+                    lat, lon = courier_index.positions[courier_id]
+                    available += [lon, lat, courier_id]
+                else:
+                    gone.append(courier_id)
+            if available:
+                pipe.geoadd(AVAILABLE_KEY, available)
+            if gone:
+                pipe.zrem(AVAILABLE_KEY, *gone)
+            pipe.publish(EVENTS_CHANNEL, json.dumps(events))
+            await pipe.execute()
+    except RedisError:
+        logger.warning('Could not mirror %d dispatch events', len(events), exc_info=True)
+
+
+async def update_position(courier_id: int, lat: float, lon: float):
+    await publish([{'courier_id': courier_id, 'lat': lat, 'lon': lon}])
+
+
+async def set_availability(courier_id: int, available: bool):
+    await publish([{'courier_id': courier_id, 'available': available}])
+
+
+async def load_positions(chunk: int = 1000) -> dict:
+    positions = {}
+    members = [int(member) for member in await redis_client.zrange(POSITIONS_KEY, 0, -1)]
+    for start in range(0, len(members), chunk):
+        batch = members[start:start + chunk]
+        for courier_id, position in zip(batch, await redis_client.geopos(POSITIONS_KEY, *batch)):
+            if position is not None:
+                positions[courier_id] = (position[1], position[0])
+    return positions
+
+
+async def warm_index():
+    """Rebuild the local index from the Redis positions and the couriers marked available in the database."""
+    positions = await load_positions()
+    async with SessionLocal(info={'read_only': True}) as db:
+        available = set((await db.scalars(select(Courier.id).where(Courier.type == TypeChoices.available))).all())
+    courier_index.clear()
+    for courier_id, (lat, lon) in positions.items():
+        courier_index.move(courier_id, lat, lon)
+    for courier_id in available:
+        courier_index.set_available(courier_id, True)
+    return courier_index.snapshot()
+
+
+async def listen_events():
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(EVENTS_CHANNEL)
+            # Events published while we were not subscribed are lost, so resync after subscribing.
+            await warm_index()
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    for event in json.loads(message['data']):
+                        courier_index.apply(event)
+        except RedisError:
+            logger.warning('Dispatch event channel lost, reconnecting', exc_info=True)
+            await asyncio.sleep(1)
+        except Exception:
+            logger.exception('Dispatch index sync failed')
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
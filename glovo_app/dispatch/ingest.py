@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from glovo_app.config import (LOCATION_FLUSH_SECONDS, LOCATION_SAMPLE_SECONDS, LOCATION_HISTORY_MAX_PENDING,
+                              LOCATION_RATE_PER_SECOND, LOCATION_RATE_BURST)
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import CourierLocation
+from glovo_app.dispatch.index import publish
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocationStats:
+    def __init__(self):
+        self.connections = 0
+        self.received = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.throttled = 0
+        self.published = 0
+        self.history_written = 0
+        self.history_dropped = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+location_stats = LocationStats()
+
+
+class TokenBucket:
+    """Per-connection message budget: ``rate`` messages a second with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float = LOCATION_RATE_PER_SECOND, burst: int = LOCATION_RATE_BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class LocationBuffer:
+    """Latest position per courier plus a sampled history, both drained by the flusher.
+
+    Positions are coalesced: however many points a courier sends between two flushes, only
+    the newest one is published. History keeps one point per courier every
+    LOCATION_SAMPLE_SECONDS and is bounded, dropping samples once the database falls behind.
+    """
+
+    def __init__(self):
+        self.latest = {}
+        self.last_seen = {}
+        self.last_sampled = {}
+        self.history = []
+
+    def record(self, courier_id: int, lat: float, lon: float, at: float | None = None) -> bool:
+        now = time.time()
+        # Client clocks drift; a point from the future would make every later point look stale.
+        at = now if at is None else min(at, now)
+        location_stats.received += 1
+        if at < self.last_seen.get(courier_id, 0):
+            location_stats.stale += 1
+            return False
+        self.last_seen[courier_id] = at
+        if courier_id in self.latest:
+            location_stats.coalesced += 1
+        self.latest[courier_id] = (lat, lon)
+
+        if at - self.last_sampled.get(courier_id, 0) >= LOCATION_SAMPLE_SECONDS:
+            if len(self.history) < LOCATION_HISTORY_MAX_PENDING:
+                self.last_sampled[courier_id] = at
+                self.history.append({
+                    'courier_id': courier_id, 'latitude': lat, 'longitude': lon,
+                    'recorded_at': datetime.fromtimestamp(at, timezone.utc).replace(tzinfo=None),
+                })
+            else:
+                location_stats.history_dropped += 1
+        return True
+
+    def drain(self):
+        latest, self.latest = self.latest, {}
+        history, self.history = self.history, []
+        return latest, history
+
+
+location_buffer = LocationBuffer()
+
+
+async def flush():
+    latest, history = location_buffer.drain()
+    started = time.perf_counter()
+    if latest:
+        await publish([{'courier_id': courier_id, 'lat': lat, 'lon': lon}
+                       for courier_id, (lat, lon) in latest.items()])
+        location_stats.published += len(latest)
+    if history:
+        try:
+            async with SessionLocal() as db:
+                await db.execute(insert(CourierLocation), history)
+                await db.commit()
+            location_stats.history_written += len(history)
+        except Exception:
+            location_stats.history_dropped += len(history)
+            raise
+    location_stats.flushes += 1
+    location_stats.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+
+async def flush_forever():
+    while True:
+        await asyncio.sleep(LOCATION_FLUSH_SECONDS)
+        try:
+            await flush()
+        except Exception:
+            logger.exception('Courier location flush failed')
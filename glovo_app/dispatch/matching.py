@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, update
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.response import RELEASE_LOCK
+from glovo_app.config import DISPATCH_CANDIDATES, DISPATCH_WINDOW_SECONDS, DISPATCH_BATCH_SIZE
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Order, OrderItem, Product, Store, Courier, StatusChoices, TypeChoices
+from glovo_app.dispatch.index import courier_index, set_availability
+from glovo_app.outbox.worker import enqueue
+from glovo_app.tracking.events import publish_order_event
+
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = 'dispatch:leader'
+
+
+class DispatchStats:
+    def __init__(self):
+        self.windows = 0
+        self.orders_seen = 0
+        self.assigned = 0
+        self.conflicts = 0
+        self.unmatched = 0
+        self.last_window_ms = 0.0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+dispatch_stats = DispatchStats()
+
+
+async def pending_orders(limit: int = DISPATCH_BATCH_SIZE) -> dict[int, tuple[float, float]]:
+    """Unassigned new orders with the location of the store they are picked up from."""
+    first_product = (select(OrderItem.product_id).where(OrderItem.order_id == Order.id)
+                     .order_by(OrderItem.id).limit(1).scalar_subquery())
+    async with SessionLocal(info={'read_only': True}) as db:
+        rows = (await db.execute(
+            select(Order.id, Store.latitude, Store.longitude)
+            .select_from(Order)
+            .join(Product, Product.id == first_product)
+            .join(Store, Store.id == Product.store_id)
+            .where(Order.courier_id.is_(None), Order.status == StatusChoices.str1, Store.latitude.is_not(None))
+            .order_by(Order.id)
+            .limit(limit)
+        )).all()
+    return {order_id: (lat, lon) for order_id, lat, lon in rows}
+
+
+def match(pickups: dict[int, tuple[float, float]], index, k: int = DISPATCH_CANDIDATES):
+    """Pair orders with couriers shortest distance first across the whole window.
+
+    Returns ``(distance, order_id, courier_id)`` proposals in the order they should be tried;
+    a courier or order appears in several when earlier proposals may still fail to commit.
+    """
+    proposals = []
+    for order_id, (lat, lon) in pickups.items():
+        for distance, courier_id in index.nearest(lat, lon, k):
+            proposals.append((distance, order_id, courier_id))
+    proposals.sort()
+    return proposals
+
+
+ASSIGNED = 'assigned'
+COURIER_TAKEN = 'courier_taken'
+ORDER_TAKEN = 'order_taken'
+
+
+async def assign(order_id: int, courier_id: int) -> str:
+    """Claim ``courier_id`` for ``order_id``; both must still be free when the transaction runs.
+
+    ``Courier.type`` acts as the optimistic lock: the conditional UPDATE only matches a courier
+    that is still available, so two dispatchers can never hand the same courier two orders.
+    Returns ASSIGNED, or which side was no longer free: COURIER_TAKEN or ORDER_TAKEN, in which
+    case the courier update is rolled back and the courier is still available.
+    """
+    async with SessionLocal() as db:
+        user_id = await db.scalar(
+            update(Courier)
+            .where(Courier.id == courier_id, Courier.type == TypeChoices.available)
+            .values(type=TypeChoices.busy, current_orders_id=order_id)
+            .returning(Courier.user_id)
+        )
+        if user_id is None:
+            return COURIER_TAKEN
+        claimed = await db.scalar(
+            update(Order)
+            .where(Order.id == order_id, Order.courier_id.is_(None))
+            .values(courier_id=user_id)
+            .returning(Order.id)
+        )
+        if claimed is None:
+            await db.rollback()
+            return ORDER_TAKEN
+        enqueue(db, 'order.courier_changed', {'order_id': order_id, 'courier_id': user_id, 'previous_courier_id': None})
+        await db.commit()
+    await publish_order_event(order_id, StatusChoices.str1, user_id)
+    return ASSIGNED
+
+
+async def dispatch_window() -> list[dict]:
+    started = time.perf_counter()
+    pickups = await pending_orders()
+    assignments, assigned_orders, used_couriers = [], set(), set()
+    for distance, order_id, courier_id in match(pickups, courier_index):
+        if order_id in assigned_orders or courier_id in used_couriers:
+            continue
+        outcome = await assign(order_id, courier_id)
+        if outcome == ORDER_TAKEN:
+            # Someone else assigned the order; the courier is untouched and may take another one.
+            dispatch_stats.conflicts += 1
+            assigned_orders.add(order_id)
+            continue
+        used_couriers.add(courier_id)
+        if outcome == ASSIGNED:
+            assigned_orders.add(order_id)
+            assignments.append({'order_id': order_id, 'courier_id': courier_id, 'distance_m': round(distance, 1)})
+        else:
+            dispatch_stats.conflicts += 1
+        # Either way the courier is no longer free: it was just assigned or another dispatcher got it first.
+        await set_availability(courier_id, False)
+
+    dispatch_stats.windows += 1
+    dispatch_stats.orders_seen += len(pickups)
+    dispatch_stats.assigned += len(assignments)
+    dispatch_stats.unmatched += len(pickups) - len(assignments)
+    dispatch_stats.last_window_ms = round((time.perf_counter() - started) * 1000, 3)
+    return assignments
+
+
+async def dispatch_forever():
+    """Run a dispatch window every DISPATCH_WINDOW_SECONDS on whichever worker holds the leader lock.
+
+    Orders left unmatched stay unassigned in the database and are retried in the next window.
+    """
+    token = uuid.uuid4().hex
+    lease = int(DISPATCH_WINDOW_SECONDS * 3000)
+    try:
+        while True:
+            try:
+                leader = await redis_client.set(LEADER_KEY, token, nx=True, px=lease) \
+                    or await redis_client.get(LEADER_KEY) == token
+                if leader:
+                    await redis_client.pexpire(LEADER_KEY, lease)
+                    await dispatch_window()
+            except Exception:
+                logger.exception('Dispatch window failed')
+            await asyncio.sleep(DISPATCH_WINDOW_SECONDS)
+    finally:
+        try:
+            await redis_client.eval(RELEASE_LOCK, 1, LEADER_KEY, token)
+        except RedisError:
+            pass
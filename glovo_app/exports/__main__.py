@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+from glovo_app.config import EXPORT_PART_ROWS
+from glovo_app.db.database import engine
+from glovo_app.exports.stream import (EXPORT_MODELS, FORMATS, Output, export_chunks, high_water_mark,
+                                      file_extension)
+
+
+STATE_FILE = '_state.json'
+
+
+def load_state(path: str):
+    if not os.path.exists(path):
+        return {'parts': 0, 'rows': 0, 'after': None}
+    with open(path) as source:
+        return json.load(source)
+
+
+def save_state(path: str, state: dict):
+    with open(path + '.tmp', 'w') as target:
+        json.dump(state, target)
+    os.replace(path + '.tmp', path)
+
+
+async def export(args):
+    model = EXPORT_MODELS[args.kind]
+    os.makedirs(args.output, exist_ok=True)
+    state_path = os.path.join(args.output, STATE_FILE)
+    state = load_state(state_path) if args.resume else {'parts': 0, 'rows': 0, 'after': None}
+    after = (datetime.fromisoformat(state['after'][0]), state['after'][1]) if state['after'] else None
+
+    part = output = None
+    part_rows = 0
+
+    def finish_part():
+        part.write(output.end())
+        part.close()
+        state['parts'] += 1
+        state['rows'] += part_rows
+        state['after'] = [after[0].isoformat(), after[1]]
+        save_state(state_path, state)
+        print(f"part {state['parts']}: {state['rows']} rows, high-water mark {state['after']}", file=sys.stderr)
+
+    async for rows in export_chunks(model, args.since, args.until, after):
+        if part is None:
+            name = f"part-{state['parts']:05d}.{file_extension(args.format, args.gzip)}"
+            part = open(os.path.join(args.output, name), 'wb')
+            output = Output(args.format, model, args.gzip)
+            part.write(output.begin())
+            part_rows = 0
+        part.write(output.encode(rows))
+        part_rows += len(rows)
+        after = high_water_mark(rows)
+        if part_rows >= args.part_rows:
+            finish_part()
+            part = None
+
+    if part is not None:
+        finish_part()
+
+
+async def main(args):
+    try:
+        await export(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.exports',
+                                     description='Export orders or reviews into chunked part files.')
+    parser.add_argument('kind', choices=sorted(EXPORT_MODELS))
+    parser.add_argument('-o', '--output', required=True, help='directory for part files and export state')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--since', type=datetime.fromisoformat)
+    parser.add_argument('--until', type=datetime.fromisoformat)
+    parser.add_argument('--part-rows', type=int, default=EXPORT_PART_ROWS)
+    parser.add_argument('--resume', action='store_true', help='continue after the last completed part')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+
+from sqlalchemy import select, tuple_, Integer, Numeric, DateTime
+
+from glovo_app.config import EXPORT_CHUNK_ROWS
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Order, StoreReview, CourierReview
+
+
+EXPORT_MODELS = {
+    'order': Order,
+    'store_review': StoreReview,
+    'courier_review': CourierReview,
+}
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_query(model, since: datetime | None = None, until: datetime | None = None,
+                 after: tuple[datetime, int] | None = None):
+    """Rows ordered by (created_date, id) so the last row exported is a resumable high-water mark."""
+    stmt = select(*model.__table__.columns)
+    if since is not None:
+        stmt = stmt.where(model.created_date >= since)
+    if until is not None:
+        stmt = stmt.where(model.created_date < until)
+    if after is not None:
+        stmt = stmt.where(tuple_(model.created_date, model.id) > tuple_(*after))
+    return stmt.order_by(model.created_date, model.id)
+
+
+async def export_chunks(model, since=None, until=None, after=None, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    async with SessionLocal(info={'read_only': True}) as db:
+        result = await db.stream(export_query(model, since, until, after).execution_options(yield_per=chunk_rows))
+        async for rows in result.partitions(chunk_rows):
+            yield rows
+
+
+def high_water_mark(rows) -> tuple[datetime, int]:
+    return rows[-1].created_date, rows[-1].id
+
+
+def plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class CsvEncoder:
+    def __init__(self, model):
+        self.columns = [column.name for column in model.__table__.columns]
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def begin(self) -> bytes:
+        return self._write([self.columns])
+
+    def encode(self, rows) -> bytes:
+        return self._write([plain(value) for value in row] for row in rows)
+
+    def end(self) -> bytes:
+        return b''
+
+
+class NdjsonEncoder:
+    def __init__(self, model):
+        self.columns = [column.name for column in model.__table__.columns]
+
+    def begin(self) -> bytes:
+        return b''
+
+    def encode(self, rows) -> bytes:
+        return ''.join(json.dumps(dict(zip(self.columns, map(plain, row))), ensure_ascii=False) + '\n'
+                       for row in rows).encode()
+
+    def end(self) -> bytes:
+        return b''
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+class ParquetEncoder:
+    """One Parquet row group per chunk, emitted as soon as it is written."""
+
+    def __init__(self, model):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.columns = [column.name for column in model.__table__.columns]
+        self.schema = pa.schema([(column.name, self._arrow_type(column.type)) for column in model.__table__.columns])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def _arrow_type(self, column_type):
+        if isinstance(column_type, Integer):
+            return self.pa.int64()
+        if isinstance(column_type, Numeric):
+            return self.pa.float64()
+        if isinstance(column_type, DateTime):
+            return self.pa.timestamp('us')
+        return self.pa.string()
+
+    def _value(self, value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
+
+    def begin(self) -> bytes:
+        return b''
+
+    def encode(self, rows) -> bytes:
+        data = {name: [self._value(row[i]) for row in rows] for i, name in enumerate(self.columns)}
+        self.writer.write_table(self.pa.Table.from_pydict(data, schema=self.schema))
+        return self.sink.drain()
+
+    def end(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {
+    'csv': CsvEncoder,
+    'ndjson': NdjsonEncoder,
+    'parquet': ParquetEncoder,
+}
+
+
+class Output:
+    """Encoder output, optionally gzip-compressed on the fly."""
+
+    def __init__(self, fmt: str, model, compress: bool = False):
+        self.encoder = ENCODERS[fmt](model)
+        self.gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _compress(self, data: bytes, final: bool = False) -> bytes:
+        if self.gzip is None:
+            return data
+        data = self.gzip.compress(data)
+        return data + self.gzip.flush() if final else data
+
+    def begin(self) -> bytes:
+        return self._compress(self.encoder.begin())
+
+    def encode(self, rows) -> bytes:
+        return self._compress(self.encoder.encode(rows))
+
+    def end(self) -> bytes:
+        return self._compress(self.encoder.end(), final=True)
+
+
+def file_extension(fmt: str, compress: bool) -> str:
+    return f'{fmt}.gz' if compress else fmt
+
+
+async def export_stream(kind: str, fmt: str, since=None, until=None, after=None, compress: bool = False):
+    output = Output(fmt, EXPORT_MODELS[kind], compress)
+    yield output.begin()
+    async for rows in export_chunks(EXPORT_MODELS[kind], since, until, after):
+        yield output.encode(rows)
+    yield output.end()
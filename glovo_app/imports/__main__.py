@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import sys
+
+from glovo_app.db.database import engine
+from glovo_app.imports.pipeline import IMPORT_SPECS, FORMATS, ImportProgress, run_import, new_job_id, infer_format
+
+
+class ConsoleProgress(ImportProgress):
+    async def publish(self):
+        print(f'[{self.status}] read={self.rows_read} staged={self.rows_staged} '
+              f'rejected={self.rows_rejected} merged={self.rows_merged}', file=sys.stderr)
+
+
+async def main(args):
+    progress = ConsoleProgress(new_job_id(), args.kind)
+    try:
+        await run_import(args.kind, args.path, args.format or infer_format(args.path), progress)
+    finally:
+        await engine.dispose()
+    for error in progress.errors:
+        print(f"row {error['row']}: {error['errors']}", file=sys.stderr)
+    if progress.error:
+        print(progress.error, file=sys.stderr)
+    return 0 if progress.status == 'done' else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.imports',
+                                     description='Import a CSV or NDJSON catalogue file.')
+    parser.add_argument('kind', choices=sorted(IMPORT_SPECS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS)
+    sys.exit(asyncio.run(main(parser.parse_args())))
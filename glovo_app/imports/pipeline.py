@@ -0,0 +1,288 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import tempfile
+import uuid
+from decimal import Decimal
+from itertools import islice
+
+from pydantic import BaseModel, ValidationError
+from redis.exceptions import RedisError
+from sqlalchemy import Table, Column, Integer, MetaData, Numeric, String, select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.response import invalidate_tags
+from glovo_app.config import IMPORT_CHUNK_ROWS, IMPORT_MAX_ERRORS, IMPORT_JOB_TTL_SECONDS
+from glovo_app.db.bulk import DIALECT_INSERTS
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Product, ProductCombo, Store, Category, UserProfile
+from glovo_app.db.schema import ProductSchema, ProductComboSchema, StoreSchema
+from glovo_app.search.backends import SEARCH_FIELDS
+from glovo_app.search.engine import search_backend
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportSpec:
+    """``tag`` names the response cache tag of one row (``{tag}:{id}``); ``list_tags`` those of its listings."""
+
+    def __init__(self, model, schema: type[BaseModel], key: tuple[str, ...], references: dict, tag: str,
+                 list_tags: tuple[str, ...] = ()):
+        self.model = model
+        self.schema = schema
+        self.key = key
+        self.references = references
+        self.tag = tag
+        self.list_tags = list_tags
+        self.columns = [name for name in schema.model_fields if name != 'id']
+
+
+IMPORT_SPECS = {
+    'product': ImportSpec(Product, ProductSchema, ('store_id', 'product_name'), {'store_id': Store}, 'product'),
+    'product_combo': ImportSpec(ProductCombo, ProductComboSchema, ('combo_name',), {'store_id': Store},
+                                'product_combo', ('product_combo',)),
+    'store': ImportSpec(Store, StoreSchema, ('owner_id', 'store_name'),
+                        {'category_id': Category, 'owner_id': UserProfile}, 'store'),
+}
+
+
+def job_key(job_id: str) -> str:
+    return f'import:{job_id}'
+
+
+class ImportProgress:
+    def __init__(self, job_id: str, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self.status = 'queued'
+        self.rows_read = 0
+        self.rows_staged = 0
+        self.rows_rejected = 0
+        self.rows_merged = 0
+        self.errors = []
+        self.error = None
+
+    def record_error(self, row_no: int, errors: list):
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'row': row_no, 'errors': errors})
+
+    def snapshot(self):
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'rows_read': self.rows_read,
+            'rows_staged': self.rows_staged,
+            'rows_rejected': self.rows_rejected,
+            'rows_merged': self.rows_merged,
+            'errors': self.errors,
+            'error': self.error,
+        }
+
+    async def publish(self):
+        try:
+            await redis_client.set(job_key(self.job_id), json.dumps(self.snapshot()), ex=IMPORT_JOB_TTL_SECONDS)
+        except RedisError:
+            logger.warning('Could not publish progress of import %s', self.job_id, exc_info=True)
+
+
+async def get_progress(job_id: str):
+    raw = await redis_client.get(job_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+def read_rows(path: str, fmt: str):
+    """Yield raw rows one at a time; NDJSON lines are left unparsed for the schema to decode."""
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield line
+
+
+def column_errors(spec: ImportSpec, item: BaseModel) -> list:
+    """Values the schema accepts but the target columns cannot hold.
+
+    The staging table copies the target column types, so one of these would abort the COPY and
+    with it the whole import instead of rejecting the row.
+    """
+    table = spec.model.__table__
+    errors = []
+    for name in spec.columns:
+        value, column_type = getattr(item, name), table.c[name].type
+        if value is None:
+            continue
+        if isinstance(column_type, String) and column_type.length and len(value) > column_type.length:
+            errors.append({'loc': [name], 'msg': f'String should have at most {column_type.length} characters'})
+        elif isinstance(column_type, Numeric) and column_type.precision is not None:
+            scale = column_type.scale or 0
+            digits = Decimal(str(value)).quantize(Decimal(1).scaleb(-scale)).adjusted() + 1
+            if digits > column_type.precision - scale:
+                errors.append({'loc': [name], 'msg': f'Number should have at most '
+                                                     f'{column_type.precision - scale} digits before the decimal point'})
+    return errors
+
+
+def validate_row(spec: ImportSpec, raw) -> tuple[BaseModel | None, list]:
+    """The validated row and its errors; a row with errors must not be staged."""
+    try:
+        if isinstance(raw, str):
+            item = spec.schema.model_validate_json(raw)
+        else:
+            # Empty CSV cells mean "not provided" rather than an empty string.
+            item = spec.schema.model_validate({name: value for name, value in raw.items() if value != ''})
+    except ValidationError as exc:
+        return None, exc.errors(include_url=False, include_context=False, include_input=False)
+    return item, column_errors(spec, item)
+
+
+def staging_table(spec: ImportSpec, job_id: str) -> Table:
+    table = spec.model.__table__
+    return Table(
+        f'import_stage_{job_id}', MetaData(),
+        Column('row_no', Integer, nullable=False),
+        *(Column(name, table.c[name].type) for name in spec.columns),
+        prefixes=['TEMPORARY'],
+        postgresql_on_commit='DROP',
+    )
+
+
+def to_record(spec: ImportSpec, stage: Table, row_no: int, item: BaseModel) -> tuple:
+    values = [row_no]
+    for name in spec.columns:
+        value = getattr(item, name)
+        if value is not None and isinstance(stage.c[name].type, Numeric):
+            value = Decimal(str(value))
+        values.append(value)
+    return tuple(values)
+
+
+async def copy_records(db: AsyncSession, stage: Table, records: list[tuple]):
+    if not records:
+        return
+    conn = await db.connection()
+    if conn.dialect.name == 'postgresql':
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(stage.name, records=records,
+                                                         columns=[column.name for column in stage.c])
+    else:
+        names = [column.name for column in stage.c]
+        await conn.execute(stage.insert(), [dict(zip(names, record)) for record in records])
+
+
+async def reject_dangling(db: AsyncSession, spec: ImportSpec, stage: Table, progress: ImportProgress):
+    for field, model in spec.references.items():
+        dangling = stage.c[field].not_in(select(model.id))
+        rows = await db.execute(select(stage.c.row_no).where(dangling).order_by(stage.c.row_no)
+                                .limit(IMPORT_MAX_ERRORS))
+        for row_no in rows.scalars():
+            progress.record_error(row_no, [{'loc': [field], 'msg': f'{model.__name__} Not Found'}])
+        result = await db.execute(delete(stage).where(dangling))
+        progress.rows_rejected += result.rowcount
+        progress.rows_staged -= result.rowcount
+
+
+async def merge(db: AsyncSession, spec: ImportSpec, stage: Table) -> list[int]:
+    """Upsert the last staged row for every natural key into the target table; returns the upserted ids."""
+    latest = select(func.max(stage.c.row_no)).group_by(*(stage.c[name] for name in spec.key))
+    rows = select(*(stage.c[name] for name in spec.columns)).where(stage.c.row_no.in_(latest))
+    insert = DIALECT_INSERTS[db.get_bind().dialect.name]
+    stmt = insert(spec.model).from_select(spec.columns, rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(spec.key),
+        set_={name: stmt.excluded[name] for name in spec.columns if name not in spec.key},
+    )
+    return list((await db.scalars(stmt.returning(spec.model.id))).all())
+
+
+async def refresh_merged(spec: ImportSpec, ids: list[int]):
+    """Imported rows bypass the endpoints, so drop their cached responses and re-index them here."""
+    for start in range(0, len(ids), IMPORT_CHUNK_ROWS):
+        chunk = ids[start:start + IMPORT_CHUNK_ROWS]
+        if spec.model in SEARCH_FIELDS:
+            async with SessionLocal() as db:
+                for obj in (await db.scalars(select(spec.model).where(spec.model.id.in_(chunk)))).all():
+                    await search_backend.index(obj)
+        await invalidate_tags(*spec.list_tags, *(f'{spec.tag}:{obj_id}' for obj_id in chunk))
+
+
+async def run_import(kind: str, path: str, fmt: str, progress: ImportProgress):
+    """Stream ``path`` into a staging table chunk by chunk, then merge it in the same transaction.
+
+    Only one chunk of rows is held in memory at a time; the whole file lands atomically.
+    """
+    spec = IMPORT_SPECS[kind]
+    stage = staging_table(spec, progress.job_id)
+    rows = read_rows(path, fmt)
+    progress.status = 'running'
+    await progress.publish()
+    try:
+        async with SessionLocal() as db:
+            conn = await db.connection()
+            await conn.run_sync(stage.create)
+
+            while chunk := await asyncio.to_thread(list, islice(rows, IMPORT_CHUNK_ROWS)):
+                records = []
+                for raw in chunk:
+                    progress.rows_read += 1
+                    item, errors = validate_row(spec, raw)
+                    if errors:
+                        progress.rows_rejected += 1
+                        progress.record_error(progress.rows_read, errors)
+                        continue
+                    records.append(to_record(spec, stage, progress.rows_read, item))
+                await copy_records(db, stage, records)
+                progress.rows_staged += len(records)
+                await progress.publish()
+
+            await reject_dangling(db, spec, stage, progress)
+            merged = await merge(db, spec, stage)
+            progress.rows_merged = len(merged)
+            if conn.dialect.name != 'postgresql':
+                await conn.run_sync(stage.drop)
+            await db.commit()
+        await refresh_merged(spec, merged)
+        progress.status = 'done'
+    except Exception as exc:
+        logger.exception('Import %s failed', progress.job_id)
+        progress.status = 'failed'
+        progress.error = str(exc)
+    finally:
+        rows.close()
+        await progress.publish()
+    return progress
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def infer_format(filename: str | None) -> str:
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'json': 'ndjson'}.get(extension, extension)
+
+
+async def spool_upload(upload, chunk_size: int = 1024 * 1024) -> str:
+    """Copy an upload to a temporary file so the job can outlive the request."""
+    spool = tempfile.NamedTemporaryFile(prefix='glovo-import-', delete=False)
+    try:
+        while chunk := await upload.read(chunk_size):
+            await asyncio.to_thread(spool.write, chunk)
+    finally:
+        spool.close()
+    return spool.name
+
+
+async def import_spooled(kind: str, path: str, fmt: str, progress: ImportProgress):
+    try:
+        await run_import(kind, path, fmt, progress)
+    finally:
+        os.unlink(path)
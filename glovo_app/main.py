@@ -1,10 +1,10 @@
 import fastapi
-from fastapi_pagination import add_pagination
 
 from api.endpoints import (auth, categories, orders, carts, contact_infos, couriers, courier_reviews,
-                           store_reviews, stores, users, products, product_combos, users)
+                           store_reviews, stores, users, products, product_combos, users, internal, imports,
+                           exports, dispatch, tracking, metrics)
 
-import redis.asyncio as redis
+import asyncio
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from fastapi_limiter import FastAPILimiter
@@ -12,25 +12,59 @@ from fastapi_limiter import FastAPILimiter
 import uvicorn
 
 from glovo_app.admin.setup import setup_admin
-
-
-async def init_redis():
-    return redis.Redis.from_url('redis://localhost', encoding='utf-8',
-                                decode_responses=True)
+from glovo_app.db.database import engine, replica_engines
+from glovo_app.db.routing import replica_set
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.response import listen_invalidations
+from glovo_app.cache.idempotency import IdempotencyMiddleware
+from glovo_app.config import METRICS_ENABLED
+from glovo_app.metrics.http import MetricsMiddleware
+from glovo_app.security.passwords import password_hasher
+from glovo_app.security.refresh_store import refresh_token_store, SqlRefreshTokenStore
+from glovo_app.rankings.leaderboard import refresh_forever as refresh_rankings
+from glovo_app.dispatch.index import listen_events as listen_dispatch_events
+from glovo_app.dispatch.matching import dispatch_forever
+from glovo_app.dispatch.ingest import flush_forever as flush_locations
+from glovo_app.tracking.events import tracking_broker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis = await init_redis()
-    await FastAPILimiter.init(redis)
+    await FastAPILimiter.init(redis_client)
+    replica_monitor = asyncio.create_task(replica_set.monitor()) if replica_engines else None
+    cache_listener = asyncio.create_task(listen_invalidations())
+    ranking_refresh = asyncio.create_task(refresh_rankings())
+    dispatch_listener = asyncio.create_task(listen_dispatch_events())
+    dispatcher = asyncio.create_task(dispatch_forever())
+    location_flush = asyncio.create_task(flush_locations())
+    tracking_listener = asyncio.create_task(tracking_broker.listen())
+    token_purge = None
+    if isinstance(refresh_token_store, SqlRefreshTokenStore):
+        token_purge = asyncio.create_task(refresh_token_store.purge_forever())
     yield
-    await redis.close()
+    cache_listener.cancel()
+    ranking_refresh.cancel()
+    dispatch_listener.cancel()
+    dispatcher.cancel()
+    location_flush.cancel()
+    tracking_listener.cancel()
+    if token_purge:
+        token_purge.cancel()
+    if replica_monitor:
+        replica_monitor.cancel()
+    await redis_client.close()
+    for replica in replica_engines:
+        await replica.dispose()
+    await engine.dispose()
+    password_hasher.shutdown()
 
 
 glovo_app = fastapi.FastAPI(title='Glovo site', lifespan=lifespan)
 setup_admin(glovo_app)
-
-add_pagination(glovo_app)
+glovo_app.add_middleware(IdempotencyMiddleware)
+if METRICS_ENABLED:
+    # Added last so it is outermost and also times idempotent replays.
+    glovo_app.add_middleware(MetricsMiddleware, routes=glovo_app.routes)
 
 glovo_app.include_router(auth.auth_router, tags=['Auth'])
 glovo_app.include_router(users.user_router, tags=['UserProfile'])
@@ -44,6 +78,12 @@ glovo_app.include_router(contact_infos.contact_info_router, tags=['ContactInfo']
 glovo_app.include_router(couriers.courier_router, tags=['Courier'])
 glovo_app.include_router(courier_reviews.courier_review_router, tags=['CourierReview'])
 glovo_app.include_router(product_combos.product_combo_router, tags=['ProductCombo'])
+glovo_app.include_router(internal.internal_router, tags=['Internal'])
+glovo_app.include_router(imports.import_router, tags=['Import'])
+glovo_app.include_router(exports.export_router, tags=['Export'])
+glovo_app.include_router(dispatch.dispatch_router, tags=['Dispatch'])
+glovo_app.include_router(tracking.tracking_router, tags=['Tracking'])
+glovo_app.include_router(metrics.metrics_router)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from glovo_app.config import DB_URL
+from glovo_app.metrics.http import MetricsMiddleware, render_metrics
+from glovo_app.metrics.sql import instrument_queries
+
+
+def build_app(engine, queries: int, measured: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/item/{item_id}')
+    async def item(item_id: int):
+        if queries:
+            async with engine.connect() as conn:
+                for _ in range(queries):
+                    await conn.execute(text('SELECT 1'))
+        return {'id': item_id, 'name': 'item'}
+
+    if measured:
+        app.add_middleware(MetricsMiddleware, routes=app.routes)
+    return app
+
+
+async def call(app, item_id: int):
+    path = f'/item/{item_id}'
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '', 'headers': [],
+        'server': ('bench', 80), 'client': ('bench', 1),
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def per_request(app, requests: int) -> float:
+    started = time.perf_counter()
+    for item_id in range(requests):
+        await call(app, item_id)
+    return (time.perf_counter() - started) / requests
+
+
+async def benchmark(args):
+    """Time the same app in-process with and without the middleware and the SQL hooks.
+
+    Variants run in interleaved rounds so drift in the machine or database affects each alike;
+    the median round is reported.
+    """
+    plain_engine = create_async_engine(args.db_url)
+    measured_engine = instrument_queries(create_async_engine(args.db_url))
+    variants = {
+        'bare': build_app(plain_engine, args.queries, measured=False),
+        'middleware': build_app(plain_engine, args.queries, measured=True),
+        'middleware+sql': build_app(measured_engine, args.queries, measured=True),
+    }
+    try:
+        for app in variants.values():
+            await per_request(app, args.warmup)
+        samples = {name: [] for name in variants}
+        for _ in range(args.rounds):
+            for name, app in variants.items():
+                samples[name].append(await per_request(app, args.requests))
+    finally:
+        await plain_engine.dispose()
+        await measured_engine.dispose()
+
+    baseline = statistics.median(samples['bare'])
+    print(f'{args.requests} requests x {args.rounds} rounds, {args.queries} queries per request', file=sys.stderr)
+    for name, values in samples.items():
+        median = statistics.median(values)
+        print(f'{name:>15}: {median * 1e6:8.1f} us/request, overhead {(median - baseline) * 1e6:+7.1f} us '
+              f'({(median / baseline - 1) * 100:+.1f}%)', file=sys.stderr)
+
+    started = time.perf_counter()
+    body = render_metrics()
+    print(f'/metrics: {len(body)} bytes rendered in {(time.perf_counter() - started) * 1000:.2f} ms',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.metrics',
+                                     description='Measure the per-request cost of the metrics middleware.')
+    parser.add_argument('--db-url', default=DB_URL)
+    parser.add_argument('--queries', type=int, default=3, help='SELECT 1 statements per request, 0 for none')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per variant in each round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=200)
+    asyncio.run(benchmark(parser.parse_args()))
@@ -0,0 +1,179 @@
+import random
+import time
+from bisect import bisect_left
+
+from prometheus_client import REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+from starlette.routing import Match
+
+from glovo_app.config import QUERY_TRACE_SAMPLE_RATE
+from glovo_app.metrics.sql import RequestQueries, current_queries, report_repeated
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+QUERY_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Requests that reach no route are counted under one label, so scanners probing random
+# paths cannot grow the series without bound.
+UNMATCHED = 'unmatched'
+
+
+class Distribution:
+    """Histogram buckets kept as plain counters.
+
+    Only the event loop thread records into them, so unlike ``prometheus_client.Histogram``
+    there is no lock to take per observation; they are cumulated when scraped.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def buckets(self):
+        cumulative, total = [], 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            cumulative.append((floatToGoString(bound), total))
+        cumulative.append(('+Inf', total + self.counts[-1]))
+        return cumulative
+
+
+class RouteStats:
+    __slots__ = ('statuses', 'seconds', 'size', 'queries', 'query_seconds')
+
+    def __init__(self):
+        self.statuses = {}
+        self.seconds = Distribution(LATENCY_BUCKETS)
+        self.size = Distribution(SIZE_BUCKETS)
+        self.queries = Distribution(QUERY_COUNT_BUCKETS)
+        self.query_seconds = Distribution(QUERY_SECONDS_BUCKETS)
+
+    def record(self, status: int, seconds: float, size: int, queries: RequestQueries):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.seconds.observe(seconds)
+        self.size.observe(size)
+        self.queries.observe(queries.count)
+        self.query_seconds.observe(queries.seconds)
+
+
+class HttpStats:
+    def __init__(self):
+        self.routes = {}
+        self.in_progress = {}
+
+    def route(self, method: str, route: str) -> RouteStats:
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        return stats
+
+
+http_stats = HttpStats()
+
+
+class HttpCollector:
+    """Turns ``http_stats`` into Prometheus metric families when ``/metrics`` is scraped."""
+
+    def __init__(self, stats: HttpStats):
+        self.stats = stats
+
+    def collect(self):
+        requests = CounterMetricFamily('http_requests', 'HTTP requests by route and status',
+                                       labels=['method', 'route', 'status'])
+        in_progress = GaugeMetricFamily('http_requests_in_progress', 'Requests being handled', labels=['method'])
+        histograms = {
+            'seconds': HistogramMetricFamily('http_request_duration_seconds', 'Time to send the full response',
+                                             labels=['method', 'route']),
+            'size': HistogramMetricFamily('http_response_size_bytes', 'Response body size',
+                                          labels=['method', 'route']),
+            'queries': HistogramMetricFamily('http_request_db_queries',
+                                             'SQL statements executed while handling a request',
+                                             labels=['method', 'route']),
+            'query_seconds': HistogramMetricFamily('http_request_db_seconds',
+                                                   'Time spent in SQL statements while handling a request',
+                                                   labels=['method', 'route']),
+        }
+        for method, count in list(self.stats.in_progress.items()):
+            in_progress.add_metric([method], count)
+        for (method, route), stats in list(self.stats.routes.items()):
+            for status, count in list(stats.statuses.items()):
+                requests.add_metric([method, route, str(status)], count)
+            for field, family in histograms.items():
+                distribution = getattr(stats, field)
+                family.add_metric([method, route], distribution.buckets(), distribution.sum)
+        yield requests
+        yield in_progress
+        yield from histograms.values()
+
+
+REGISTRY.register(HttpCollector(http_stats))
+
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class MetricsMiddleware:
+    """Per-route request counts, latency, response size and SQL usage, plus in-flight requests.
+
+    Routes are labelled by their path template (``/order/{order_id}/``), which the router
+    leaves in the scope once it has matched. Requests answered before routing, such as
+    idempotent replays, are matched against the routes afterwards. A QUERY_TRACE_SAMPLE_RATE
+    share of requests is also checked for repeated queries.
+    """
+
+    def __init__(self, app, routes=None, stats: HttpStats = http_stats):
+        self.app = app
+        self.routes = routes
+        self.stats = stats
+
+    def route_of(self, scope) -> str:
+        route = scope.get('route')
+        if route is not None:
+            return route.path
+        for candidate in self.routes or ():
+            if candidate.matches(scope)[0] == Match.FULL:
+                return candidate.path
+        return UNMATCHED
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        method = scope['method']
+        in_progress = self.stats.in_progress
+        status, size = 500, 0
+
+        async def measured_send(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        queries = RequestQueries(traced=random.random() < QUERY_TRACE_SAMPLE_RATE)
+        token = current_queries.set(queries)
+        in_progress[method] = in_progress.get(method, 0) + 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress[method] -= 1
+            current_queries.reset(token)
+            route = self.route_of(scope)
+            self.stats.route(method, route).record(status, elapsed, size, queries)
+            if queries.statements is not None:
+                report_repeated(method, route, queries)
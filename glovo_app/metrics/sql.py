@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from fastapi import Request
+from sqlalchemy import event
+
+from glovo_app.config import (QUERY_REPEAT_THRESHOLD, QUERY_SLOW_SECONDS, QUERY_EXPLAIN_INTERVAL_SECONDS,
+                              QUERY_BUDGET_ENFORCE)
+
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'WITH')
+RECENT_FINDINGS = 50
+
+
+class QueryStats:
+    def __init__(self):
+        self.traced_requests = 0
+        self.repeated = 0
+        self.slow = 0
+        self.explained = 0
+        self.over_budget = 0
+        self.recent_repeated = deque(maxlen=RECENT_FINDINGS)
+        self.recent_slow = deque(maxlen=RECENT_FINDINGS)
+
+    def snapshot(self):
+        return {**vars(self), 'recent_repeated': list(self.recent_repeated), 'recent_slow': list(self.recent_slow)}
+
+
+query_stats = QueryStats()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestQueries:
+    """SQL statements run while handling one request.
+
+    Every request gets the totals; a sampled ``traced`` request also keeps each distinct
+    statement with the parameter sets it ran with, which is what repeated-query detection needs.
+    """
+
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self, traced: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {} if traced else None
+
+    def record(self, statement: str, parameters, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            seen = self.statements.get(statement)
+            if seen is None:
+                seen = self.statements[statement] = [0, set()]
+            seen[0] += 1
+            if len(seen[1]) < QUERY_REPEAT_THRESHOLD:
+                seen[1].add(repr(parameters))
+
+    def repeated(self):
+        """Statements run at least QUERY_REPEAT_THRESHOLD times with different parameters: a loop of
+        lookups, usually one per row of an earlier result, that one joined or IN query could replace."""
+        for statement, (count, parameters) in (self.statements or {}).items():
+            if len(parameters) >= QUERY_REPEAT_THRESHOLD:
+                yield statement, count
+
+
+# Set by the metrics middleware for the duration of a request. SQLAlchemy runs the cursor
+# events in a greenlet that shares the request task's context, so they see the same object.
+current_queries: ContextVar[RequestQueries | None] = ContextVar('current_queries', default=None)
+
+
+def report_repeated(method: str, route: str, queries: RequestQueries):
+    query_stats.traced_requests += 1
+    for statement, count in queries.repeated():
+        query_stats.repeated += 1
+        query_stats.recent_repeated.append({'route': f'{method} {route}', 'count': count,
+                                            'statement': statement[:500], 'at': time.time()})
+        logger.warning('Possible N+1 in %s %s: ran %d times with different parameters: %s',
+                       method, route, count, statement)
+
+
+class SlowQueryLog:
+    """Logs statements slower than QUERY_SLOW_SECONDS with their plan.
+
+    EXPLAIN runs later in its own task and connection, never inside the cursor event, and
+    each statement is explained at most once every QUERY_EXPLAIN_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self.explained_at = {}
+        self.tasks = set()
+
+    def due(self, statement: str) -> bool:
+        now = time.monotonic()
+        if now - self.explained_at.get(statement, -QUERY_EXPLAIN_INTERVAL_SECONDS) < QUERY_EXPLAIN_INTERVAL_SECONDS:
+            return False
+        if len(self.explained_at) >= 1000:
+            self.explained_at.clear()
+        self.explained_at[statement] = now
+        return True
+
+    def record(self, engine, statement: str, parameters, seconds: float, executemany: bool):
+        query_stats.slow += 1
+        if executemany or not statement.lstrip().upper().startswith(EXPLAINABLE) or not self.due(statement):
+            self.log(statement, parameters, seconds, None)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.log(statement, parameters, seconds, None)
+            return
+        task = loop.create_task(self.explain(engine, statement, parameters, seconds))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def explain(self, engine, statement: str, parameters, seconds: float):
+        # The task inherited the request's context; the EXPLAIN is not one of its queries.
+        current_queries.set(None)
+        try:
+            async with engine.connect() as conn:
+                rows = (await conn.exec_driver_sql(f'EXPLAIN {statement}', parameters)).all()
+            plan = '\n'.join(' | '.join(str(column) for column in row) for row in rows)
+            query_stats.explained += 1
+        except Exception as exc:
+            plan = f'EXPLAIN failed: {type(exc).__name__}: {exc}'
+        self.log(statement, parameters, seconds, plan)
+
+    def log(self, statement: str, parameters, seconds: float, plan: str | None):
+        query_stats.recent_slow.append({'seconds': round(seconds, 6), 'statement': statement[:500],
+                                        'plan': plan, 'at': time.time()})
+        logger.warning('Slow query (%.1f ms): %s\nparameters: %.200r%s', seconds * 1000, statement, parameters,
+                       f'\n{plan}' if plan else '')
+
+
+slow_query_log = SlowQueryLog()
+
+
+def instrument_queries(engine):
+    """Add the statements run on ``engine`` during a request to that request's totals, and log slow ones."""
+    sync_engine = engine.sync_engine
+    time_every_query = QUERY_SLOW_SECONDS > 0
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and (time_every_query or current_queries.get() is not None):
+            context.metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        queries = current_queries.get()
+        if queries is not None:
+            queries.record(statement, parameters, elapsed)
+        if time_every_query and elapsed >= QUERY_SLOW_SECONDS and not statement.startswith('EXPLAIN'):
+            slow_query_log.record(engine, statement, parameters, elapsed, executemany)
+
+    return engine
+
+
+def query_budget(limit: int):
+    """A route dependency capping the SQL statements one request may run, e.g.
+    ``dependencies=[Depends(query_budget(3))]``.
+
+    The whole request counts, dependencies included. Going over is logged; with
+    QUERY_BUDGET_ENFORCE, as in the test environment, it raises QueryBudgetExceeded instead.
+    Needs the metrics middleware, which does the counting.
+    """
+    async def check_budget(request: Request):
+        yield
+        queries = current_queries.get()
+        if queries is None or queries.count <= limit:
+            return
+        query_stats.over_budget += 1
+        message = f'{request.method} {request.url.path} ran {queries.count} SQL statements, budget is {limit}'
+        if QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    return check_budget
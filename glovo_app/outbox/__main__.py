@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import json
+import sys
+
+import glovo_app.outbox.handlers  # noqa: F401  registers the handlers
+from glovo_app.cache.client import redis_client
+from glovo_app.config import OUTBOX_BATCH_SIZE
+from glovo_app.db.database import engine
+from glovo_app.outbox.worker import OutboxStats, backlog, drain_batch, drain_forever, new_worker_id, report_forever
+
+
+async def main(args):
+    stats = OutboxStats(new_worker_id())
+    try:
+        if args.once:
+            while await drain_batch(stats, args.batch_size):
+                pass
+            print(json.dumps({**stats.snapshot(), **await backlog()}), file=sys.stderr)
+            return
+        print(f'outbox worker {stats.worker_id}: {args.concurrency} consumers, batches of {args.batch_size}',
+              file=sys.stderr)
+        await asyncio.gather(report_forever(stats),
+                             *(drain_forever(stats, args.batch_size) for _ in range(args.concurrency)))
+    finally:
+        await redis_client.close()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.outbox',
+                                     description='Deliver outbox events to their registered handlers.')
+    parser.add_argument('--concurrency', type=int, default=1, help='consumers draining batches in parallel')
+    parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+    parser.add_argument('--once', action='store_true', help='drain everything that is due, then exit')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,41 @@
+from sqlalchemy import select, update
+
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Courier, OrderItem, Product, StatusChoices, TypeChoices
+from glovo_app.dispatch.index import set_availability
+from glovo_app.outbox.worker import handler
+from glovo_app.rankings.leaderboard import record_demand
+
+
+FINAL_STATUSES = (StatusChoices.str3.value, StatusChoices.str4.value)
+
+
+@handler('order.created')
+async def record_order_demand(payload: dict):
+    # Read from the primary: a replica may not have the order yet.
+    async with SessionLocal() as db:
+        demand = await db.execute(
+            select(Product.store_id, OrderItem.product_id, OrderItem.quantity)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == payload['order_id'])
+        )
+        items = demand.all()
+    if items:
+        await record_demand(payload['order_id'], items, at=payload.get('at'))
+
+
+@handler('order.status_changed')
+async def release_courier(payload: dict):
+    """Make the courier of a delivered or cancelled order available for dispatch again."""
+    if payload['status'] not in FINAL_STATUSES:
+        return
+    async with SessionLocal() as db:
+        courier_id = await db.scalar(
+            update(Courier)
+            .where(Courier.current_orders_id == payload['order_id'], Courier.type == TypeChoices.busy)
+            .values(type=TypeChoices.available, current_orders_id=None)
+            .returning(Courier.id)
+        )
+        await db.commit()
+    if courier_id is not None:
+        await set_availability(courier_id, True)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import (OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_SECONDS,
+                              OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_REPORT_SECONDS)
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+handlers = defaultdict(list)
+
+
+def handler(topic: str):
+    """Register a coroutine ``handler(payload)`` for ``topic``.
+
+    Delivery is at least once: when any handler of an event fails, or the batch cannot be
+    committed, the event is retried with all of its handlers, so each must tolerate seeing
+    the same event twice.
+    """
+    def decorator(handle):
+        handlers[topic].append(handle)
+        return handle
+    return decorator
+
+
+def enqueue(db: AsyncSession, topic: str, payload: dict):
+    """Add an event to the caller's transaction; it is only visible to the worker once that commits."""
+    db.add(OutboxEvent(topic=topic, payload=payload))
+
+
+def backoff(attempts: int) -> float:
+    delay = min(OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def worker_key(worker_id: str) -> str:
+    return f'outbox:worker:{worker_id}'
+
+
+class OutboxStats:
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self.lag_seconds = 0.0
+        self.recent = deque()
+
+    def record_batch(self, processed: int, started: float, lag: float):
+        now = time.monotonic()
+        self.processed += processed
+        self.batches += 1
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.lag_seconds = round(lag, 3)
+        self.recent.append((now, processed))
+        while self.recent and self.recent[0][0] < now - 60:
+            self.recent.popleft()
+
+    def throughput(self) -> float:
+        """Events processed per second over the last minute."""
+        return round(sum(count for _, count in self.recent) / 60, 3)
+
+    def snapshot(self):
+        return {
+            'worker_id': self.worker_id,
+            'processed': self.processed,
+            'retried': self.retried,
+            'dead': self.dead,
+            'batches': self.batches,
+            'last_batch_ms': self.last_batch_ms,
+            'lag_seconds': self.lag_seconds,
+            'per_second': self.throughput(),
+        }
+
+    async def publish(self):
+        try:
+            await redis_client.set(worker_key(self.worker_id), json.dumps(self.snapshot()),
+                                   ex=int(OUTBOX_REPORT_SECONDS * 3))
+        except RedisError:
+            logger.warning('Could not publish outbox worker stats', exc_info=True)
+
+
+async def dispatch(event: OutboxEvent):
+    for handle in handlers.get(event.topic, ()):
+        await handle(event.payload)
+
+
+async def drain_batch(stats: OutboxStats, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claim up to ``batch_size`` due events, run their handlers and delete the ones that succeeded.
+
+    Rows stay locked until the transaction ends; SKIP LOCKED lets concurrent workers claim
+    the next rows instead of queueing behind them.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        events = (await db.scalars(
+            select(OutboxEvent)
+            .where(OutboxEvent.failed_at.is_(None), OutboxEvent.available_at <= now)
+            .order_by(OutboxEvent.available_at, OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not events:
+            return 0
+
+        done = []
+        for event in events:
+            try:
+                await dispatch(event)
+                done.append(event.id)
+            except Exception as exc:
+                event.attempts += 1
+                event.last_error = f'{type(exc).__name__}: {exc}'
+                if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    event.failed_at = now
+                    stats.dead += 1
+                    logger.error('Outbox event %s (%s) gave up after %d attempts', event.id, event.topic,
+                                 event.attempts, exc_info=True)
+                else:
+                    event.available_at = now + timedelta(seconds=backoff(event.attempts))
+                    stats.retried += 1
+                    logger.warning('Outbox event %s (%s) failed, retrying', event.id, event.topic, exc_info=True)
+        if done:
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(done)))
+        await db.commit()
+
+    lag = (now - min(event.created_at for event in events)).total_seconds()
+    stats.record_batch(len(done), started, lag)
+    return len(events)
+
+
+async def backlog():
+    """Pending and dead events, and how long the oldest pending one has been waiting."""
+    async with SessionLocal(info={'read_only': True}) as db:
+        pending, oldest = (await db.execute(
+            select(func.count(), func.min(OutboxEvent.created_at)).where(OutboxEvent.failed_at.is_(None))
+        )).one()
+        dead = await db.scalar(select(func.count()).where(OutboxEvent.failed_at.is_not(None)))
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {'pending': pending, 'dead': dead, 'lag_seconds': round(lag, 3)}
+
+
+async def worker_stats() -> list[dict]:
+    keys = [key async for key in redis_client.scan_iter(match=worker_key('*'))]
+    return [json.loads(raw) for raw in await redis_client.mget(keys) if raw] if keys else []
+
+
+def new_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+async def drain_forever(stats: OutboxStats, batch_size: int = OUTBOX_BATCH_SIZE):
+    while True:
+        try:
+            claimed = await drain_batch(stats, batch_size)
+        except Exception:
+            logger.exception('Outbox batch failed')
+            claimed = 0
+        # A full batch means there is likely more waiting, so go straight back for it.
+        if claimed < batch_size:
+            await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+
+async def report_forever(stats: OutboxStats):
+    while True:
+        await stats.publish()
+        await asyncio.sleep(OUTBOX_REPORT_SECONDS)
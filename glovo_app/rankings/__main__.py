@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+import sys
+
+from glovo_app.cache.client import redis_client
+from glovo_app.db.database import engine
+from glovo_app.rankings.leaderboard import rebuild_demand, refresh_leaderboards
+
+
+async def main(args):
+    try:
+        if args.rebuild_demand:
+            print(f'demand: {await rebuild_demand()} products', file=sys.stderr)
+        print(f'leaderboards: {await refresh_leaderboards()} categories', file=sys.stderr)
+    finally:
+        await redis_client.close()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.rankings',
+                                     description='Refresh the store and product leaderboards.')
+    parser.add_argument('--rebuild-demand', action='store_true',
+                        help='reseed decayed demand from the database before refreshing')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import (RANKING_EPOCH, RANKING_HALF_LIFE_HOURS, RANKING_REBASE_HOURS, RANKING_REFRESH_SECONDS,
+                              RANKING_RATING_WEIGHT, RANKING_PRIOR_REVIEWS, RANKING_PRIOR_RATING, STREAM_CHUNK_SIZE)
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Store, StoreRating, Product, Order, OrderItem
+
+
+logger = logging.getLogger(__name__)
+
+# Demand weights are relative to an epoch kept in Redis; RANKING_EPOCH is only the first one.
+EPOCH = datetime.fromisoformat(RANKING_EPOCH).timestamp()
+HALF_LIFE = RANKING_HALF_LIFE_HOURS * 3600
+REBASE_SECONDS = int(RANKING_REBASE_HOURS * 3600)
+LEADERBOARD_TTL = int(RANKING_REFRESH_SECONDS * 3)
+
+STORE_DEMAND_KEY = 'rank:demand:store'
+DEMAND_EPOCH_KEY = 'rank:demand:epoch'
+# Every per-store product demand set, so a rebase can rescale them all in one script.
+PRODUCT_DEMAND_KEYS = 'rank:demand:product_keys'
+# Outlives every outbox retry of an order.created event, so a redelivery is never counted twice.
+DEMAND_RECORDED_TTL = 7 * 24 * 3600
+
+# KEYS: the once-per-order marker, the epoch, the product set registry, the store demand set,
+# then the product demand set of each item.
+# ARGV: the marker TTL, the default epoch, the event time, the half-life, then a
+# (store_id, product_id, quantity) triple per item.
+RECORD_ONCE = """
+if not redis.call('set', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+local epoch = tonumber(redis.call('get', KEYS[2]) or ARGV[2])
+local weight = 2 ^ ((tonumber(ARGV[3]) - epoch) / tonumber(ARGV[4]))
+for i = 5, #KEYS do
+    local n = 5 + 3 * (i - 5)
+    local amount = tonumber(ARGV[n + 2]) * weight
+    redis.call('zincrby', KEYS[4], amount, ARGV[n])
+    redis.call('zincrby', KEYS[i], amount, ARGV[n + 1])
+    redis.call('sadd', KEYS[3], KEYS[i])
+end
+return 1
+"""
+
+# KEYS: the epoch, the store demand set, the product set registry.
+# ARGV: the default epoch, now, the rebase interval, the half-life.
+# Scales every demand set by the weight of the old epoch relative to the new one and moves the
+# epoch to now, all at once, so no increment lands between the two. Returns the epoch in force.
+REBASE = """
+local epoch = tonumber(redis.call('get', KEYS[1]) or ARGV[1])
+local now = tonumber(ARGV[2])
+if now - epoch < tonumber(ARGV[3]) then
+    return tostring(epoch)
+end
+local factor = 2 ^ ((epoch - now) / tonumber(ARGV[4]))
+local keys = redis.call('smembers', KEYS[3])
+table.insert(keys, KEYS[2])
+for _, key in ipairs(keys) do
+    redis.call('zunionstore', key, 1, key, 'weights', factor)
+end
+redis.call('set', KEYS[1], ARGV[2])
+return ARGV[2]
+"""
+
+
+def product_demand_key(store_id: int) -> str:
+    return f'rank:demand:product:{store_id}'
+
+
+def demand_recorded_key(order_id: int) -> str:
+    return f'rank:demand:recorded:{order_id}'
+
+
+def category_rating_key(category_id: int) -> str:
+    return f'rank:rating:category:{category_id}'
+
+
+def category_top_key(category_id: int) -> str:
+    return f'rank:top:category:{category_id}'
+
+
+def decay_weight(epoch: float, at: float | None = None) -> float:
+    """Forward-decay weight of an event at ``at``.
+
+    Demand is added with weights that grow over time instead of decaying every stored score,
+    so ordering is time-decayed while each event stays one ZINCRBY. Dividing by the weight
+    of "now" turns a stored score back into decayed event counts. The weights double every
+    half-life, so ``rebase_demand`` moves the epoch forward before they get large.
+    """
+    return 2 ** (((time.time() if at is None else at) - epoch) / HALF_LIFE)
+
+
+async def rebase_demand() -> float:
+    """Move the demand epoch to now once it is RANKING_REBASE_HOURS old; returns the epoch in force."""
+    return float(await redis_client.eval(REBASE, 3, DEMAND_EPOCH_KEY, STORE_DEMAND_KEY, PRODUCT_DEMAND_KEYS,
+                                         EPOCH, int(time.time()), REBASE_SECONDS, HALF_LIFE))
+
+
+async def record_demand(order_id: int, items, at: float | None = None) -> bool:
+    """Add the ordered ``(store_id, product_id, quantity)`` items of ``order_id`` to the demand sets.
+
+    Recording is once per order: the marker and the increments are applied atomically in one
+    script, so a redelivered event changes nothing. Returns False when the order was already
+    counted. Redis errors propagate so the caller can retry.
+    """
+    keys = [demand_recorded_key(order_id), DEMAND_EPOCH_KEY, PRODUCT_DEMAND_KEYS, STORE_DEMAND_KEY]
+    args = [DEMAND_RECORDED_TTL, EPOCH, time.time() if at is None else at, HALF_LIFE]
+    for store_id, product_id, quantity in items:
+        keys.append(product_demand_key(store_id))
+        args += [store_id, product_id, quantity]
+    return bool(await redis_client.eval(RECORD_ONCE, len(keys), *keys, *args))
+
+
+def bayesian_rating(review_count: int | None, rating_sum) -> float:
+    review_count = review_count or 0
+    total = float(rating_sum or 0) + RANKING_PRIOR_REVIEWS * RANKING_PRIOR_RATING
+    return total / (review_count + RANKING_PRIOR_REVIEWS)
+
+
+async def refresh_leaderboards():
+    """Rebuild the per-category store leaderboards from ratings and the decayed demand set."""
+    async with SessionLocal(info={'read_only': True}) as db:
+        rows = (await db.execute(
+            select(Store.id, Store.category_id, StoreRating.review_count, StoreRating.rating_sum)
+            .outerjoin(StoreRating, StoreRating.store_id == Store.id)
+        )).all()
+
+    ratings = defaultdict(dict)
+    for store_id, category_id, review_count, rating_sum in rows:
+        ratings[category_id][store_id] = bayesian_rating(review_count, rating_sum)
+
+    demand_scale = 1 / decay_weight(await rebase_demand())
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for category_id, scores in ratings.items():
+            rating_key, top_key = category_rating_key(category_id), category_top_key(category_id)
+            pipe.delete(rating_key)
+            pipe.zadd(rating_key, scores)
+            pipe.zunionstore(top_key, {rating_key: RANKING_RATING_WEIGHT, STORE_DEMAND_KEY: demand_scale})
+            # Keep only stores of this category: the demand set spans every store.
+            pipe.zinterstore(top_key, {top_key: 1, rating_key: 0})
+            pipe.expire(rating_key, LEADERBOARD_TTL)
+            pipe.expire(top_key, LEADERBOARD_TTL)
+        await pipe.execute()
+    return len(ratings)
+
+
+async def rebuild_demand():
+    """Recompute decayed demand from every order item, weighting each by its order date.
+
+    The weights are relative to a fresh epoch of now, written together with the scores.
+    """
+    epoch = int(time.time())
+    stores, products = defaultdict(float), defaultdict(lambda: defaultdict(float))
+    async with SessionLocal(info={'read_only': True}) as db:
+        result = await db.stream(
+            select(Product.store_id, OrderItem.product_id, OrderItem.quantity, Order.created_date)
+            .select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .execution_options(yield_per=STREAM_CHUNK_SIZE)
+        )
+        async for store_id, product_id, quantity, created_date in result:
+            at = created_date.replace(tzinfo=timezone.utc).timestamp() if created_date else None
+            score = quantity * decay_weight(epoch, at)
+            stores[store_id] += score
+            products[store_id][product_id] += score
+
+    stale = [key async for key in redis_client.scan_iter(match=product_demand_key('*'))]
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(STORE_DEMAND_KEY, PRODUCT_DEMAND_KEYS, *stale)
+        if stores:
+            pipe.zadd(STORE_DEMAND_KEY, stores)
+        for store_id, scores in products.items():
+            pipe.zadd(product_demand_key(store_id), scores)
+            pipe.sadd(PRODUCT_DEMAND_KEYS, product_demand_key(store_id))
+        pipe.set(DEMAND_EPOCH_KEY, epoch)
+        await pipe.execute()
+    return sum(len(scores) for scores in products.values())
+
+
+async def top_ids(key: str, limit: int, offset: int = 0) -> list[int]:
+    return [int(member) for member in await redis_client.zrevrange(key, offset, offset + limit - 1)]
+
+
+async def top_stores(category_id: int, limit: int, offset: int = 0) -> list[int]:
+    return await top_ids(category_top_key(category_id), limit, offset)
+
+
+async def top_products(store_id: int, limit: int, offset: int = 0) -> list[int]:
+    return await top_ids(product_demand_key(store_id), limit, offset)
+
+
+async def refresh_forever():
+    while True:
+        try:
+            await refresh_leaderboards()
+        except Exception:
+            logger.exception('Leaderboard refresh failed')
+        await asyncio.sleep(RANKING_REFRESH_SECONDS)
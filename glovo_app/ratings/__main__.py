@@ -0,0 +1,20 @@
+import asyncio
+import sys
+
+from glovo_app.db.database import SessionLocal, engine
+from glovo_app.ratings.aggregates import AGGREGATES, rebuild
+
+
+async def main():
+    try:
+        async with SessionLocal() as db:
+            for aggregate in AGGREGATES:
+                rows = await rebuild(db, aggregate)
+                print(f'{aggregate.__tablename__}: {rows} rows', file=sys.stderr)
+            await db.commit()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.db.bulk import DIALECT_INSERTS
+from glovo_app.db.models import StoreRating, CourierRating, StoreReview, CourierReview
+
+
+STARS = range(1, 6)
+
+# aggregate model -> (review model, review column the aggregate is keyed on, aggregate key column)
+AGGREGATES = {
+    StoreRating: (StoreReview, StoreReview.store, 'store_id'),
+    CourierRating: (CourierReview, CourierReview.courier, 'courier_id'),
+}
+
+
+def star(rating) -> int:
+    """Histogram bucket of a rating; matches ``star_expression`` so rebuilds agree with increments."""
+    for bucket in range(1, 5):
+        if rating < bucket + 0.5:
+            return bucket
+    return 5
+
+
+def star_expression(rating):
+    return case(*((rating < bucket + 0.5, bucket) for bucket in range(1, 5)), else_=5)
+
+
+async def apply_rating(db: AsyncSession, aggregate, target_id: int, rating, sign: int = 1):
+    """Add (or with ``sign=-1`` remove) one review in the caller's transaction with a single upsert."""
+    _, _, key = AGGREGATES[aggregate]
+    bucket = star(rating)
+    values = {key: target_id, 'review_count': sign, 'rating_sum': rating * sign}
+    values.update({f'rating_{s}': sign if s == bucket else 0 for s in STARS})
+
+    insert = DIALECT_INSERTS[db.get_bind().dialect.name]
+    stmt = insert(aggregate).values(values)
+    table = aggregate.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={name: table.c[name] + stmt.excluded[name] for name in values if name != key},
+    )
+    await db.execute(stmt)
+
+
+async def move_rating(db: AsyncSession, aggregate, old_target: int, old_rating, new_target: int, new_rating):
+    if (old_target, old_rating) == (new_target, new_rating):
+        return
+    await apply_rating(db, aggregate, old_target, old_rating, -1)
+    await apply_rating(db, aggregate, new_target, new_rating)
+
+
+async def rebuild(db: AsyncSession, aggregate) -> int:
+    """Recompute every row of ``aggregate`` from the review table."""
+    review, target, key = AGGREGATES[aggregate]
+    bucket = star_expression(review.rating)
+    columns = [key, 'review_count', 'rating_sum', *(f'rating_{s}' for s in STARS)]
+    totals = select(
+        target,
+        func.count(),
+        func.coalesce(func.sum(review.rating), 0),
+        *(func.sum(case((bucket == s, 1), else_=0)) for s in STARS),
+    ).where(target.is_not(None)).group_by(target)
+
+    await db.execute(delete(aggregate))
+    result = await db.execute(aggregate.__table__.insert().from_select(columns, totals))
+    return result.rowcount
@@ -0,0 +1,169 @@
+import math
+import re
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import select, func, literal, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.db.models import Product, Store
+
+
+SEARCH_FIELDS = {
+    Product: (Product.product_name, Product.description),
+    Store: (Store.store_name, Store.description),
+}
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str | None) -> list[str]:
+    return WORD.findall((text or '').lower())
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+async def fetch_ordered(db: AsyncSession, model, ids: list[int]):
+    if not ids:
+        return []
+    rows = {row.id: row for row in (await db.scalars(select(model).where(model.id.in_(ids)))).all()}
+    return [rows[i] for i in ids if i in rows]
+
+
+class SearchBackend(ABC):
+    @abstractmethod
+    async def search(self, db: AsyncSession, model, query: str, limit: int, offset: int = 0):
+        ...
+
+    async def index(self, obj):
+        pass
+
+    async def remove(self, model, obj_id: int):
+        pass
+
+
+def search_document(model):
+    # Rendered with inline constants so the planner matches the GIN expression indexes
+    # created in the search_indexes migration.
+    name, description = SEARCH_FIELDS[model]
+    empty, space = literal_column("''"), literal_column("' '")
+    return func.to_tsvector(literal_column("'simple'"),
+                            func.coalesce(name, empty).concat(space).concat(func.coalesce(description, empty)))
+
+
+class PostgresSearchBackend(SearchBackend):
+    async def search(self, db: AsyncSession, model, query: str, limit: int, offset: int = 0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        name = SEARCH_FIELDS[model][0]
+        document = search_document(model)
+        ts_query = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        rank = func.ts_rank_cd(document, ts_query) + func.similarity(name, literal(query))
+        stmt = (
+            select(model)
+            .where(or_(document.op('@@')(ts_query), name.op('%')(query)))
+            .order_by(rank.desc(), model.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        return (await db.scalars(stmt)).all()
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self.documents: dict[int, set[str]] = {}
+        self.grams: dict[str, set[str]] = defaultdict(set)
+        self.vocabulary: list[str] = []
+
+    def add(self, doc_id: int, name: str | None, description: str | None):
+        self.discard(doc_id)
+        weights: dict[str, float] = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += 2.0
+        for token in tokenize(description):
+            weights[token] += 1.0
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.vocabulary.insert(bisect_left(self.vocabulary, token), token)
+                for gram in trigrams(token):
+                    self.grams[gram].add(token)
+            self.postings[token][doc_id] = weight
+        self.documents[doc_id] = set(weights)
+
+    def discard(self, doc_id: int):
+        for token in self.documents.pop(doc_id, ()):
+            docs = self.postings[token]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[token]
+                self.vocabulary.pop(bisect_left(self.vocabulary, token))
+                for gram in trigrams(token):
+                    self.grams[gram].discard(token)
+
+    def expand(self, term: str) -> dict[str, float]:
+        matches = {term: 1.0} if term in self.postings else {}
+        start = bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + 50]:
+            if not token.startswith(term):
+                break
+            matches.setdefault(token, 0.8)
+        if not matches and len(term) > 2:
+            term_grams = trigrams(term)
+            candidates = set().union(*(self.grams.get(g, ()) for g in term_grams))
+            for token in candidates:
+                token_grams = trigrams(token)
+                score = len(term_grams & token_grams) / len(term_grams | token_grams)
+                if score >= 0.3:
+                    matches[token] = 0.6 * score
+        return matches
+
+    def search(self, query: str) -> list[int]:
+        scores: dict[int, float] = defaultdict(float)
+        hits: dict[int, int] = defaultdict(int)
+        terms = tokenize(query)
+        for term in terms:
+            matched = set()
+            for token, closeness in self.expand(term).items():
+                docs = self.postings[token]
+                idf = math.log(1 + len(self.documents) / len(docs))
+                for doc_id, weight in docs.items():
+                    scores[doc_id] += closeness * weight * idf
+                    matched.add(doc_id)
+            for doc_id in matched:
+                hits[doc_id] += 1
+        ranked = [doc_id for doc_id in scores if hits[doc_id] == len(terms)]
+        return sorted(ranked, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+class MemorySearchBackend(SearchBackend):
+    def __init__(self):
+        self.indexes: dict[type, InvertedIndex] = {}
+
+    async def load(self, db: AsyncSession, model):
+        index = InvertedIndex()
+        name, description = SEARCH_FIELDS[model]
+        for doc_id, name_value, description_value in (await db.execute(select(model.id, name, description))).all():
+            index.add(doc_id, name_value, description_value)
+        self.indexes[model] = index
+        return index
+
+    async def search(self, db: AsyncSession, model, query: str, limit: int, offset: int = 0):
+        index = self.indexes.get(model) or await self.load(db, model)
+        return await fetch_ordered(db, model, index.search(query)[offset:offset + limit])
+
+    async def index(self, obj):
+        index = self.indexes.get(type(obj))
+        if index is not None:
+            name, description = SEARCH_FIELDS[type(obj)]
+            index.add(obj.id, getattr(obj, name.key), getattr(obj, description.key))
+
+    async def remove(self, model, obj_id: int):
+        index = self.indexes.get(model)
+        if index is not None:
+            index.discard(obj_id)
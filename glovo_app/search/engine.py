@@ -0,0 +1,16 @@
+from glovo_app.config import SEARCH_BACKEND
+from glovo_app.db.database import engine
+from glovo_app.search.backends import PostgresSearchBackend, MemorySearchBackend
+
+
+def make_search_backend(name: str = SEARCH_BACKEND):
+    if name == 'auto':
+        name = 'postgres' if engine.dialect.name == 'postgresql' else 'memory'
+    if name == 'postgres':
+        return PostgresSearchBackend()
+    if name == 'memory':
+        return MemorySearchBackend()
+    raise ValueError(f'Unknown search backend: {name}')
+
+
+search_backend = make_search_backend()
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from fastapi import Depends, FastAPI, HTTPException
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+from glovo_app.db.models import RoleChoices
+from glovo_app.security.current_user import Principal, get_current_user, is_revoked, principal_cache
+from glovo_app.security.passwords import PasswordHasher, password_context
+from glovo_app.security.tokens import create_access_token, decode_token
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+async def loop_lag(interval: float, lags: list[float], stop: asyncio.Event):
+    """How late a timer that every other request on the worker depends on fires."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def login_run(verify, hashed: str, args) -> dict:
+    latencies, rejected, remaining = [], 0, args.logins
+    lags, stop = [], asyncio.Event()
+
+    async def client():
+        nonlocal rejected, remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                valid, _ = await verify(args.password, hashed)
+            except HTTPException:
+                rejected += 1
+                continue
+            assert valid
+            latencies.append(time.perf_counter() - started)
+
+    probe = asyncio.create_task(loop_lag(args.probe_interval, lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return {'logins_per_second': len(latencies) / elapsed, 'rejected': rejected,
+            'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99),
+            'loop_lag_p99': percentile(lags, 0.99), 'loop_lag_max': max(lags, default=0.0)}
+
+
+async def login_benchmark(args):
+    """Verify passwords from ``--concurrency`` concurrent clients, bcrypt run inline and through the executor.
+
+    Besides throughput and login latency it reports how late a timer on the same event loop
+    fires, which is the stall every unrelated request on the worker sees during a login burst.
+    """
+    hashed = password_context.hash(args.password)
+
+    async def inline(password, hashed_password):
+        return password_context.verify_and_update(password, hashed_password)
+
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.max_pending)
+    variants = {'inline': inline, 'executor': hasher.verify_and_update}
+    try:
+        results = {name: [] for name in variants}
+        for _ in range(args.rounds):
+            for name, verify in variants.items():
+                results[name].append(await login_run(verify, hashed, args))
+    finally:
+        hasher.shutdown()
+
+    print(f'{args.logins} logins x {args.rounds} rounds, {args.concurrency} concurrent clients, '
+          f'{BCRYPT_ROUNDS} bcrypt rounds, {args.workers} hash workers', file=sys.stderr)
+    for name, runs in results.items():
+        median = {field: statistics.median(run[field] for run in runs) for field in runs[0]}
+        print(f'{name:>9}: {median["logins_per_second"]:7.1f} logins/s, '
+              f'p50 {median["p50"] * 1000:7.1f} ms, p99 {median["p99"] * 1000:7.1f} ms, '
+              f'loop lag p99 {median["loop_lag_p99"] * 1000:7.1f} ms, max {median["loop_lag_max"] * 1000:7.1f} ms, '
+              f'rejected {median["rejected"]:.0f}', file=sys.stderr)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/open')
+    async def open_route():
+        return {'ok': True}
+
+    @app.get('/me')
+    async def me(current_user: Principal = Depends(get_current_user)):
+        return {'ok': True}
+
+    return app
+
+
+async def call(app, path: str, token: str):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'authorization', f'Bearer {token}'.encode())],
+        'server': ('bench', 80), 'client': ('bench', 1),
+    }
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await app(scope, receive, send)
+    assert statuses == [200], statuses
+
+
+async def per_call(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    return (time.perf_counter() - started) / calls
+
+
+async def current_user_benchmark(args):
+    """Time a route with and without ``get_current_user``, and the parts of the dependency on their own.
+
+    The principal is cached up front, as it is for all but the first request of a token in each
+    PRINCIPAL_CACHE_SECONDS, so no SQL runs; the denylist check is a Redis round trip.
+    """
+    app = build_app()
+    principal = Principal(id=1, username=args.username, role=RoleChoices.client, token_version=0)
+    principal_cache.set((principal.username, principal.token_version), principal)
+    token = create_access_token({'sub': principal.username, 'ver': principal.token_version})
+    claims = decode_token(token)
+
+    async def decode():
+        decode_token(token)
+
+    async def denylist():
+        await is_revoked(claims)
+
+    variants = {
+        'no auth': lambda: call(app, '/open', token),
+        'get_current_user': lambda: call(app, '/me', token),
+        'decode_token': decode,
+        'denylist check': denylist,
+    }
+    try:
+        for fn in variants.values():
+            await per_call(fn, args.warmup)
+        samples = {name: [] for name in variants}
+        for _ in range(args.rounds):
+            for name, fn in variants.items():
+                samples[name].append(await per_call(fn, args.requests))
+    finally:
+        await redis_client.close()
+
+    baseline = statistics.median(samples['no auth'])
+    print(f'{args.requests} requests x {args.rounds} rounds', file=sys.stderr)
+    for name, values in samples.items():
+        median = statistics.median(values)
+        overhead = f', overhead {(median - baseline) * 1e6:+7.1f} us' if name == 'get_current_user' else ''
+        print(f'{name:>17}: {median * 1e6:8.1f} us{overhead}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.security', description='Auth benchmarks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    login = commands.add_parser('login', help='password verification throughput under concurrent logins')
+    login.add_argument('--logins', type=int, default=200, help='logins per variant in each round')
+    login.add_argument('--concurrency', type=int, default=32)
+    login.add_argument('--workers', type=int, default=PASSWORD_HASH_WORKERS)
+    login.add_argument('--max-pending', type=int, default=PASSWORD_HASH_MAX_PENDING)
+    login.add_argument('--rounds', type=int, default=3)
+    login.add_argument('--probe-interval', type=float, default=0.005, help='seconds between loop lag probes')
+    login.add_argument('--password', default='benchmark-password')
+
+    current = commands.add_parser('current-user', help='per-request cost of the get_current_user dependency')
+    current.add_argument('--requests', type=int, default=2000, help='calls per variant in each round')
+    current.add_argument('--rounds', type=int, default=5)
+    current.add_argument('--warmup', type=int, default=200)
+    current.add_argument('--username', default='benchmark-user')
+
+    args = parser.parse_args()
+    if args.command == 'login':
+        asyncio.run(login_benchmark(args))
+    else:
+        asyncio.run(current_user_benchmark(args))
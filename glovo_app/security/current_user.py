@@ -0,0 +1,93 @@
+import logging
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.memory import TTLCache
+from glovo_app.config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_SECONDS, REFRESH_TOKEN_EXPIRE_DAYS
+from glovo_app.db.database import SessionLocal, get_read_db
+from glovo_app.db.models import UserProfile, RoleChoices
+from glovo_app.security.tokens import oauth2_schema, decode_token, unauthorized
+
+
+logger = logging.getLogger(__name__)
+
+
+class Principal(BaseModel):
+    id: int
+    username: str
+    role: RoleChoices
+    token_version: int
+
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_SECONDS)
+
+
+def denylist_key(jti: str) -> str:
+    return f'auth:denylist:{jti}'
+
+
+def min_version_key(sub: str) -> str:
+    return f'auth:min_version:{sub}'
+
+
+async def revoke_token(claims: dict):
+    ttl = int(claims['exp'] - time.time())
+    if ttl > 0:
+        await redis_client.set(denylist_key(claims['jti']), 1, ex=ttl)
+
+
+async def revoke_all_tokens(username: str, token_version: int):
+    await redis_client.set(min_version_key(username), token_version, ex=REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    principal_cache.delete((username, token_version - 1))
+
+
+async def is_revoked(claims: dict) -> bool:
+    try:
+        denied, min_version = await redis_client.mget(denylist_key(claims['jti']), min_version_key(claims['sub']))
+    except RedisError:
+        logger.error('Token denylist unavailable', exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Auth temporarily unavailable')
+    return denied is not None or (min_version is not None and claims.get('ver', 0) < int(min_version))
+
+
+async def get_current_user(token: str = Depends(oauth2_schema),
+                           db: AsyncSession = Depends(get_read_db)) -> Principal:
+    claims = decode_token(token)
+    if await is_revoked(claims):
+        raise unauthorized()
+
+    cache_key = (claims['sub'], claims.get('ver', 0))
+    principal = principal_cache.get(cache_key)
+    if principal is None:
+        user = await db.scalar(select(UserProfile).where(UserProfile.username == claims['sub']))
+        if user is None or user.token_version != cache_key[1]:
+            raise unauthorized()
+        principal = Principal(id=user.id, username=user.username, role=user.role,
+                              token_version=user.token_version)
+        principal_cache.set(cache_key, principal)
+    return principal
+
+
+async def get_websocket_user(websocket: WebSocket, token: Optional[str] = None) -> Principal:
+    """Authenticate a WebSocket handshake from its Authorization header or a ``?token=`` parameter.
+
+    Browsers cannot set headers on WebSocket handshakes, hence the query parameter. The session
+    is closed before returning so a long-lived connection does not pin a pooled connection.
+    """
+    scheme, _, credentials = websocket.headers.get('authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and credentials:
+        token = credentials
+    if not token:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason='Not authenticated')
+    try:
+        async with SessionLocal(info={'read_only': True}) as db:
+            return await get_current_user(token, db)
+    except HTTPException as exc:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc.detail))
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from glovo_app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+from glovo_app.db.pool_metrics import Histogram
+
+
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# min/max pin the cost so verify_and_update flags hashes made with any other rounds value.
+password_context = CryptContext(schemes=['bcrypt'], deprecated='auto',
+                                bcrypt__default_rounds=BCRYPT_ROUNDS,
+                                bcrypt__min_rounds=BCRYPT_ROUNDS,
+                                bcrypt__max_rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.queue_wait = Histogram(HASH_BUCKETS)
+        self.duration = Histogram(HASH_BUCKETS)
+        self.workers = workers
+        self._executor = None
+
+    def _timed(self, submitted: float, fn, *args):
+        started = time.perf_counter()
+        self.queue_wait.observe(started - submitted)
+        try:
+            return fn(*args)
+        finally:
+            self.duration.observe(time.perf_counter() - started)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Server busy, try again')
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, time.perf_counter(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(password_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        valid, new_hash = await self._run(password_context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def snapshot(self):
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+            'duration_seconds': self.duration.snapshot(),
+        }
+
+    def shutdown(self):
+        # The hasher is a module singleton, so a restarted app starts a fresh pool on its first login.
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import (REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKEN_BACKEND, REFRESH_TOKEN_PURGE_SECONDS,
+                              REFRESH_TOKEN_PURGE_BATCH)
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import RefreshToken
+
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_TTL = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RefreshTokenStore(ABC):
+    @abstractmethod
+    async def save(self, db: AsyncSession, token: str, user_id: int):
+        ...
+
+    @abstractmethod
+    async def consume(self, db: AsyncSession, token: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    async def revoke_user(self, db: AsyncSession, user_id: int):
+        ...
+
+
+class RedisRefreshTokenStore(RefreshTokenStore):
+    ttl = int(REFRESH_TOKEN_TTL.total_seconds())
+
+    @staticmethod
+    def token_key(token_hash: str) -> str:
+        return f'refresh:{token_hash}'
+
+    @staticmethod
+    def user_key(user_id: int) -> str:
+        return f'refresh:user:{user_id}'
+
+    async def save(self, db: AsyncSession, token: str, user_id: int):
+        token_hash = hash_token(token)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(self.token_key(token_hash), user_id, ex=self.ttl)
+            pipe.sadd(self.user_key(user_id), token_hash)
+            pipe.expire(self.user_key(user_id), self.ttl)
+            await pipe.execute()
+
+    async def consume(self, db: AsyncSession, token: str) -> Optional[int]:
+        token_hash = hash_token(token)
+        user_id = await redis_client.getdel(self.token_key(token_hash))
+        if user_id is None:
+            return None
+        await redis_client.srem(self.user_key(int(user_id)), token_hash)
+        return int(user_id)
+
+    async def revoke_user(self, db: AsyncSession, user_id: int):
+        token_hashes = await redis_client.smembers(self.user_key(user_id))
+        await redis_client.delete(self.user_key(user_id), *(self.token_key(h) for h in token_hashes))
+
+
+class SqlRefreshTokenStore(RefreshTokenStore):
+    async def save(self, db: AsyncSession, token: str, user_id: int):
+        db.add(RefreshToken(token_hash=hash_token(token), user_id=user_id,
+                            expires_at=datetime.utcnow() + REFRESH_TOKEN_TTL))
+        await db.flush()
+
+    async def consume(self, db: AsyncSession, token: str) -> Optional[int]:
+        return await db.scalar(
+            delete(RefreshToken)
+            .where(RefreshToken.token_hash == hash_token(token), RefreshToken.expires_at > datetime.utcnow())
+            .returning(RefreshToken.user_id)
+        )
+
+    async def revoke_user(self, db: AsyncSession, user_id: int):
+        await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+
+    async def purge_expired(self, batch_size: int = REFRESH_TOKEN_PURGE_BATCH) -> int:
+        purged = 0
+        while True:
+            async with SessionLocal() as db:
+                expired = (select(RefreshToken.id).where(RefreshToken.expires_at <= datetime.utcnow())
+                           .limit(batch_size).scalar_subquery())
+                result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired)))
+                await db.commit()
+            purged += result.rowcount
+            if result.rowcount < batch_size:
+                return purged
+            await asyncio.sleep(0)
+
+    async def purge_forever(self):
+        while True:
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    logger.info('Purged %s expired refresh tokens', purged)
+            except Exception:
+                logger.exception('Refresh token purge failed')
+            await asyncio.sleep(REFRESH_TOKEN_PURGE_SECONDS)
+
+
+def make_refresh_token_store(name: str = REFRESH_TOKEN_BACKEND) -> RefreshTokenStore:
+    if name == 'redis':
+        return RedisRefreshTokenStore()
+    if name == 'sql':
+        return SqlRefreshTokenStore()
+    raise ValueError(f'Unknown refresh token backend: {name}')
+
+
+refresh_token_store = make_refresh_token_store()
@@ -0,0 +1,48 @@
+import uuid
+from datetime import timedelta, datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt, JWTError
+
+from glovo_app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM
+
+
+oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login')
+optional_oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login', auto_error=False)
+
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, typ: str = ACCESS):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({'exp': expire, 'jti': uuid.uuid4().hex, 'typ': typ})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_refresh_token(data: dict):
+    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), typ=REFRESH)
+
+
+def token_claims(user) -> dict:
+    return {'sub': user.username, 'ver': user.token_version}
+
+
+def unauthorized():
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес',
+                         headers={'WWW-Authenticate': 'Bearer'})
+
+
+def decode_token(token: str, typ: str = ACCESS) -> dict:
+    """Claims of a valid token of type ``typ``; a refresh token is never accepted as a bearer credential."""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise unauthorized()
+    if 'sub' not in claims or 'jti' not in claims or claims.get('typ') != typ:
+        raise unauthorized()
+    return claims
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+import websockets
+
+from glovo_app.db.models import StatusChoices
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+class Counters:
+    def __init__(self):
+        self.connected = 0
+        self.events = 0
+        self.heartbeats = 0
+        self.latencies = []
+
+    def record(self, event: dict, live: bool):
+        if event['type'] == 'heartbeat':
+            self.heartbeats += 1
+        elif event['type'] == 'order' and live:
+            self.events += 1
+            self.latencies.append(time.time() - event['at'])
+
+
+async def websocket_subscriber(args, client, order_id: int, counters: Counters, ready: asyncio.Event):
+    url = args.base_url.replace('http', 'ws', 1) + f'/track/order/{order_id}/ws'
+    async with websockets.connect(url) as socket:
+        counters.record(json.loads(await socket.recv()), live=False)
+        counters.connected += 1
+        ready.set()
+        async for message in socket:
+            counters.record(json.loads(message), live=True)
+
+
+async def sse_subscriber(args, client, order_id: int, counters: Counters, ready: asyncio.Event):
+    async with client.stream('GET', f'/track/order/{order_id}/events') as response:
+        response.raise_for_status()
+        live = False
+        async for line in response.aiter_lines():
+            if line.startswith(': heartbeat'):
+                counters.record({'type': 'heartbeat'}, live)
+            elif line.startswith('data: '):
+                counters.record(json.loads(line[6:]), live)
+                if not live:
+                    live = True
+                    counters.connected += 1
+                    ready.set()
+
+
+async def publish_updates(args, order_ids: list[int]):
+    statuses = [StatusChoices.str1.value, StatusChoices.str2.value]
+    async with httpx.AsyncClient(base_url=args.base_url) as client:
+        orders = {order_id: (await client.get(f'/order/{order_id}/')).json() for order_id in order_ids}
+        for update in range(args.events):
+            order = orders[random.choice(order_ids)]
+            order['status'] = statuses[(statuses.index(order['status']) + 1) % 2] \
+                if order['status'] in statuses else statuses[0]
+            response = await client.put('/order/update', params={'order_id': order['id']}, json=order)
+            response.raise_for_status()
+            await asyncio.sleep(args.interval)
+
+
+async def load_test(args):
+    """Hold ``--subscribers`` connections on ``--orders`` orders, change their status and time delivery."""
+    order_ids = list(range(args.first_order, args.first_order + args.orders))
+    counters = Counters()
+    subscriber = websocket_subscriber if args.transport == 'ws' else sse_subscriber
+    readies = [asyncio.Event() for _ in range(args.subscribers)]
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=None,
+                                 limits=httpx.Limits(max_connections=None, max_keepalive_connections=None)) as client:
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(args, client, order_ids[index % len(order_ids)], counters, ready))
+                 for index, ready in enumerate(readies)]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(ready.wait() for ready in readies)), args.connect_timeout)
+        except asyncio.TimeoutError:
+            pass
+        print(f'{counters.connected}/{args.subscribers} {args.transport} subscribers connected in '
+              f'{time.perf_counter() - started:.1f} s', file=sys.stderr)
+
+        started = time.perf_counter()
+        await publish_updates(args, order_ids)
+        await asyncio.sleep(args.drain_seconds)
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = [result for result in results
+              if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError)]
+
+    expected = args.events * args.subscribers // len(order_ids)
+    print(f'{args.events} updates in {time.perf_counter() - started:.1f} s, {counters.events} deliveries '
+          f'(~{expected} expected), latency p50 {percentile(counters.latencies, 0.5) * 1000:.1f} ms, '
+          f'p99 {percentile(counters.latencies, 0.99) * 1000:.1f} ms, {counters.heartbeats} heartbeats, '
+          f'{len(failed)} failed', file=sys.stderr)
+    for error in failed[:5]:
+        print(f'subscriber failed: {error!r}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m glovo_app.tracking',
+                                     description='Load test order tracking subscriptions against a running server.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--transport', choices=('ws', 'sse'), default='ws')
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=100, help='subscribers are spread over this many orders')
+    parser.add_argument('--first-order', type=int, default=1)
+    parser.add_argument('--events', type=int, default=200, help='status updates to publish')
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between updates')
+    parser.add_argument('--connect-timeout', type=float, default=60)
+    parser.add_argument('--drain-seconds', type=float, default=2)
+    asyncio.run(load_test(parser.parse_args()))
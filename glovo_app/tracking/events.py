@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from redis.exceptions import RedisError
+
+from glovo_app.cache.client import redis_client
+from glovo_app.config import TRACKING_QUEUE_SIZE, TRACKING_MAX_SUBSCRIBERS
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = 'track:events'
+
+# Delivered to every subscriber when the worker may have missed events, so it resends the current state.
+RESYNC = {'type': 'resync'}
+
+
+def order_topic(order_id: int) -> str:
+    return f'order:{order_id}'
+
+
+def courier_topic(courier_id: int) -> str:
+    return f'courier:{courier_id}'
+
+
+def order_event(order_id: int, status, courier_id: int | None) -> dict:
+    return {
+        'type': 'order',
+        'order_id': order_id,
+        'status': getattr(status, 'value', status),
+        'courier_id': courier_id,
+        'at': time.time(),
+    }
+
+
+async def publish_order_event(order_id: int, status, courier_id: int | None, previous_courier_id: int | None = None):
+    """Announce a new status or courier of an order to subscribers on every worker.
+
+    Call after the change is committed. ``previous_courier_id`` lets a courier who was taken
+    off the order hear about it too.
+    """
+    event = order_event(order_id, status, courier_id)
+    if previous_courier_id is not None and previous_courier_id != courier_id:
+        event['previous_courier_id'] = previous_courier_id
+    try:
+        await redis_client.publish(EVENTS_CHANNEL, json.dumps(event))
+        tracking_stats.published += 1
+    except RedisError:
+        logger.warning('Could not publish event of order %s', order_id, exc_info=True)
+
+
+def event_topics(event: dict) -> list[str]:
+    topics = [order_topic(event['order_id'])]
+    for field in ('courier_id', 'previous_courier_id'):
+        if event.get(field) is not None:
+            topics.append(courier_topic(event[field]))
+    return topics
+
+
+class TrackingStats:
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.subscribers = 0
+        self.peak_subscribers = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+tracking_stats = TrackingStats()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """A bounded queue of events for one client.
+
+    A client that reads slower than events arrive loses the oldest queued events rather than
+    holding up the broker; each event carries the full state of the order, so the newest wins.
+    """
+
+    def __init__(self, topics: list[str]):
+        self.topics = topics
+        self.queue = asyncio.Queue(TRACKING_QUEUE_SIZE)
+
+    def deliver(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            tracking_stats.dropped += 1
+        self.queue.put_nowait(event)
+        tracking_stats.delivered += 1
+
+    async def next(self, timeout: float):
+        """The next event, or None once ``timeout`` passes without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TrackingBroker:
+    """Fans events from the shared Redis channel out to the subscribers connected to this worker."""
+
+    def __init__(self):
+        self.topics = defaultdict(set)
+        self.subscriptions = set()
+
+    def subscribe(self, *topics: str) -> Subscription:
+        if len(self.subscriptions) >= TRACKING_MAX_SUBSCRIBERS:
+            tracking_stats.rejected += 1
+            raise TooManySubscribers()
+        subscription = Subscription(list(topics))
+        self.subscriptions.add(subscription)
+        for topic in topics:
+            self.topics[topic].add(subscription)
+        tracking_stats.subscribers = len(self.subscriptions)
+        tracking_stats.peak_subscribers = max(tracking_stats.peak_subscribers, tracking_stats.subscribers)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self.subscriptions:
+            return
+        self.subscriptions.discard(subscription)
+        for topic in subscription.topics:
+            members = self.topics.get(topic)
+            if members is not None:
+                members.discard(subscription)
+                if not members:
+                    del self.topics[topic]
+        tracking_stats.subscribers = len(self.subscriptions)
+
+    def dispatch(self, event: dict):
+        tracking_stats.received += 1
+        targets = set()
+        for topic in event_topics(event):
+            targets.update(self.topics.get(topic, ()))
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def resync(self):
+        for subscription in self.subscriptions:
+            subscription.deliver(RESYNC)
+
+    async def listen(self):
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                # Events published while we were not subscribed are lost; have every client reload.
+                self.resync()
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.dispatch(json.loads(message['data']))
+            except RedisError:
+                logger.warning('Tracking channel lost, reconnecting', exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+
+tracking_broker = TrackingBroker()
@@ -0,0 +1,37 @@
+"""courier location
+
+Revision ID: 2a6e9c4b7d13
+Revises: 8c1d5f7e2a90
+Create Date: 2026-10-18 15:41:52.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a6e9c4b7d13'
+down_revision: Union[str, None] = '8c1d5f7e2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('courier_location',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('courier_id', sa.Integer(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['courier_id'], ['courier.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_courier_location_courier_recorded', 'courier_location', ['courier_id', 'recorded_at'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_courier_location_courier_recorded', table_name='courier_location')
+    op.drop_table('courier_location')
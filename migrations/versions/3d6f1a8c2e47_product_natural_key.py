@@ -0,0 +1,26 @@
+"""product natural key
+
+Revision ID: 3d6f1a8c2e47
+Revises: 9a7c4e2f1b38
+Create Date: 2026-10-18 12:20:41.604219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d6f1a8c2e47'
+down_revision: Union[str, None] = '9a7c4e2f1b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint('uq_product_store_name', 'product', ['store_id', 'product_name'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_product_store_name', 'product', type_='unique')
@@ -0,0 +1,30 @@
+"""export created_date indexes
+
+Revision ID: 4c8f1a6e2d95
+Revises: 9e2b7c4d1a38
+Create Date: 2026-10-18 18:42:17.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8f1a6e2d95'
+down_revision: Union[str, None] = '9e2b7c4d1a38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_order_created_date_id', 'order', ['created_date', 'id'], unique=False)
+    op.create_index('ix_store_review_created_date_id', 'store_review', ['created_date', 'id'], unique=False)
+    op.create_index('ix_courier_review_created_date_id', 'courier_review', ['created_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_courier_review_created_date_id', table_name='courier_review')
+    op.drop_index('ix_store_review_created_date_id', table_name='store_review')
+    op.drop_index('ix_order_created_date_id', table_name='order')
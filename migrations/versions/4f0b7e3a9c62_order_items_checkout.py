@@ -0,0 +1,45 @@
+"""order items checkout
+
+Revision ID: 4f0b7e3a9c62
+Revises: e5c83a9f4d21
+Create Date: 2026-10-18 14:26:33.845190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f0b7e3a9c62'
+down_revision: Union[str, None] = 'e5c83a9f4d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('order_item',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.DECIMAL(precision=8, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_order_item_order_id'), 'order_item', ['order_id'], unique=False)
+    op.add_column('order', sa.Column('total_price', sa.DECIMAL(precision=10, scale=2), nullable=True))
+    op.add_column('order', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+    op.alter_column('order', 'courier_id', existing_type=sa.Integer(), nullable=True)
+    op.create_unique_constraint('uq_order_client_idempotency_key', 'order', ['client_id', 'idempotency_key'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_order_client_idempotency_key', 'order', type_='unique')
+    op.alter_column('order', 'courier_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_column('order', 'idempotency_key')
+    op.drop_column('order', 'total_price')
+    op.drop_index(op.f('ix_order_item_order_id'), table_name='order_item')
+    op.drop_table('order_item')
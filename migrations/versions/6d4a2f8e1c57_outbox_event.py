@@ -0,0 +1,39 @@
+"""outbox event
+
+Revision ID: 6d4a2f8e1c57
+Revises: 2a6e9c4b7d13
+Create Date: 2026-10-18 16:37:05.662913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d4a2f8e1c57'
+down_revision: Union[str, None] = '2a6e9c4b7d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox_event',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('topic', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_event_pending', 'outbox_event', ['available_at', 'id'], unique=False,
+                    postgresql_where=sa.text('failed_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_event_pending', table_name='outbox_event', postgresql_where=sa.text('failed_at IS NULL'))
+    op.drop_table('outbox_event')
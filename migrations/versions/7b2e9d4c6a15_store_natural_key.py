@@ -0,0 +1,26 @@
+"""store natural key
+
+Revision ID: 7b2e9d4c6a15
+Revises: 3d6f1a8c2e47
+Create Date: 2026-10-18 12:58:09.371642
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e9d4c6a15'
+down_revision: Union[str, None] = '3d6f1a8c2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint('uq_store_owner_name', 'store', ['owner_id', 'store_name'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_store_owner_name', 'store', type_='unique')
@@ -0,0 +1,30 @@
+"""courier dispatch
+
+Revision ID: 8c1d5f7e2a90
+Revises: 4f0b7e3a9c62
+Create Date: 2026-10-18 15:02:11.407368
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d5f7e2a90'
+down_revision: Union[str, None] = '4f0b7e3a9c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('store', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('store', sa.Column('longitude', sa.Float(), nullable=True))
+    op.alter_column('courier', 'current_orders_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    op.alter_column('courier', 'current_orders_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_column('store', 'longitude')
+    op.drop_column('store', 'latitude')
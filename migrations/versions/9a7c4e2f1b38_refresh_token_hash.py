@@ -0,0 +1,44 @@
+"""refresh token hash
+
+Revision ID: 9a7c4e2f1b38
+Revises: 5e8d3b61f0a2
+Create Date: 2026-10-18 11:48:05.117342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a7c4e2f1b38'
+down_revision: Union[str, None] = '5e8d3b61f0a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('refresh_token', sa.Column('token_hash', sa.String(length=64), nullable=True))
+    op.add_column('refresh_token', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE refresh_token SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex'), "
+        "expires_at = created_data + interval '3 days'"
+    )
+    op.alter_column('refresh_token', 'token_hash', nullable=False)
+    op.alter_column('refresh_token', 'expires_at', nullable=False)
+    op.drop_constraint('refresh_token_token_key', 'refresh_token', type_='unique')
+    op.drop_column('refresh_token', 'token')
+    op.create_index(op.f('ix_refresh_token_token_hash'), 'refresh_token', ['token_hash'], unique=True)
+    op.create_index(op.f('ix_refresh_token_expires_at'), 'refresh_token', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    # Plaintext tokens cannot be recovered from their hashes, so existing sessions are dropped.
+    op.execute('DELETE FROM refresh_token')
+    op.drop_index(op.f('ix_refresh_token_expires_at'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_token_hash'), table_name='refresh_token')
+    op.add_column('refresh_token', sa.Column('token', sa.String(), nullable=False))
+    op.create_unique_constraint('refresh_token_token_key', 'refresh_token', ['token'])
+    op.drop_column('refresh_token', 'expires_at')
+    op.drop_column('refresh_token', 'token_hash')
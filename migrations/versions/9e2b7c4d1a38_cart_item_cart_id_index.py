@@ -0,0 +1,26 @@
+"""cart item cart_id index
+
+Revision ID: 9e2b7c4d1a38
+Revises: 6d4a2f8e1c57
+Create Date: 2026-10-18 18:05:41.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e2b7c4d1a38'
+down_revision: Union[str, None] = '6d4a2f8e1c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_cart_item_cart_id'), 'cart_item', ['cart_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_cart_item_cart_id'), table_name='cart_item')
@@ -0,0 +1,39 @@
+"""search indexes
+
+Revision ID: c41f7a2d9e10
+Revises: 254987e9024c
+Create Date: 2026-10-18 10:12:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a2d9e10'
+down_revision: Union[str, None] = '254987e9024c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        "CREATE INDEX ix_product_search ON product USING gin "
+        "(to_tsvector('simple', coalesce(product_name, '') || ' ' || coalesce(description, '')))"
+    )
+    op.execute('CREATE INDEX ix_product_name_trgm ON product USING gin (product_name gin_trgm_ops)')
+    op.execute(
+        "CREATE INDEX ix_store_search ON store USING gin "
+        "(to_tsvector('simple', coalesce(store_name, '') || ' ' || coalesce(description, '')))"
+    )
+    op.execute('CREATE INDEX ix_store_name_trgm ON store USING gin (store_name gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_store_name_trgm', table_name='store')
+    op.drop_index('ix_store_search', table_name='store')
+    op.drop_index('ix_product_name_trgm', table_name='product')
+    op.drop_index('ix_product_search', table_name='product')
@@ -0,0 +1,59 @@
+"""rating aggregates
+
+Revision ID: e5c83a9f4d21
+Revises: 7b2e9d4c6a15
+Create Date: 2026-10-18 13:41:52.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c83a9f4d21'
+down_revision: Union[str, None] = '7b2e9d4c6a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def aggregate_columns():
+    return [
+        sa.Column('review_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rating_sum', sa.DECIMAL(precision=14, scale=4), server_default='0', nullable=False),
+        *(sa.Column(f'rating_{star}', sa.Integer(), server_default='0', nullable=False) for star in range(1, 6)),
+    ]
+
+
+def backfill(table: str, key: str, review_table: str, target: str):
+    bucket = ('CASE WHEN rating < 1.5 THEN 1 WHEN rating < 2.5 THEN 2 WHEN rating < 3.5 THEN 3 '
+              'WHEN rating < 4.5 THEN 4 ELSE 5 END')
+    stars = ', '.join(f'SUM(CASE WHEN {bucket} = {star} THEN 1 ELSE 0 END)' for star in range(1, 6))
+    op.execute(
+        f'INSERT INTO {table} ({key}, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5) '
+        f'SELECT {target}, COUNT(*), COALESCE(SUM(rating), 0), {stars} '
+        f'FROM {review_table} WHERE {target} IS NOT NULL GROUP BY {target}'
+    )
+
+
+def upgrade() -> None:
+    op.create_table('store_rating',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    *aggregate_columns(),
+    sa.ForeignKeyConstraint(['store_id'], ['store.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+    op.create_table('courier_rating',
+    sa.Column('courier_id', sa.Integer(), nullable=False),
+    *aggregate_columns(),
+    sa.ForeignKeyConstraint(['courier_id'], ['userprofile.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('courier_id')
+    )
+    backfill('store_rating', 'store_id', 'store_review', 'store')
+    backfill('courier_rating', 'courier_id', 'courier_review', 'courier')
+
+
+def downgrade() -> None:
+    op.drop_table('courier_rating')
+    op.drop_table('store_rating')
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+
+import fakeredis
+import pytest
+import redis.asyncio
+
+# The app reads its settings at import time, so point it at throwaway stores first.
+DATA_DIR = tempfile.mkdtemp(prefix='glovo-tests-')
+os.environ.setdefault('DB_URL', f'sqlite+aiosqlite:///{DATA_DIR}/glovo.sqlite')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('QUERY_BUDGET_ENFORCE', 'true')
+# Tests run dispatch windows and location flushes themselves rather than racing the background tasks.
+os.environ.setdefault('DISPATCH_WINDOW_SECONDS', '3600')
+os.environ.setdefault('LOCATION_FLUSH_SECONDS', '3600')
+
+# main.py imports its routers as top-level ``api.endpoints``.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'glovo_app'))
+
+fake_redis_server = fakeredis.FakeServer()
+redis.asyncio.Redis.from_url = classmethod(
+    lambda cls, *args, **kwargs: fakeredis.FakeAsyncRedis(server=fake_redis_server, decode_responses=True))
+
+
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    # Postgres always checks them; SQLite only when asked, per connection.
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def foreign_keys():
+    from sqlalchemy import event
+    from glovo_app.db.database import engine
+
+    event.listen(engine.sync_engine, 'connect', enforce_foreign_keys)
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+async def reset_state():
+    from glovo_app.cache.client import redis_client
+    from glovo_app.cache.response import local_cache
+    from glovo_app.db.database import Base, engine
+    from glovo_app.db.routing import replica_set
+    from glovo_app.dispatch.index import courier_index
+    from glovo_app.search.engine import search_backend
+    from glovo_app.security.current_user import principal_cache
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await redis_client.flushall()
+    local_cache.clear()
+    principal_cache.clear()
+    replica_set._last_write.clear()
+    courier_index.clear()
+    getattr(search_backend, 'indexes', {}).clear()
+
+
+@pytest.fixture
+def client():
+    """The app with its lifespan running, on an empty database and an empty Redis."""
+    from fastapi.testclient import TestClient
+    from glovo_app.main import glovo_app
+
+    with TestClient(glovo_app) as client:
+        client.portal.call(reset_state)
+        yield client
+
+
+@pytest.fixture
+def call(client):
+    """Run a coroutine function on the app's event loop, e.g. ``call(refresh_leaderboards)``."""
+    return client.portal.call
+
+
+async def seed_store():
+    from glovo_app.db.database import SessionLocal
+    from glovo_app.db.models import Category, Store, UserProfile
+
+    async with SessionLocal() as db:
+        db.add(UserProfile(id=1, first_name='Owner', last_name='One', username='owner', hashed_password='x',
+                           role='owner'))
+        db.add(Category(id=1, category_name='Food'))
+        await db.flush()
+        db.add(Store(id=1, store_name='Store', store_image='store.png', category_id=1, description='A store',
+                     address='Address', owner_id=1))
+        await db.commit()
+
+
+@pytest.fixture
+def store(client):
+    """Store 1 in category 1, owned by user 1."""
+    client.portal.call(seed_store)
+    return 1
@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+from glovo_app.security.refresh_store import make_refresh_token_store
+
+
+@pytest.fixture(params=['redis', 'sql'])
+def backend(request, client, monkeypatch):
+    monkeypatch.setattr(sys.modules['api.endpoints.auth'], 'refresh_token_store',
+                        make_refresh_token_store(request.param))
+    return request.param
+
+
+@pytest.fixture
+def tokens(client, backend):
+    response = client.post('/auth/register', json={'id': 0, 'first_name': 'Aida', 'last_name': 'Bek',
+                                                   'username': 'aida', 'password': 'secret', 'role': 'client'})
+    assert response.status_code == 200
+    response = client.post('/auth/login', data={'username': 'aida', 'password': 'secret'})
+    assert response.status_code == 200
+    return response.json()
+
+
+def bearer(token: str) -> dict:
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_refresh_rotates_the_refresh_token(client, tokens):
+    response = client.post('/auth/refresh', params={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert client.get('/auth/me', headers=bearer(rotated['access_token'])).json()['username'] == 'aida'
+
+    assert client.post('/auth/refresh', params={'refresh_token': tokens['refresh_token']}).status_code == 401
+    assert client.post('/auth/refresh', params={'refresh_token': rotated['refresh_token']}).status_code == 200
+
+
+def test_access_token_is_not_a_refresh_token(client, tokens):
+    assert client.post('/auth/refresh', params={'refresh_token': tokens['access_token']}).status_code == 401
+
+
+def test_refresh_token_is_not_an_access_token(client, tokens):
+    assert client.get('/auth/me', headers=bearer(tokens['refresh_token'])).status_code == 401
+
+
+def test_logout_denylists_the_access_token(client, tokens):
+    assert client.get('/auth/me', headers=bearer(tokens['access_token'])).status_code == 200
+    response = client.post('/auth/logout', params={'refresh_token': tokens['refresh_token']},
+                           headers=bearer(tokens['access_token']))
+    assert response.status_code == 200
+    assert client.get('/auth/me', headers=bearer(tokens['access_token'])).status_code == 401
+    assert client.post('/auth/refresh', params={'refresh_token': tokens['refresh_token']}).status_code == 401
+
+
+def test_logout_all_revokes_every_token(client, tokens):
+    other = client.post('/auth/refresh', params={'refresh_token': tokens['refresh_token']}).json()
+    assert client.post('/auth/logout_all', headers=bearer(tokens['access_token'])).status_code == 200
+    assert client.get('/auth/me', headers=bearer(other['access_token'])).status_code == 401
+    assert client.post('/auth/refresh', params={'refresh_token': other['refresh_token']}).status_code == 401
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+from sqlalchemy import select, update
+
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Courier, Order, OrderItem, Product, Store, TypeChoices, UserProfile
+from glovo_app.dispatch.geo import GridIndex, haversine
+from glovo_app.dispatch.index import courier_index, update_position, set_availability
+from glovo_app.dispatch.matching import ASSIGNED, COURIER_TAKEN, ORDER_TAKEN, assign, dispatch_window
+
+
+STORE = (42.87, 74.59)
+
+
+@pytest.mark.parametrize('max_distance', [None, 2000])
+def test_grid_nearest_matches_brute_force(max_distance):
+    rng = random.Random(7)
+    points = {i: (STORE[0] + rng.uniform(-0.1, 0.1), STORE[1] + rng.uniform(-0.1, 0.1)) for i in range(2000)}
+    index = GridIndex(0.005)
+    for point_id, (lat, lon) in points.items():
+        index.upsert(point_id, lat, lon)
+    for point_id in range(0, 2000, 3):
+        index.remove(point_id)
+        del points[point_id]
+
+    for _ in range(50):
+        lat, lon = STORE[0] + rng.uniform(-0.12, 0.12), STORE[1] + rng.uniform(-0.12, 0.12)
+        expected = sorted((haversine(lat, lon, *position), point_id) for point_id, position in points.items())
+        if max_distance is not None:
+            expected = [pair for pair in expected if pair[0] <= max_distance]
+        assert index.nearest(lat, lon, 5, max_distance) == expected[:5]
+
+
+async def seed_order(couriers: dict[int, tuple[float, float]]):
+    """Order 1 picked up at store 1, and an available courier at each of ``couriers``."""
+    async with SessionLocal() as db:
+        await db.execute(update(Store).where(Store.id == 1).values(latitude=STORE[0], longitude=STORE[1]))
+        db.add(Product(id=1, product_name='Burger', product_image='burger.png', price=10, description='Beef',
+                       store_id=1))
+        db.add(Order(id=1, client_id=1, delivery_address='Home'))
+        for courier_id in couriers:
+            db.add(UserProfile(id=100 + courier_id, first_name='Courier', last_name=str(courier_id),
+                               username=f'courier{courier_id}', hashed_password='x', role='courier'))
+        await db.flush()
+        db.add(OrderItem(order_id=1, product_id=1, quantity=1, price=10))
+        for courier_id in couriers:
+            db.add(Courier(id=courier_id, user_id=100 + courier_id))
+        await db.commit()
+    for courier_id, (lat, lon) in couriers.items():
+        await update_position(courier_id, lat, lon)
+        await set_availability(courier_id, True)
+
+
+async def courier_types():
+    async with SessionLocal() as db:
+        return dict((await db.execute(select(Courier.id, Courier.type))).all())
+
+
+async def order_courier():
+    async with SessionLocal() as db:
+        return await db.scalar(select(Order.courier_id).where(Order.id == 1))
+
+
+def test_window_assigns_the_nearest_courier(call, store):
+    call(seed_order, {1: (STORE[0] + 0.02, STORE[1]), 2: (STORE[0] + 0.001, STORE[1])})
+    [assignment] = call(dispatch_window)
+    assert assignment['order_id'] == 1 and assignment['courier_id'] == 2
+    assert call(order_courier) == 102
+    assert call(courier_types) == {1: TypeChoices.available, 2: TypeChoices.busy}
+    assert courier_index.available_ids == {1}
+    assert call(dispatch_window) == []
+
+
+def test_taken_order_leaves_the_courier_available(call, store):
+    call(seed_order, {1: STORE, 2: STORE})
+    assert call(assign, 1, 1) == ASSIGNED
+    assert call(assign, 1, 2) == ORDER_TAKEN
+    assert call(assign, 1, 1) == COURIER_TAKEN
+    assert call(order_courier) == 101
+    assert call(courier_types) == {1: TypeChoices.busy, 2: TypeChoices.available}
@@ -0,0 +1,149 @@
+import json
+import uuid
+
+import pytest
+
+from glovo_app.cache.client import redis_client
+from glovo_app.cache.idempotency import IdempotencyMiddleware, request_key
+
+
+class CountingApp:
+    """Answers 201 with the body it read, and counts how often it ran."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+        await send({'type': 'http.response.start', 'status': 201,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps({'run': self.calls, 'echo': body.decode()}).encode()})
+
+
+def http_scope(key: str, path: str = '/order/create'):
+    return {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+            'headers': [(b'idempotency-key', key.encode())]}
+
+
+async def request(app, scope, chunks=(b'{}',)):
+    chunks = list(chunks)
+    response = {'headers': {}}
+
+    async def receive():
+        body = chunks.pop(0)
+        return {'type': 'http.request', 'body': body, 'more_body': bool(chunks)}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(message['headers'])
+        else:
+            response['body'] = json.loads(message['body'])
+
+    await app(scope, receive, send)
+    return response
+
+
+@pytest.fixture
+def key():
+    return uuid.uuid4().hex
+
+
+@pytest.mark.anyio
+async def test_retry_is_replayed(key):
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app)
+    first = await request(middleware, http_scope(key))
+    second = await request(middleware, http_scope(key))
+    assert app.calls == 1
+    assert second['status'] == 201 and second['body'] == first['body']
+    assert second['headers'][b'idempotent-replayed'] == b'true'
+
+
+@pytest.mark.anyio
+async def test_key_reused_with_another_body_is_rejected(key):
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app)
+    await request(middleware, http_scope(key), [b'{"a": 1}'])
+    response = await request(middleware, http_scope(key), [b'{"a": 2}'])
+    assert response['status'] == 422
+    assert app.calls == 1
+
+
+@pytest.mark.anyio
+async def test_request_finishing_during_the_claim_is_replayed(key, monkeypatch):
+    """The first request storing its response and releasing the lock right after the retry's
+    first Redis round trip must not let the retry run the handler again."""
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app)
+    scope = http_scope(key)
+    await request(middleware, scope)
+    response_key = request_key(scope, key.encode())
+    stored = await redis_client.get(response_key)
+    await redis_client.delete(response_key)
+    await redis_client.set(f'{response_key}:lock', 'first-request')
+
+    execute_command = redis_client.execute_command
+
+    async def first_request_finishes(*args, **kwargs):
+        monkeypatch.setattr(redis_client, 'execute_command', execute_command)
+        result = await execute_command(*args, **kwargs)
+        await redis_client.set(response_key, stored)
+        await redis_client.delete(f'{response_key}:lock')
+        return result
+
+    monkeypatch.setattr(redis_client, 'execute_command', first_request_finishes)
+    response = await request(middleware, scope)
+    assert app.calls == 1
+    assert response['body'] == {'run': 1, 'echo': '{}'}
+
+
+@pytest.mark.anyio
+async def test_body_streams_through_to_the_app(key):
+    chunks = [b'{"rows": [', b'1, 2', b']}']
+    handed_out = []
+
+    async def receive():
+        body = chunks.pop(0)
+        handed_out.append(body)
+        return {'type': 'http.request', 'body': body, 'more_body': bool(chunks)}
+
+    async def app(scope, receive, send):
+        first = await receive()
+        assert handed_out == [first['body']]
+        while (await receive()).get('more_body'):
+            pass
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{}'})
+
+    async def send(message):
+        pass
+
+    await IdempotencyMiddleware(app)(http_scope(key), receive, send)
+    assert await redis_client.exists(request_key(http_scope(key), key.encode()))
+
+
+@pytest.mark.anyio
+async def test_chunked_retry_is_replayed(key):
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app)
+    await request(middleware, http_scope(key), [b'{"a"', b': 1}'])
+    response = await request(middleware, http_scope(key), [b'{"a": ', b'1}'])
+    assert app.calls == 1
+    assert response['headers'][b'idempotent-replayed'] == b'true'
+
+
+@pytest.mark.anyio
+async def test_checkout_keys_are_left_to_checkout(key):
+    app = CountingApp()
+    middleware = IdempotencyMiddleware(app)
+    await request(middleware, http_scope(key, '/order/checkout'))
+    await request(middleware, http_scope(key, '/order/checkout'))
+    assert app.calls == 2
+    assert not await redis_client.exists(request_key(http_scope(key, '/order/checkout'), key.encode()))
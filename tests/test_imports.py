@@ -0,0 +1,37 @@
+import pytest
+
+
+CSV_HEADER = 'product_name,product_image,price,description,store_id\n'
+
+
+def start(client, body: str, kind='product', filename='products.csv'):
+    response = client.post(f'/import/{kind}/', files={'file': (filename, body.encode())})
+    assert response.status_code == 202
+    return client.get(f'/import/jobs/{response.json()["job_id"]}/').json()
+
+
+def test_rows_are_merged(client, store):
+    job = start(client, CSV_HEADER + 'Burger,burger.png,10,Beef burger,1\nFries,fries.png,3,Salted,1\n')
+    assert job['status'] == 'done' and job['rows_merged'] == 2
+    assert client.get('/product/1/').json()['product_name'] == 'Burger'
+
+
+@pytest.mark.parametrize('row, field', [
+    ('{name},burger.png,10,Beef burger,1'.format(name='B' * 33), 'product_name'),
+    ('Burger,burger.png,1000000,Beef burger,1', 'price'),
+    ('Burger,burger.png,ten,Beef burger,1', 'price'),
+    ('Burger,burger.png,10,Beef burger,7', 'store_id'),
+])
+def test_bad_row_is_reported_and_the_rest_imported(client, store, row, field):
+    """A value the target column cannot hold rejects its row rather than aborting the import."""
+    job = start(client, CSV_HEADER + 'Fries,fries.png,3,Salted,1\n' + row + '\n')
+    assert job['status'] == 'done', job['error']
+    assert job['rows_rejected'] == 1 and job['rows_merged'] == 1
+    assert [error['row'] for error in job['errors']] == [2]
+    assert job['errors'][0]['errors'][0]['loc'] == [field]
+
+
+def test_ndjson_rows_are_validated(client, store):
+    body = '{"product_name": "%s", "product_image": "b.png", "price": 10, "description": "d", "store_id": 1}\n'
+    job = start(client, body % 'Burger' + body % ('B' * 40), filename='products.jsonl')
+    assert job['rows_rejected'] == 1 and job['rows_merged'] == 1
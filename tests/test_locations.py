@@ -0,0 +1,83 @@
+import sys
+import time
+
+import pytest
+from sqlalchemy import select
+from starlette.websockets import WebSocketDisconnect
+
+from glovo_app.config import LOCATION_RATE_BURST, LOCATION_SAMPLE_SECONDS
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Courier, CourierLocation, UserProfile
+from glovo_app.dispatch.index import courier_index
+from glovo_app.dispatch.ingest import LocationBuffer, TokenBucket, flush, location_buffer
+from glovo_app.security.tokens import create_access_token
+
+
+def test_buffer_keeps_the_latest_point_and_drops_stale_ones():
+    buffer, now = LocationBuffer(), time.time()
+    assert buffer.record(1, 42.0, 74.0, now - 10)
+    assert buffer.record(1, 42.1, 74.1, now - 5)
+    assert not buffer.record(1, 42.2, 74.2, now - 8)
+    assert buffer.record(2, 43.0, 75.0, now)
+    latest, _ = buffer.drain()
+    assert latest == {1: (42.1, 74.1), 2: (43.0, 75.0)}
+    assert buffer.drain() == ({}, [])
+
+
+def test_buffer_samples_history():
+    buffer, start = LocationBuffer(), time.time() - 3 * LOCATION_SAMPLE_SECONDS
+    for offset in range(0, int(2 * LOCATION_SAMPLE_SECONDS) + 1):
+        buffer.record(1, 42.0, 74.0, start + offset)
+    _, history = buffer.drain()
+    assert len(history) == 3
+
+
+async def seed_courier():
+    async with SessionLocal() as db:
+        db.add(UserProfile(id=7, first_name='Courier', last_name='One', username='courier', hashed_password='x',
+                           role='courier'))
+        await db.flush()
+        db.add(Courier(id=3, user_id=7))
+        await db.commit()
+
+
+async def history_rows():
+    async with SessionLocal() as db:
+        return (await db.execute(select(CourierLocation.courier_id, CourierLocation.latitude))).all()
+
+
+@pytest.fixture
+def courier(client):
+    client.portal.call(seed_courier)
+    location_buffer.drain()
+    return {'Authorization': f'Bearer {create_access_token({"sub": "courier", "ver": 0})}'}
+
+
+def test_posted_points_reach_the_index_and_history_on_flush(client, call, courier):
+    points = [{'latitude': 42.0, 'longitude': 74.0, 'timestamp': time.time() - 1},
+              {'latitude': 42.5, 'longitude': 74.5}]
+    response = client.post('/dispatch/locations/', json={'points': points}, headers=courier)
+    assert response.json() == {'accepted': 2}
+    assert 3 not in courier_index.positions
+
+    call(flush)
+    assert courier_index.positions[3] == (42.5, 74.5)
+    assert call(history_rows) == [(3, 42.0)]
+
+
+def test_websocket_throttles_then_disconnects_a_flooding_client(client, courier, monkeypatch):
+    # A bucket that does not refill within the test, however slowly it runs.
+    monkeypatch.setattr(sys.modules['api.endpoints.dispatch'], 'TokenBucket', lambda: TokenBucket(rate=0.001))
+    message = '{"points": [{"latitude": 42.0, "longitude": 74.0}]}'
+    with client.websocket_connect('/dispatch/locations/ws/', headers=courier) as websocket:
+        for _ in range(LOCATION_RATE_BURST):
+            websocket.send_text(message)
+        websocket.send_text(message)
+        assert websocket.receive_json()['throttled'] is True
+        with pytest.raises(WebSocketDisconnect) as closed:
+            for _ in range(LOCATION_RATE_BURST + 1):
+                websocket.send_text(message)
+            while True:
+                websocket.receive_json()
+        assert closed.value.code == 1013
+    assert location_buffer.latest[3] == (42.0, 74.0)
@@ -0,0 +1,78 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from glovo_app.metrics.http import Distribution, HttpStats, MetricsMiddleware, UNMATCHED
+from glovo_app.metrics.sql import QueryBudgetExceeded, RequestQueries, instrument_queries, query_budget
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_labelled_by_route_template(client, store):
+    labels = {'method': 'GET', 'route': '/product/cursor/'}
+    requests = sample('http_requests_total', status='200', **labels)
+    queries = sample('http_request_db_queries_sum', **labels)
+    assert client.get('/product/cursor/').status_code == 200
+    assert sample('http_requests_total', status='200', **labels) == requests + 1
+    assert sample('http_request_db_queries_sum', **labels) == queries + 1
+
+
+def test_unknown_paths_share_one_label(client):
+    before = sample('http_requests_total', method='GET', route=UNMATCHED, status='404')
+    client.get('/no/such/path/1')
+    client.get('/no/such/path/2')
+    assert sample('http_requests_total', method='GET', route=UNMATCHED, status='404') == before + 2
+
+
+def test_metrics_endpoint_renders_the_histograms(client):
+    client.get('/product/cursor/')
+    body = client.get('/metrics').text
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/product/cursor/"}' in body
+
+
+def test_distribution_buckets_are_cumulative():
+    distribution = Distribution((1, 5))
+    for value in (0.5, 1, 3, 9):
+        distribution.observe(value)
+    assert distribution.buckets() == [('1.0', 2), ('5.0', 3), ('+Inf', 4)]
+    assert distribution.sum == 13.5
+
+
+def test_repeated_statements_with_different_parameters_are_flagged():
+    queries = RequestQueries(traced=True)
+    for product_id in range(5):
+        queries.record('SELECT * FROM product WHERE id = ?', (product_id,), 0.001)
+    for _ in range(5):
+        queries.record('SELECT * FROM store WHERE id = ?', (1,), 0.001)
+    assert list(queries.repeated()) == [('SELECT * FROM product WHERE id = ?', 5)]
+    assert queries.count == 10
+
+
+@pytest.fixture
+def budget_app():
+    engine = instrument_queries(create_async_engine('sqlite+aiosqlite://'))
+    app = FastAPI()
+
+    @app.get('/queries/{count}', dependencies=[Depends(query_budget(2))])
+    async def run_queries(count: int):
+        async with engine.connect() as conn:
+            for _ in range(count):
+                await conn.execute(text('SELECT 1'))
+        return {'ran': count}
+
+    stats = HttpStats()
+    with TestClient(MetricsMiddleware(app, stats=stats)) as client:
+        yield client, stats
+
+
+def test_query_budget_is_enforced(budget_app):
+    client, stats = budget_app
+    assert client.get('/queries/2').json() == {'ran': 2}
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/queries/3')
+    assert stats.routes['GET', '/queries/{count}'].queries.sum == 5
@@ -0,0 +1,89 @@
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from glovo_app.cache.client import redis_client
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import OutboxEvent
+from glovo_app.outbox import worker
+from glovo_app.outbox.worker import OutboxStats, drain_batch, enqueue, handler
+from glovo_app.rankings.leaderboard import STORE_DEMAND_KEY, record_demand
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    """A handler of the ``test`` topic that fails until ``failures`` runs out."""
+    monkeypatch.setattr(worker, 'handlers', defaultdict(list))
+    state = {'failures': 1, 'seen': []}
+
+    @handler('test')
+    async def handle(payload):
+        state['seen'].append(payload)
+        if state['failures']:
+            state['failures'] -= 1
+            raise RuntimeError('handler down')
+
+    return state
+
+
+async def add_event():
+    async with SessionLocal() as db:
+        enqueue(db, 'test', {'n': 1})
+        await db.commit()
+
+
+async def events():
+    async with SessionLocal() as db:
+        return (await db.scalars(select(OutboxEvent))).all()
+
+
+async def make_due():
+    async with SessionLocal() as db:
+        for event in (await db.scalars(select(OutboxEvent))).all():
+            event.available_at = datetime.utcnow()
+        await db.commit()
+
+
+def test_failed_event_is_retried_with_backoff(call, flaky):
+    stats = OutboxStats('test')
+    call(add_event)
+    assert call(drain_batch, stats) == 1
+    [event] = call(events)
+    assert event.attempts == 1 and event.failed_at is None
+    assert event.available_at > datetime.utcnow()
+    assert event.last_error == 'RuntimeError: handler down'
+    assert stats.retried == 1 and stats.processed == 0
+
+    assert call(drain_batch, stats) == 0
+
+    call(make_due)
+    assert call(drain_batch, stats) == 1
+    assert call(events) == []
+    assert stats.processed == 1
+    assert flaky['seen'] == [{'n': 1}, {'n': 1}]
+
+
+def test_event_is_parked_after_max_attempts(call, flaky, monkeypatch):
+    monkeypatch.setattr(worker, 'OUTBOX_MAX_ATTEMPTS', 2)
+    flaky['failures'] = 5
+    stats = OutboxStats('test')
+    call(add_event)
+    for _ in range(2):
+        call(make_due)
+        call(drain_batch, stats)
+    [event] = call(events)
+    assert event.attempts == 2 and event.failed_at is not None
+    assert stats.dead == 1
+
+    call(make_due)
+    assert call(drain_batch, stats) == 0
+
+
+def test_redelivered_demand_is_recorded_once(call):
+    assert call(record_demand, 7, [(1, 3, 2)]) is True
+    score = call(redis_client.zscore, STORE_DEMAND_KEY, 1)
+    assert score > 0
+    assert call(record_demand, 7, [(1, 3, 2)]) is False
+    assert call(redis_client.zscore, STORE_DEMAND_KEY, 1) == score
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+from glovo_app.security.passwords import PasswordHasher
+
+
+@pytest.mark.anyio
+async def test_hasher_works_again_after_shutdown():
+    hasher = PasswordHasher(workers=1, max_pending=4)
+    hashed = await hasher.hash('secret')
+    hasher.shutdown()
+    assert await hasher.verify_and_update('secret', hashed) == (True, None)
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_hasher_rejects_logins_past_max_pending():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    hashed = await hasher.hash('secret')
+    results = await asyncio.gather(*(hasher.verify_and_update('secret', hashed) for _ in range(3)),
+                                   return_exceptions=True)
+    hasher.shutdown()
+    assert results[0] == (True, None)
+    assert [exc.status_code for exc in results[1:]] == [503, 503]
+    assert hasher.rejected == 2
@@ -0,0 +1,91 @@
+import pytest
+
+
+def product(product_id=0, name='Burger', price=10, store_id=1, description='Beef burger'):
+    return {'id': product_id, 'product_name': name, 'product_image': 'burger.png', 'price': price,
+            'description': description, 'store_id': store_id}
+
+
+def combo(combo_id=0, name='Lunch', price=12.5, store_id=1):
+    return {'id': combo_id, 'combo_name': name, 'combo_image': 'lunch.png', 'price': price,
+            'description': 'Burger and fries', 'store_id': store_id}
+
+
+@pytest.fixture
+def burger(client, store):
+    response = client.post('/product/create/', json=product(1))
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_update_product_writes_and_invalidates_detail(client, burger):
+    assert client.get('/product/1/').json()['price'] == 10
+
+    response = client.put('/product/update/', params={'product_id': 1}, json=product(1, price=12))
+    assert response.status_code == 200
+    assert response.json()['price'] == 12
+    assert client.get('/product/1/').json()['price'] == 12
+
+
+def test_update_product_keeps_its_id(client, burger):
+    response = client.put('/product/update/', params={'product_id': 1}, json=product(99, name='Cheeseburger'))
+    assert response.json()['id'] == 1
+    assert client.get('/product/1/').json()['product_name'] == 'Cheeseburger'
+
+
+def test_update_missing_product_is_404(client, store):
+    assert client.put('/product/update/', params={'product_id': 5}, json=product(5)).status_code == 404
+
+
+def test_update_combo_writes_and_invalidates_list(client, store):
+    client.post('/product_combo/create', json=combo(1))
+    assert client.get('/product_combo/').json()['items'][0]['price'] == 12.5
+
+    response = client.put('/product_combo/update', params={'combo_id': 1}, json=combo(1, price=9))
+    assert response.status_code == 200
+    assert client.get('/product_combo/').json()['items'][0]['price'] == 9
+
+
+def test_update_product_reaches_search(client, burger):
+    assert [p['id'] for p in client.get('/product/search/', params={'product_name': 'burger'}).json()] == [1]
+
+    client.put('/product/update/', params={'product_id': 1},
+               json=product(1, name='Pizza', description='Margherita'))
+    assert client.get('/product/search/', params={'product_name': 'burger'}).json() == []
+    assert [p['id'] for p in client.get('/product/search/', params={'product_name': 'pizza'}).json()] == [1]
+
+
+async def add_to_cart(product_id):
+    from glovo_app.db.database import SessionLocal
+    from glovo_app.db.models import Cart, CartItem
+
+    async with SessionLocal() as db:
+        db.add(Cart(id=1, user_id=1))
+        await db.flush()
+        db.add(CartItem(cart_id=1, product_id=product_id, quantity=1))
+        await db.commit()
+
+
+def test_bulk_create_ignores_missing_ids(client, store):
+    item = product()
+    del item['id']
+    response = client.post('/product/bulk/', json=[item, product(7, name='Fries')])
+    assert [(r['status'], r['id']) for r in response.json()] == [('created', 1), ('created', 2)]
+
+
+def test_bulk_update_reports_conflicts_per_item(client, store):
+    client.post('/product/bulk/', json=[product(name='Burger'), product(name='Fries'), product(name='Cola')])
+    response = client.put('/product/bulk/', json=[product(1, name='Fries'), product(3, name='Lemonade'),
+                                                   product(9, name='Tea'), {**product(name='Soup'), 'id': None}])
+    assert [r['status'] for r in response.json()] == ['conflict', 'updated', 'not_found', 'invalid']
+    names = {p['id']: p['product_name'] for p in client.get('/product/').json()['items']}
+    assert names == {1: 'Burger', 2: 'Fries', 3: 'Lemonade'}
+
+
+def test_bulk_delete_reports_referenced_products(client, store, call):
+    client.post('/product/bulk/', json=[product(name='Burger'), product(name='Fries')])
+    call(add_to_cart, 1)
+    response = client.request('DELETE', '/product/bulk/', json=[1, 2, 3])
+    assert response.status_code == 200
+    assert [r['status'] for r in response.json()] == ['conflict', 'deleted', 'not_found']
+    assert [p['id'] for p in client.get('/product/').json()['items']] == [1]
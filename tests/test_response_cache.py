@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from glovo_app.cache.response import cached_response, invalidate_tags, local_cache
+from glovo_app.db.routing import RoutingSession, replica_set
+
+
+adapter = TypeAdapter(dict)
+
+
+@pytest.fixture
+def key():
+    local_cache.clear()
+    return f'cache:test?{uuid.uuid4().hex}'
+
+
+@pytest.fixture
+def tag():
+    return f'test:{uuid.uuid4().hex}'
+
+
+@pytest.mark.anyio
+async def test_hit_does_not_reload(key, tag):
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return {'price': 10}
+
+    for _ in range(2):
+        assert (await cached_response(key, [tag], loader, adapter)).body == b'{"price":10}'
+    assert len(loads) == 1
+
+
+@pytest.mark.anyio
+async def test_invalidation_drops_the_entry(key, tag):
+    async def old():
+        return {'price': 10}
+
+    async def new():
+        return {'price': 12}
+
+    await cached_response(key, [tag], old, adapter)
+    await invalidate_tags(tag)
+    assert (await cached_response(key, [tag], new, adapter)).body == b'{"price":12}'
+
+
+@pytest.mark.anyio
+async def test_row_invalidated_while_loading_is_not_cached(key, tag):
+    """A write and its invalidation landing between the miss and the store must not leave the
+    row read before the write in the cache."""
+    async def read_then_concurrent_write():
+        await invalidate_tags(tag)
+        return {'price': 10}
+
+    async def new():
+        return {'price': 12}
+
+    assert (await cached_response(key, [tag], read_then_concurrent_write, adapter)).body == b'{"price":10}'
+    assert (await cached_response(key, [tag], new, adapter)).body == b'{"price":12}'
+
+
+@pytest.fixture
+async def read_session(tmp_path):
+    engines = []
+    for name in ('primary', 'replica_0'):
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / name}.sqlite', pool_logging_name=name)
+        async with engine.begin() as conn:
+            await conn.execute(text('CREATE TABLE server (name TEXT)'))
+            await conn.execute(text('INSERT INTO server VALUES (:name)'), {'name': name})
+        engines.append(engine)
+    replica_set.configure(engines[1:])
+    sessions = async_sessionmaker(bind=engines[0], class_=AsyncSession, sync_session_class=RoutingSession)
+    async with sessions(info={'read_only': True}) as db:
+        yield db
+    replica_set.configure([])
+    for engine in engines:
+        await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_miss_is_filled_from_the_primary(key, tag, read_session):
+    async def loader():
+        return {'server': await read_session.scalar(text('SELECT name FROM server'))}
+
+    response = await cached_response(key, [tag], loader, adapter, sessions=[read_session])
+    assert response.body == b'{"server":"primary"}'
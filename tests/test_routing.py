@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import column, table, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from glovo_app.db.routing import RoutingSession, replica_set
+
+
+# Each SQLite file stands in for one server; the row it holds names it.
+SERVERS = ('primary', 'replica_0', 'replica_1')
+server_table = table('server', column('name'))
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    engines = {}
+    for name in SERVERS:
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / name}.sqlite', pool_logging_name=name)
+        async with engine.begin() as conn:
+            await conn.execute(text('CREATE TABLE server (name TEXT)'))
+            await conn.execute(text('INSERT INTO server VALUES (:name)'), {'name': name})
+        engines[name] = engine
+    replica_set.configure([engines['replica_0'], engines['replica_1']])
+    yield engines
+    replica_set.configure([])
+    replica_set._last_write.clear()
+    for engine in engines.values():
+        await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engines):
+    return async_sessionmaker(bind=engines['primary'], class_=AsyncSession, sync_session_class=RoutingSession,
+                              expire_on_commit=False)
+
+
+async def server(db) -> str:
+    return await db.scalar(text('SELECT name FROM server'))
+
+
+@pytest.mark.anyio
+async def test_read_only_session_reads_from_replica(session_factory):
+    async with session_factory(info={'read_only': True}) as db:
+        assert await server(db) in ('replica_0', 'replica_1')
+
+
+@pytest.mark.anyio
+async def test_write_session_uses_primary(session_factory):
+    async with session_factory() as db:
+        assert await server(db) == 'primary'
+
+
+@pytest.mark.anyio
+async def test_session_keeps_the_replica_it_picked(session_factory):
+    async with session_factory(info={'read_only': True}) as db:
+        first = await server(db)
+        assert [await server(db) for _ in range(4)] == [first] * 4
+    async with session_factory(info={'read_only': True}) as db:
+        assert await server(db) != first
+
+
+@pytest.mark.anyio
+async def test_lagging_replica_is_skipped(session_factory):
+    replica_set.lag['replica_0'] = float('inf')
+    for _ in range(3):
+        async with session_factory(info={'read_only': True}) as db:
+            assert await server(db) == 'replica_1'
+
+
+@pytest.mark.anyio
+async def test_falls_back_to_primary_when_every_replica_lags(session_factory):
+    replica_set.lag = dict.fromkeys(replica_set.lag, float('inf'))
+    async with session_factory(info={'read_only': True}) as db:
+        assert await server(db) == 'primary'
+
+
+@pytest.mark.anyio
+async def test_dml_in_read_only_session_goes_to_primary(session_factory, engines):
+    async with session_factory(info={'read_only': True}) as db:
+        await db.execute(update(server_table).values(name='written'))
+        await db.commit()
+    async with engines['primary'].connect() as conn:
+        assert await conn.scalar(text('SELECT name FROM server')) == 'written'
+
+
+@pytest.mark.anyio
+async def test_commit_makes_the_writer_sticky(session_factory):
+    assert not replica_set.is_sticky('user-1')
+    async with session_factory(info={'sticky_key': 'user-1'}) as db:
+        await server(db)
+        await db.commit()
+    assert replica_set.is_sticky('user-1')
+    assert not replica_set.is_sticky('user-2')
@@ -0,0 +1,64 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Order, StatusChoices
+from glovo_app.tracking import events
+from glovo_app.tracking.events import (TooManySubscribers, TrackingBroker, courier_topic, order_event, order_topic,
+                                       publish_order_event, tracking_broker)
+
+
+def test_event_reaches_the_order_and_both_couriers():
+    broker = TrackingBroker()
+    order, new, old, other = (broker.subscribe(topic) for topic in
+                              (order_topic(1), courier_topic(5), courier_topic(4), courier_topic(6)))
+    event = {**order_event(1, StatusChoices.str2, 5), 'previous_courier_id': 4}
+    broker.dispatch(event)
+    assert [subscription.queue.qsize() for subscription in (order, new, old, other)] == [1, 1, 1, 0]
+
+
+def test_slow_subscriber_loses_the_oldest_events(monkeypatch):
+    monkeypatch.setattr(events, 'TRACKING_QUEUE_SIZE', 2)
+    broker = TrackingBroker()
+    subscription = broker.subscribe(order_topic(1))
+    for status in (StatusChoices.str1, StatusChoices.str2, StatusChoices.str3):
+        broker.dispatch(order_event(1, status, None))
+    assert [subscription.queue.get_nowait()['status'] for _ in range(2)] == [StatusChoices.str2, StatusChoices.str3]
+
+
+def test_subscribers_are_capped_and_released(monkeypatch):
+    monkeypatch.setattr(events, 'TRACKING_MAX_SUBSCRIBERS', 1)
+    broker = TrackingBroker()
+    subscription = broker.subscribe(order_topic(1))
+    with pytest.raises(TooManySubscribers):
+        broker.subscribe(order_topic(2))
+    broker.unsubscribe(subscription)
+    assert not broker.topics
+    broker.subscribe(order_topic(2))
+
+
+async def seed_order():
+    async with SessionLocal() as db:
+        db.add(Order(id=1, client_id=1, delivery_address='Home'))
+        await db.commit()
+
+
+def test_websocket_sends_the_state_then_live_events(client, call, store):
+    call(seed_order)
+    with client.websocket_connect('/track/order/1/ws') as websocket:
+        assert websocket.receive_json()['status'] == StatusChoices.str1
+        call(publish_order_event, 1, StatusChoices.str2, 7)
+        event = websocket.receive_json()
+        assert (event['status'], event['courier_id']) == (StatusChoices.str2, 7)
+
+        # After a resync the client is sent the stored state again.
+        call(tracking_broker.resync)
+        assert websocket.receive_json()['status'] == StatusChoices.str1
+    assert not tracking_broker.topics.get(order_topic(1))
+
+
+def test_websocket_for_a_missing_order_is_refused(client):
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect('/track/order/1/ws') as websocket:
+            websocket.receive_json()
+    assert refused.value.code == 1008